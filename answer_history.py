@@ -0,0 +1,227 @@
+"""
+In-process cache of the answer history of every user.
+
+The practice filters need three sets per user: the questions answered, failed
+in an exam and failed in practice. They come from GetQuestionHistorySet, one
+row per question with a flag per category, which is turned into arrays
+directly. Databases without that procedure fall back to GetQuestionHistory and
+its string-encoded lists. The history is loaded once per user and then kept in
+process, so moving a slider or a filter costs no database round trip.
+
+The cache is write-through: the code that records answers calls
+record_answer() after its insert. Answers recorded by other workers are
+picked up when the entry expires after HISTORY_TTL seconds. If the reload
+fails, the expired entry is kept.
+"""
+import ast
+import time
+import logging
+import threading
+import numpy as np
+import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+HISTORY_TTL = 300
+MAX_USERS = 1000
+
+# user -> UserHistory
+_histories = {}
+_histories_lock = threading.Lock()
+# Cleared when GetQuestionHistorySet is not deployed, to stop trying it
+_structured = True
+
+
+class UserHistory:
+    """
+    Answer history of a user.
+
+    Attributes:
+        user (str): Username
+        loaded_at (float): time.monotonic() of the load from the database
+        answered (Set[int]): Questions answered at least once
+        failed_exam (Set[int]): Questions failed at least once in an exam
+        failed_practice (Set[int]): Questions failed at least once in practice
+    """
+
+    def __init__(self, user, answered, failed_exam, failed_practice):
+        self.user = user
+        self.loaded_at = time.monotonic()
+        self.answered = set(answered)
+        self.failed_exam = set(failed_exam)
+        self.failed_practice = set(failed_practice)
+        self._arrays = {}
+
+    @classmethod
+    def from_arrays(cls, user, answered, failed_exam, failed_practice):
+        """Build a history from arrays of question numbers, kept for numbers()."""
+        history = cls(user, answered.tolist(), failed_exam.tolist(), failed_practice.tolist())
+        history._arrays = {
+            "answered": answered,
+            "failed_exam": failed_exam,
+            "failed_practice": failed_practice,
+        }
+        return history
+
+    def expired(self):
+        """Whether the entry is older than HISTORY_TTL."""
+        return time.monotonic() - self.loaded_at > HISTORY_TTL
+
+    def numbers(self, kind):
+        """
+        Get one of the sets as an array, ready for QuestionBank.numbers_mask().
+
+        Args:
+            kind (str): answered, failed_exam or failed_practice
+
+        Returns:
+            np.ndarray: The question numbers (int64)
+        """
+        array = self._arrays.get(kind)
+        if array is None:
+            # Under the lock: record_answer() may be adding to the set meanwhile
+            with _histories_lock:
+                array = np.fromiter(getattr(self, kind), dtype=np.int64)
+                self._arrays[kind] = array
+        return array
+
+    def add(self, question_number, mode, is_correct, is_answered):
+        """Add an answer to the sets."""
+        if not is_answered:
+            return
+        self.answered.add(question_number)
+        if not is_correct:
+            if mode == "examen":
+                self.failed_exam.add(question_number)
+            elif mode == "practicar":
+                self.failed_practice.add(question_number)
+        self._arrays = {}
+
+
+def _parse(value):
+    """Parse one of the string-encoded lists of GetQuestionHistory."""
+    if not value:
+        return []
+    return [int(number) for number in ast.literal_eval(value)]
+
+
+def _load_structured(conn, user):
+    """Load the history of a user from GetQuestionHistorySet."""
+    df = db.query_frame(
+        conn, "EXEC GetQuestionHistorySet @user=:user", {"user": user}, fallback=True
+    )
+    numbers = df["question_id"].to_numpy(dtype=np.int64)
+    return UserHistory.from_arrays(
+        user,
+        numbers[df["answered"].to_numpy() == 1],
+        numbers[df["failed_exam"].to_numpy() == 1],
+        numbers[df["failed_practice"].to_numpy() == 1],
+    )
+
+
+def _load(conn, user):
+    """Load the history of a user from the database."""
+    global _structured
+    if _structured:
+        try:
+            return _load_structured(conn, user)
+        except Exception as e:
+            # Only a missing procedure switches to the old one, other errors are real
+            if "GetQuestionHistorySet" not in str(e):
+                raise
+            logger.warning(f"GetQuestionHistorySet not available, using GetQuestionHistory: {str(e)}")
+            _structured = False
+
+    row = db.execute_query(
+        conn,
+        "EXEC GetQuestionHistory @user=:user",
+        {"user": user},
+        fetch_all=False,
+        fallback=True
+    )
+    if row is None:
+        return UserHistory(user, [], [], [])
+    return UserHistory(user, _parse(row[0]), _parse(row[1]), _parse(row[2]))
+
+
+def get_history(conn, user):
+    """
+    Get the answer history of a user, from the cache if it is fresh.
+
+    Args:
+        conn: Database connection
+        user (str): Username
+
+    Returns:
+        UserHistory: The history (shared, do not modify)
+    """
+    cached = _histories.get(user)
+    if cached is not None and not cached.expired():
+        return cached
+
+    try:
+        history = _load(conn, user)
+    except Exception as e:
+        # Read-only mode: keep the expired history, or none, until the database is back
+        if cached is not None:
+            logger.warning(f"Could not reload the history of {user}, keeping the cached one: {str(e)}")
+            return cached
+        if isinstance(e, db.DatabaseUnavailable):
+            return UserHistory(user, [], [], [])
+        raise
+    with _histories_lock:
+        if len(_histories) >= MAX_USERS and user not in _histories:
+            oldest = min(_histories, key=lambda name: _histories[name].loaded_at)
+            del _histories[oldest]
+        _histories[user] = history
+    return history
+
+
+def record_answer(user, question_number, mode, is_correct, is_answered):
+    """
+    Add an answer already stored in the database to the cached history.
+
+    Args:
+        user (str): Username
+        question_number (int): Question answered
+        mode (str): examen or practicar
+        is_correct (int): 1 if the answer was correct
+        is_answered (int): 1 if the question was answered
+    """
+    with _histories_lock:
+        history = _histories.get(user)
+        if history is not None:
+            history.add(int(question_number), mode, is_correct, is_answered)
+
+
+def record_answers(user, answers, mode):
+    """
+    Add several answers already stored in the database to the cached history.
+
+    Args:
+        user (str): Username
+        answers (List[Dict]): Answers with question_id, is_correct and is_answered
+        mode (str): examen or practicar
+    """
+    with _histories_lock:
+        history = _histories.get(user)
+        if history is not None:
+            for answer in answers:
+                history.add(
+                    int(answer["question_id"]), mode, answer["is_correct"], answer["is_answered"]
+                )
+
+
+def invalidate(user=None):
+    """
+    Drop cached histories, so they are loaded again on next use.
+
+    Args:
+        user (str, optional): Only drop this user's history
+    """
+    with _histories_lock:
+        if user is None:
+            _histories.clear()
+        else:
+            _histories.pop(user, None)
@@ -0,0 +1,347 @@
+"""
+Write-behind queue for practice answers.
+
+Recording a practice answer only puts an event in a bounded in-process queue;
+a background thread inserts the queued answers into Fact_Answers in batches,
+when BATCH_SIZE answers are waiting or FLUSH_INTERVAL seconds have passed,
+and then awards the XP of the correct ones with one add_experience_bulk()
+call for the whole batch. Each batch also adds its answers to the section
+progress and the daily activity of their users (section_progress.record,
+daily_activity.record) in the same transaction as the insert. The answer
+time is taken in UTC (db.utc_now) when the answer is recorded, not when it is
+written, the same clock as the exam answers.
+
+When the queue is full, record() waits up to ENQUEUE_TIMEOUT seconds for room
+(backpressure) and otherwise writes the answer itself. Pending answers are
+flushed when the process exits.
+
+While the circuit breaker of the database is open, the answers are appended
+to a local spool file (SPOOL_FILE) instead, and replayed when the breaker
+closes or, for a spool left by a previous process, once its engine exists.
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+import db
+import circuit_breaker
+import answer_history
+import section_progress
+import daily_activity
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAX_QUEUE = 10000
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 1.0
+ENQUEUE_TIMEOUT = 2.0
+MAX_ATTEMPTS = 3
+XP_PER_CORRECT_ANSWER = 5
+SPOOL_FILE = os.getenv("ANSWER_SPOOL_FILE", "/tmp/answers_spool.jsonl")
+REPLAY_INTERVAL = 30.0
+SHUTDOWN_TIMEOUT = 10.0
+
+INSERT_ANSWER = """
+    INSERT INTO [esnowflake].[dbo].Fact_Answers
+    (question_id, user_nickname, type, exam_id, is_correct, is_answered, ANSWER_TIMESTAMP, especialidad)
+    VALUES (:question_id, :user, :type, :exam_id, :is_correct, :is_answered, :answered_at, :especialidad)
+"""
+
+_queue = queue.Queue(maxsize=MAX_QUEUE)
+_writer = None
+_writer_lock = threading.Lock()
+_stop = threading.Event()
+_stats = {
+    "queued": 0, "written": 0, "batches": 0, "failed": 0, "direct_writes": 0,
+    "spooled": 0, "replayed": 0, "last_batch_ms": 0.0,
+}
+_stats_lock = threading.Lock()
+_spool_lock = threading.Lock()
+_last_replay = 0.0
+
+
+def _count(counter, amount=1):
+    """Increment one of the writer counters."""
+    with _stats_lock:
+        _stats[counter] += amount
+
+
+def record(conn, question_id, user, mode, is_correct, is_answered, exam_id=None, especialidad=None):
+    """
+    Record an answer, to be written in the background.
+
+    Args:
+        conn: Database connection
+        question_id (int): Question answered
+        user (str): Username
+        mode (str): practicar or examen
+        is_correct (int): 1 if the answer was correct
+        is_answered (int): 1 if the question was answered
+        exam_id (int, optional): Exam of the answer
+        especialidad (str, optional): Specialization type of the question
+    """
+    event = {
+        "question_id": int(question_id),
+        "user": user,
+        "type": mode,
+        "exam_id": exam_id,
+        "is_correct": is_correct,
+        "is_answered": is_answered,
+        "answered_at": db.utc_now(),
+        "especialidad": especialidad,
+    }
+    # The filters of the next rerun already see the answer
+    answer_history.record_answer(user, question_id, mode, is_correct, is_answered)
+
+    # Read-only mode: keep the answer for when the database is back
+    if circuit_breaker.is_open(conn):
+        _spool(conn, [event])
+        return
+
+    _start()
+    try:
+        _queue.put((conn, event, 0), timeout=ENQUEUE_TIMEOUT)
+        _count("queued")
+    except queue.Full:
+        # Backpressure: the writer cannot keep up, write this answer here
+        logger.warning("Answer queue full, writing the answer synchronously")
+        _count("direct_writes")
+        _flush([(conn, event, 0)])
+
+
+def _start():
+    """Start the writer thread the first time an answer is recorded."""
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_run, name="answer-writer", daemon=True)
+            _writer.start()
+
+
+def _run():
+    """Writer loop: collect a batch by size or time and write it."""
+    while not _stop.is_set():
+        batch = _collect(BATCH_SIZE, FLUSH_INTERVAL)
+        if batch:
+            _flush(batch)
+        if time.monotonic() - _last_replay > REPLAY_INTERVAL:
+            replay()
+
+
+def _collect(size, interval):
+    """Take up to size queued answers, waiting at most interval seconds."""
+    batch = []
+    deadline = time.monotonic() + interval
+    while len(batch) < size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _flush(batch):
+    """Write a batch, grouped by database, re-queueing the answers of failed writes."""
+    by_engine = {}
+    for conn, event, attempts in batch:
+        by_engine.setdefault(id(conn), (conn, []))[1].append((event, attempts))
+
+    for conn, items in by_engine.values():
+        _write_items(conn, items)
+
+
+def _write_items(conn, items):
+    """
+    Write the answers of one database, bisecting a batch that fails on its data.
+
+    A bad row fails the whole transaction, so a failed batch is split in halves
+    until the rows that fail on their own are found. Only those are charged an
+    attempt and re-queued, the rest of the batch is written.
+    """
+    events = [event for event, _ in items]
+    try:
+        _write_batch(conn, events)
+    except Exception as e:
+        if isinstance(e, db.DatabaseUnavailable) or circuit_breaker.is_open(conn):
+            _spool(conn, events)
+            return
+        if len(items) > 1:
+            middle = len(items) // 2
+            _write_items(conn, items[:middle])
+            _write_items(conn, items[middle:])
+            return
+        event, attempts = items[0]
+        logger.error(f"Error writing the answer of {event['user']} to question {event['question_id']}: {str(e)}",
+                     exc_info=True)
+        if attempts + 1 < MAX_ATTEMPTS:
+            try:
+                _queue.put_nowait((conn, event, attempts + 1))
+                return
+            except queue.Full:
+                pass
+        _count("failed")
+
+
+def _write_batch(conn, events):
+    """Insert answers and their progress rollups together, then award the XP of the correct ones."""
+    start = time.perf_counter()
+    by_especialidad = {}
+    for event in events:
+        if event["especialidad"]:
+            by_especialidad.setdefault(event["especialidad"], []).append(event)
+    with db.transaction(conn) as connection:
+        db.execute_many(conn, INSERT_ANSWER, events, connection=connection)
+        for especialidad, answers in by_especialidad.items():
+            section_progress.record(conn, especialidad, answers, connection=connection)
+        daily_activity.record(conn, events, connection=connection)
+    _award_xp(conn, events)
+    with _stats_lock:
+        _stats["written"] += len(events)
+        _stats["batches"] += 1
+        _stats["last_batch_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+
+def _award_xp(conn, events):
+    """Award the XP of the correct practice answers, in one call for every user."""
+    # Imported here: helper imports this module
+    import helper as h
+
+    correct = {}
+    for event in events:
+        if event["is_correct"] and event["type"] == "practicar":
+            correct[event["user"]] = correct.get(event["user"], 0) + 1
+    awards = [
+        (user, XP_PER_CORRECT_ANSWER * count, "Correct answer in practice")
+        for user, count in correct.items()
+    ]
+    try:
+        h.add_experience_bulk(conn, awards, False)
+    except Exception as e:
+        logger.error(f"Error awarding XP to {len(awards)} users: {str(e)}", exc_info=True)
+
+
+def _spool(conn, events):
+    """Append answers that cannot be written now to the spool file."""
+    target = db.engine_target(conn)
+    if target is None:
+        logger.error(f"{len(events)} answers lost: their database is not in the registry")
+        _count("failed", len(events))
+        return
+    try:
+        with _spool_lock, open(SPOOL_FILE, "a", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps({"target": list(target), "event": event}, default=str) + "\n")
+    except OSError as e:
+        logger.error(f"{len(events)} answers lost, could not write the spool: {str(e)}", exc_info=True)
+        _count("failed", len(events))
+        return
+    _count("spooled", len(events))
+
+
+def replay(engine=None):
+    """
+    Write the spooled answers of the databases that are available again.
+
+    Args:
+        engine (Engine, optional): Only replay the answers of this engine
+
+    Returns:
+        int: Answers written
+    """
+    global _last_replay
+    _last_replay = time.monotonic()
+    if not os.path.exists(SPOOL_FILE):
+        return 0
+
+    # Take the replayable answers out of the spool, keep the rest in it
+    pending = {}
+    with _spool_lock:
+        try:
+            with open(SPOOL_FILE, encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read the answer spool: {str(e)}", exc_info=True)
+            return 0
+        keep = []
+        for line in lines:
+            conn = db.find_engine(line["target"])
+            if conn is None or circuit_breaker.is_open(conn) or (engine is not None and conn is not engine):
+                keep.append(line)
+                continue
+            event = line["event"]
+            event["answered_at"] = datetime.fromisoformat(event["answered_at"])
+            pending.setdefault(id(conn), (conn, []))[1].append(event)
+        with open(f"{SPOOL_FILE}.tmp", "w", encoding="utf-8") as f:
+            for line in keep:
+                f.write(json.dumps(line, default=str) + "\n")
+        os.replace(f"{SPOOL_FILE}.tmp", SPOOL_FILE)
+        if not keep:
+            os.remove(SPOOL_FILE)
+
+    written = 0
+    for conn, events in pending.values():
+        for start in range(0, len(events), BATCH_SIZE):
+            _flush([(conn, event, 0) for event in events[start:start + BATCH_SIZE]])
+        written += len(events)
+    if written:
+        _count("replayed", written)
+        logger.info(f"{written} spooled answers replayed")
+    return written
+
+
+def flush(timeout=10.0):
+    """
+    Write every queued answer now.
+
+    Args:
+        timeout (float): Maximum seconds to spend
+
+    Returns:
+        int: Answers still queued afterwards
+    """
+    deadline = time.monotonic() + timeout
+    while not _queue.empty() and time.monotonic() < deadline:
+        batch = _collect(BATCH_SIZE, 0.05)
+        if batch:
+            _flush(batch)
+    return _queue.qsize()
+
+
+def get_stats():
+    """
+    Get the writer counters.
+
+    Returns:
+        Dict: queued, written, batches, failed, direct_writes, spooled, replayed,
+            last_batch_ms and pending
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["pending"] = _queue.qsize()
+    return stats
+
+
+@atexit.register
+def _shutdown():
+    """Stop the writer and flush the pending answers when the process exits."""
+    _stop.set()
+    # Let the writer finish the batch it already took off the queue
+    if _writer is not None:
+        _writer.join(SHUTDOWN_TIMEOUT)
+    pending = flush()
+    if pending:
+        logger.error(f"{pending} answers could not be written before exiting")
+
+
+# Replay the spool as soon as a database is available again
+circuit_breaker.on_close(replay)
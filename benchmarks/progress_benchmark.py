@@ -0,0 +1,153 @@
+"""
+Benchmark of the progress by section: pandas against progress_engine.
+
+Builds a synthetic bank and answer history and times, for the same data, the
+three paths that use the engine against the pandas computation they replace:
+  - progress page: the unseen questions per section of one user
+    (ProgressEngine.unseen, the rest of the page reads Fact_User_Section_Progress)
+  - answer write: the section deltas of one write-behind batch
+    (section_progress.section_deltas, run in the transaction of every batch)
+  - rebuild: the counts of every user and section
+    (ProgressEngine.grouped_counts, as section_progress.rebuild runs it)
+
+and checks that both give the same counts.
+
+Usage:
+    python benchmarks/progress_benchmark.py [--answers 100000] [--questions 1500] [--batch 200]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import question_bank as qb  # noqa: E402
+import progress_engine  # noqa: E402
+import section_progress  # noqa: E402
+
+SECTIONS = [f"Sección {i}" for i in range(12)]
+
+
+def build_bank(questions, rng):
+    """Synthetic bank, every question in one to three sections."""
+    records = []
+    for number in range(1, questions + 1):
+        areas = rng.choice(SECTIONS, size=rng.integers(1, 4), replace=False).tolist()
+        records.append({"question_number": number, "question_area": areas, "correct_answer": [1]})
+    return qb.QuestionBank.from_records("benchmark", records)
+
+
+def build_answers(bank, answers, users, rng):
+    """Synthetic answer history."""
+    return pd.DataFrame({
+        "user": rng.integers(0, users, size=answers).astype(str),
+        "question_id": rng.integers(1, len(bank) + 1, size=answers),
+        "is_correct": rng.integers(0, 2, size=answers),
+        "answered_at": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 10**7, size=answers), unit="s"),
+    })
+
+
+def pandas_areas(bank):
+    """One (question_id, area) row per question and area, exploded from the records."""
+    return (
+        pd.DataFrame(list(bank.records))[["question_number", "question_area"]]
+        .explode("question_area")
+        .rename(columns={"question_number": "question_id", "question_area": "area"})
+    )
+
+
+def pandas_unseen(bank, answered):
+    """Unseen questions per section as the progress page computed them with pandas."""
+    secciones = pandas_areas(bank)
+    no_vistas = ~secciones["question_id"].isin(answered)
+    return no_vistas.groupby(secciones["area"]).sum()
+
+
+def pandas_grouped(bank, df):
+    """Per-user, per-section counts as section_progress computed them with pandas."""
+    df = df.assign(incorrect=1 - df["is_correct"])
+    return (
+        df.merge(pandas_areas(bank), on="question_id")
+        .groupby(["user", "area"])
+        .agg(correct=("is_correct", "sum"), incorrect=("incorrect", "sum"),
+             last_answered=("answered_at", "max"))
+    )
+
+
+def timed(function, repeat):
+    """Best time of several runs, and the result of the last one."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def report(name, pandas_time, engine_time):
+    """Print the times of one path."""
+    print(f"{name:<13} pandas {pandas_time * 1000:8.2f} ms   engine {engine_time * 1000:8.2f} ms   "
+          f"x{pandas_time / engine_time:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--answers", type=int, default=100000)
+    parser.add_argument("--questions", type=int, default=1500)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    bank = build_bank(args.questions, rng)
+    df = build_answers(bank, args.answers, args.users, rng)
+    engine = progress_engine.for_bank(bank)
+
+    print(f"{args.answers} answers, {args.questions} questions, {len(SECTIONS)} sections, "
+          f"{args.users} users, batches of {args.batch}")
+
+    # Progress page: unseen questions of the user with the most answers
+    user = df["user"].value_counts().index[0]
+    answered = df.loc[df["user"] == user, "question_id"].unique()
+    pandas_time, expected = timed(lambda: pandas_unseen(bank, answered), args.repeat)
+    engine_time, unseen = timed(lambda: engine.unseen(answered), args.repeat)
+    got = pd.Series(unseen, index=engine.sections).loc[expected.index]
+    assert (got.to_numpy() == expected.to_numpy()).all(), "unseen differs from pandas"
+    report("progress page", pandas_time, engine_time)
+
+    # Answer write: section deltas of one batch of the write-behind queue
+    batch = df.iloc[:args.batch]
+    answers = batch.to_dict("records")
+    for answer in answers:
+        answer["answered_at"] = answer["answered_at"].to_pydatetime()
+    pandas_time, expected = timed(lambda: pandas_grouped(bank, batch), args.repeat)
+    engine_time, deltas = timed(lambda: section_progress.section_deltas(bank, answers), args.repeat)
+    got = pd.DataFrame(deltas).set_index(["user", "area"])[["correct", "incorrect"]].sort_index()
+    assert (got.to_numpy() == expected[["correct", "incorrect"]].to_numpy()).all(), \
+        "section_deltas differs from pandas"
+    report("answer write", pandas_time, engine_time)
+
+    # Rebuild: every user and section
+    pandas_time, expected = timed(lambda: pandas_grouped(bank, df), args.repeat)
+    engine_time, (users, correct, incorrect, last) = timed(
+        lambda: engine.grouped_counts(
+            df["user"].to_numpy(dtype=object), df["question_id"].to_numpy(), df["is_correct"].to_numpy(),
+            1 - df["is_correct"].to_numpy(), df["answered_at"].to_numpy()
+        ),
+        args.repeat
+    )
+    got = pd.DataFrame(
+        {"correct": correct.ravel(), "incorrect": incorrect.ravel(), "last_answered": last.ravel()},
+        index=pd.MultiIndex.from_product([users, engine.sections], names=["user", "area"])
+    ).loc[expected.index]
+    assert got.equals(expected[["correct", "incorrect", "last_answered"]].astype(got.dtypes)), \
+        "grouped_counts differs from pandas"
+    report("rebuild", pandas_time, engine_time)
+
+
+if __name__ == "__main__":
+    main()
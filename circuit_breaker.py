@@ -0,0 +1,178 @@
+"""
+Circuit breaker of the database engines.
+
+After FAILURE_THRESHOLD consecutive connection failures of an engine (a
+connection that cannot be opened, times out or is dropped) its breaker opens:
+db then fails fast with DatabaseUnavailable instead of waiting for the
+connection timeouts on every rerun. While a breaker is open, a background
+thread probes its database with SELECT 1 every PROBE_INTERVAL seconds and
+closes the breaker as soon as one succeeds, running the callbacks registered
+with on_close() (the answer writer replays its spool there).
+
+Errors of the statements themselves (syntax, constraints) do not count.
+"""
+import time
+import logging
+import threading
+from sqlalchemy import text
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+FAILURE_THRESHOLD = 3
+PROBE_INTERVAL = 5.0
+
+# Errors meaning the database cannot be reached, as opposed to a failing statement
+CONNECTION_ERRORS = (OperationalError, InterfaceError, DisconnectionError, PoolTimeoutError)
+
+
+class DatabaseUnavailable(Exception):
+    """The breaker of the database is open, the statement was not run."""
+
+
+# id(engine) -> breaker state
+_breakers = {}
+_breakers_lock = threading.Lock()
+_close_callbacks = []
+
+
+def _breaker(engine):
+    """State of the breaker of an engine, created closed."""
+    breaker = _breakers.get(id(engine))
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(id(engine), {
+                "engine": engine,
+                "open": False,
+                "failures": 0,
+                "opened_at": None,
+                "opened_count": 0,
+                "rejected": 0,
+                "last_error": None,
+            })
+    return breaker
+
+
+def is_connection_error(error):
+    """
+    Whether an error means the database cannot be reached.
+
+    Args:
+        error (Exception): Error raised by SQLAlchemy or the driver
+
+    Returns:
+        bool: True for connection failures, timeouts and dropped connections
+    """
+    if isinstance(error, DatabaseUnavailable):
+        return True
+    if getattr(error, "connection_invalidated", False):
+        return True
+    return isinstance(error, CONNECTION_ERRORS)
+
+
+def is_open(engine):
+    """
+    Whether the breaker of an engine is open (the database is considered down).
+
+    Args:
+        engine: SQLAlchemy engine
+
+    Returns:
+        bool: True while the database is unavailable
+    """
+    breaker = _breakers.get(id(engine))
+    return breaker is not None and breaker["open"]
+
+
+def check(engine):
+    """
+    Fail fast if the breaker of an engine is open.
+
+    Args:
+        engine: SQLAlchemy engine
+
+    Raises:
+        DatabaseUnavailable: If the breaker is open
+    """
+    breaker = _breakers.get(id(engine))
+    if breaker is not None and breaker["open"]:
+        with _breakers_lock:
+            breaker["rejected"] += 1
+        raise DatabaseUnavailable(f"Database unavailable since {time.ctime(breaker['opened_at'])}")
+
+
+def record_success(engine):
+    """Reset the consecutive failures of an engine after a statement that reached the database."""
+    breaker = _breakers.get(id(engine))
+    if breaker is not None and breaker["failures"]:
+        with _breakers_lock:
+            breaker["failures"] = 0
+
+
+def record_failure(engine, error):
+    """
+    Count a connection failure of an engine, opening its breaker at FAILURE_THRESHOLD.
+
+    Args:
+        engine: SQLAlchemy engine
+        error (Exception): The connection error
+    """
+    breaker = _breaker(engine)
+    with _breakers_lock:
+        breaker["failures"] += 1
+        breaker["last_error"] = str(error)[:500]
+        if breaker["open"] or breaker["failures"] < FAILURE_THRESHOLD:
+            return
+        breaker["open"] = True
+        breaker["opened_at"] = time.time()
+        breaker["opened_count"] += 1
+    logger.error(f"Database unavailable after {breaker['failures']} connection failures, circuit opened: {str(error)}")
+    threading.Thread(target=_probe, args=(breaker,), name="db-probe", daemon=True).start()
+
+
+def _probe(breaker):
+    """Probe the database of an open breaker until it answers, then close the breaker."""
+    engine = breaker["engine"]
+    while breaker["open"]:
+        time.sleep(PROBE_INTERVAL)
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except Exception as e:
+            breaker["last_error"] = str(e)[:500]
+            continue
+        with _breakers_lock:
+            breaker["open"] = False
+            breaker["failures"] = 0
+        logger.info(f"Database available again after {time.time() - breaker['opened_at']:.0f}s, circuit closed")
+        for callback in list(_close_callbacks):
+            try:
+                callback(engine)
+            except Exception as e:
+                logger.error(f"Error in circuit close callback: {str(e)}", exc_info=True)
+
+
+def on_close(callback):
+    """
+    Register a function to call with the engine when its breaker closes.
+
+    Args:
+        callback (callable): Function taking the engine
+    """
+    _close_callbacks.append(callback)
+
+
+def get_stats():
+    """
+    Get the state of every breaker.
+
+    Returns:
+        List[Dict]: open, failures, opened_count, rejected, opened_at and last_error per engine
+    """
+    with _breakers_lock:
+        return [
+            {key: value for key, value in breaker.items() if key != "engine"}
+            for breaker in _breakers.values()
+        ]
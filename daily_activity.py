@@ -0,0 +1,229 @@
+"""
+Answers per user and day, and the study streak computed from them.
+
+Fact_User_Daily_Activity keeps one row per user and day with answers: how many
+answers were given and how many were correct. The code that writes answers adds
+them with record(), in the same transaction as the insert into Fact_Answers,
+so the progress timeline reads one row per active day instead of the whole
+answer history.
+
+The streak comes from the same rows: streak() counts the consecutive days with
+answers ending today, or yesterday while today has none yet. The progress page
+and helper.update_streak both use it, so the streak of the progress tab and the
+streak_days of the gamification profile agree. rebuild() recomputes the table
+from Fact_Answers with one grouped INSERT.
+"""
+import json
+import logging
+import numpy as np
+import pandas as pd
+import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["day", "answers", "correct"]
+
+REBUILD_QUERY = """
+    INSERT INTO [esnowflake].[dbo].Fact_User_Daily_Activity
+    (user_nickname, activity_date, answers, correct)
+    SELECT
+        user_nickname,
+        CAST(ANSWER_TIMESTAMP AS date),
+        COUNT(*),
+        SUM(CAST(is_correct AS INT))
+    FROM [esnowflake].[dbo].FACT_ANSWERS
+    WHERE ANSWER_TIMESTAMP IS NOT NULL
+    GROUP BY user_nickname, CAST(ANSWER_TIMESTAMP AS date)
+"""
+
+
+def day_deltas(answers):
+    """
+    Add up answers per user and day.
+
+    The day is the date of answered_at, the ANSWER_TIMESTAMP stored with the
+    answer (UTC), the same one rebuild() groups by.
+
+    Args:
+        answers (List[Dict]): Answers with user, is_correct and optionally
+            answered_at (the current time if missing)
+
+    Returns:
+        List[Dict]: One entry per user and day with user, day (ISO date),
+            answers and correct
+    """
+    now = db.utc_now()
+    deltas = {}
+    for answer in answers:
+        day = (answer.get("answered_at") or now).date()
+        delta = deltas.setdefault((answer["user"], day), {
+            "user": answer["user"], "day": day.isoformat(), "answers": 0, "correct": 0
+        })
+        delta["answers"] += 1
+        delta["correct"] += 1 if answer["is_correct"] else 0
+    return list(deltas.values())
+
+
+def record(conn, answers, connection=None):
+    """
+    Add answers written to Fact_Answers to the daily activity of their users.
+
+    Args:
+        conn: Database connection
+        answers (List[Dict]): Answers with user, is_correct and optionally answered_at
+        connection (Connection, optional): Connection of the transaction that
+            inserts the answers
+
+    Returns:
+        int: Number of (user, day) rows updated
+    """
+    deltas = day_deltas(answers)
+    if not deltas:
+        return 0
+    db.execute_non_query(
+        conn,
+        "EXEC sp_AddDailyActivity @deltas=:deltas",
+        {"deltas": json.dumps(deltas)},
+        connection=connection
+    )
+    return len(deltas)
+
+
+def get_daily(conn, user):
+    """
+    Get the activity of a user per day.
+
+    Args:
+        conn: Database connection
+        user (str): Username
+
+    Returns:
+        pd.DataFrame: day (datetime64), answers and correct of every day with
+            answers, oldest first
+    """
+    daily = db.query_frame(
+        conn,
+        """
+        SELECT activity_date, answers, correct
+        FROM [esnowflake].[dbo].Fact_User_Daily_Activity
+        WHERE user_nickname = :user
+        ORDER BY activity_date
+        """,
+        {"user": user},
+        columns=COLUMNS,
+        fallback=True
+    )
+    daily["day"] = pd.to_datetime(daily["day"]).dt.normalize()
+    return daily
+
+
+def streak(days, today=None):
+    """
+    Count the consecutive days with activity up to today.
+
+    A streak is still alive the day after its last active day, so studying
+    later today continues it.
+
+    Args:
+        days (array-like): Days with activity (dates or datetimes, any order)
+        today (date, optional): The current day, in UTC like the activity days
+
+    Returns:
+        int: Length of the current streak, 0 if it is broken
+    """
+    today = today or db.utc_now().date()
+    ordinals = np.unique([pd.Timestamp(day).date().toordinal() for day in days])
+    if len(ordinals) == 0 or ordinals[-1] < today.toordinal() - 1:
+        return 0
+    # The streak starts after the last gap between consecutive active days
+    gaps = np.nonzero(np.diff(ordinals) != 1)[0]
+    return int(len(ordinals) - (gaps[-1] + 1 if len(gaps) else 0))
+
+
+def get_summary(conn, user):
+    """
+    Get the daily activity of a user with its totals and current streak.
+
+    Args:
+        conn: Database connection
+        user (str): Username
+
+    Returns:
+        Dict: daily (see get_daily), answers, correct, accuracy (percent) and streak
+    """
+    daily = get_daily(conn, user)
+    answers = int(daily["answers"].sum())
+    correct = int(daily["correct"].sum())
+    return {
+        "daily": daily,
+        "answers": answers,
+        "correct": correct,
+        "accuracy": correct / answers * 100 if answers else 0,
+        "streak": streak(daily["day"]),
+    }
+
+
+def sync_streak(conn, user):
+    """
+    Store the current streak of a user in Dim_Users.
+
+    The day the streak was last credited is kept in streak_date: last_active
+    cannot tell it, every XP award (a practice batch included) sets it.
+
+    Args:
+        conn: Database connection
+        user (str): Username
+
+    Returns:
+        tuple: (streak_days, is_new_streak_day), the second True the first time
+            it is called on a day the user has answered
+    """
+    today = db.utc_now().date()
+    daily = get_daily(conn, user)
+    streak_days = streak(daily["day"], today)
+    active_today = len(daily) > 0 and daily["day"].iloc[-1].date() == today
+
+    if active_today:
+        # Only the first call of the day finds another streak_date
+        credited = db.execute_non_query(
+            conn,
+            """
+            UPDATE [esnowflake].[dbo].Dim_Users
+            SET streak_days = :streak_days, streak_date = :today
+            WHERE name = :username AND (streak_date IS NULL OR streak_date <> :today)
+            """,
+            {"streak_days": streak_days, "today": today, "username": user}
+        )
+        if credited:
+            return streak_days, True
+
+    db.execute_non_query(
+        conn,
+        """
+        UPDATE [esnowflake].[dbo].Dim_Users
+        SET streak_days = :streak_days
+        WHERE name = :username AND (streak_days IS NULL OR streak_days <> :streak_days)
+        """,
+        {"streak_days": streak_days, "username": user}
+    )
+    return streak_days, False
+
+
+def rebuild(conn):
+    """
+    Recompute the daily activity of every user from Fact_Answers.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        int: Number of (user, day) rows written
+    """
+    with db.transaction(conn) as connection:
+        db.execute_non_query(
+            conn, "DELETE FROM [esnowflake].[dbo].Fact_User_Daily_Activity", connection=connection
+        )
+        rows = db.execute_non_query(conn, REBUILD_QUERY, connection=connection)
+    logger.info(f"Daily activity rebuilt: {rows} rows")
+    return rows
@@ -0,0 +1,513 @@
+"""
+Data-access layer shared by every page.
+
+All the database access goes through the SQLAlchemy engine returned by
+helper.init_connection (the pyodbc fallback is wrapped in an engine too), so
+every query checks a connection out of the engine pool and returns it as soon
+as it is done.
+
+Engines are kept in a registry keyed by the target database (server and
+database name), so the four specialties share one pool. Every pool gets a
+connection limit (POOL_LIMITS) out of a global budget for the process
+(POOL_BUDGET), and get_pool_stats() reports its usage and checkout waits.
+
+Queries use named parameters (":user"), their compiled text() statements are
+cached, and rows can be returned as tuples, dicts or a row type.
+
+Every statement is timed and recorded in query_stats, with its rows and the
+wait for a pool connection.
+
+Connection failures feed the circuit breaker of the engine (circuit_breaker):
+while it is open, statements fail fast with DatabaseUnavailable, and reads
+made with fallback=True return the last result of the same query instead, so
+pages keep working read-only from recent data.
+
+Several statements that must succeed or fail together run in transaction():
+
+    with db.transaction(conn) as connection:
+        db.execute_non_query(conn, update, params, connection=connection)
+        db.execute_many(conn, insert, rows, connection=connection)
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+import query_stats
+import circuit_breaker
+from circuit_breaker import DatabaseUnavailable
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAX_STATEMENTS = 512
+MAX_RECENT_RESULTS = 1000
+
+# Connections allowed for the whole process, and per database (by connection type)
+POOL_BUDGET = 50
+POOL_LIMITS = {"especialidades": 40, "sql": 10}
+DEFAULT_POOL_LIMIT = 10
+POOL_TIMEOUT = 30
+
+# (server, database) -> Engine
+_engines = {}
+# id(engine) -> pool statistics
+_pool_stats = {}
+_engines_lock = threading.Lock()
+
+# SQL -> compiled text() statement
+_statements = {}
+_statements_lock = threading.Lock()
+
+# (id(engine), SQL, params) -> last result of the reads made with fallback=True
+_recent = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+def statement(query):
+    """
+    Get the text() statement of a query, compiled once per process.
+
+    Args:
+        query (str): SQL with named parameters
+
+    Returns:
+        TextClause: The statement
+    """
+    compiled = _statements.get(query)
+    if compiled is None:
+        compiled = text(query)
+        with _statements_lock:
+            if len(_statements) >= MAX_STATEMENTS:
+                _statements.clear()
+            _statements[query] = compiled
+    return compiled
+
+
+def utc_now():
+    """
+    Get the current time in UTC, the clock of every ANSWER_TIMESTAMP.
+
+    Answers are stamped by the app, not by the server, so queued practice
+    answers and exam answers share one clock whenever they reach the database.
+
+    Returns:
+        datetime: Naive UTC time
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _pool_limit(name):
+    """Connection limit for a new pool, within what is left of the budget."""
+    assigned = sum(stats["limit"] for stats in _pool_stats.values())
+    limit = min(POOL_LIMITS.get(name, DEFAULT_POOL_LIMIT), POOL_BUDGET - assigned)
+    if limit < 1:
+        logger.warning(f"Connection budget of {POOL_BUDGET} exhausted, pool {name} gets 1 connection")
+        limit = 1
+    return limit
+
+
+def get_engine(name, target, url, creator=None):
+    """
+    Get the engine of a target database, creating its pool the first time.
+
+    Args:
+        name (str): Connection type, used for the limit (especialidades, sql)
+        target (Tuple[str, str]): Server and database name
+        url (str): SQLAlchemy URL
+        creator (callable, optional): Function returning a DBAPI connection
+
+    Returns:
+        Engine: The engine shared by every user of the database
+    """
+    engine = _engines.get(target)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        engine = _engines.get(target)
+        if engine is None:
+            limit = _pool_limit(name)
+            pool_size = max(1, limit // 2)
+            kwargs = {"creator": creator} if creator is not None else {}
+            engine = create_engine(
+                url,
+                pool_pre_ping=True,                 # Check connection validity before use
+                pool_recycle=1800,                  # Recycle connections after 30 minutes
+                pool_size=pool_size,
+                max_overflow=limit - pool_size,
+                pool_timeout=POOL_TIMEOUT,
+                **kwargs
+            )
+            _pool_stats[id(engine)] = {
+                "name": name,
+                "database": target[1],
+                "limit": limit,
+                "pool_size": pool_size,
+                "checkouts": 0,
+                "timeouts": 0,
+                "wait_seconds": 0.0,
+                "max_wait_seconds": 0.0,
+            }
+            _engines[target] = engine
+            logger.info(f"Connection pool for {name} ({target[1]}): {pool_size} + {limit - pool_size} overflow")
+    return engine
+
+
+def engine_target(engine):
+    """
+    Get the target database of an engine of the registry.
+
+    Args:
+        engine: SQLAlchemy engine
+
+    Returns:
+        Tuple[str, str] or None: Server and database name
+    """
+    for target, candidate in list(_engines.items()):
+        if candidate is engine:
+            return target
+    return None
+
+
+def find_engine(target):
+    """
+    Get the engine of a target database, if it was already created.
+
+    Args:
+        target (Tuple[str, str]): Server and database name
+
+    Returns:
+        Engine or None: The engine
+    """
+    return _engines.get(tuple(target))
+
+
+def _record_checkout(conn, wait, timed_out=False):
+    """Add a checkout to the statistics of the engine pool."""
+    stats = _pool_stats.get(id(conn))
+    if stats is None:
+        return
+    with _engines_lock:
+        if timed_out:
+            stats["timeouts"] += 1
+            return
+        stats["checkouts"] += 1
+        stats["wait_seconds"] += wait
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], wait)
+
+
+def get_pool_stats():
+    """
+    Get the usage of every connection pool.
+
+    Returns:
+        List[Dict]: One entry per database with its limits, the connections
+            checked out and in overflow now, the checkout waits so far and
+            whether its circuit breaker is open
+    """
+    rows = []
+    with _engines_lock:
+        for engine in _engines.values():
+            stats = dict(_pool_stats[id(engine)])
+            pool = engine.pool
+            checkouts = stats.pop("checkouts")
+            wait = stats.pop("wait_seconds")
+            stats["checked_out"] = pool.checkedout() if hasattr(pool, "checkedout") else None
+            stats["overflow"] = max(pool.overflow(), 0) if hasattr(pool, "overflow") else None
+            stats["checkouts"] = checkouts
+            stats["avg_wait_ms"] = round(wait / checkouts * 1000, 2) if checkouts else 0.0
+            stats["max_wait_ms"] = round(stats.pop("max_wait_seconds") * 1000, 2)
+            stats["circuit_open"] = circuit_breaker.is_open(engine)
+            rows.append(stats)
+    return rows
+
+
+@contextmanager
+def _pooled(conn):
+    """Check a connection out of the engine pool, timing the wait."""
+    circuit_breaker.check(conn)
+    start = time.perf_counter()
+    try:
+        connection = conn.connect()
+    except PoolTimeoutError as e:
+        _record_checkout(conn, time.perf_counter() - start, timed_out=True)
+        circuit_breaker.record_failure(conn, e)
+        raise
+    except Exception as e:
+        if circuit_breaker.is_connection_error(e):
+            circuit_breaker.record_failure(conn, e)
+        raise
+    _record_checkout(conn, time.perf_counter() - start)
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+@contextmanager
+def checkout(conn, connection=None):
+    """
+    Check a connection out of the engine pool, or reuse the one given.
+
+    Args:
+        conn: SQLAlchemy engine
+        connection (Connection, optional): Connection of an open transaction
+
+    Yields:
+        Connection: The connection, returned to the pool on exit
+    """
+    if connection is not None:
+        yield connection
+        return
+    with _pooled(conn) as pooled:
+        yield pooled
+
+
+@contextmanager
+def transaction(conn):
+    """
+    Run several statements in one transaction, committed on success and
+    rolled back if any of them fails.
+
+    Args:
+        conn: SQLAlchemy engine
+
+    Yields:
+        Connection: The connection to pass to the execute functions
+    """
+    with _pooled(conn) as connection:
+        with connection.begin():
+            yield connection
+
+
+@contextmanager
+def _measured(conn, query, connection=None, begin=False):
+    """
+    Get the connection for a statement and record its execution in query_stats.
+
+    Yields:
+        Tuple[Connection, Dict]: The connection, and the outcome where the
+            caller sets the number of rows
+    """
+    start = time.perf_counter()
+    outcome = {"rows": 0, "wait": 0.0, "error": False, "connected": False}
+    if connection is not None:
+        active = nullcontext(connection)
+    else:
+        active = transaction(conn) if begin else _pooled(conn)
+    try:
+        with active as connection:
+            outcome["wait"] = time.perf_counter() - start
+            outcome["connected"] = True
+            yield connection, outcome
+        circuit_breaker.record_success(conn)
+    except Exception as e:
+        outcome["error"] = True
+        # Failures to connect are counted by _pooled, here only the dropped connections
+        if outcome["connected"] and circuit_breaker.is_connection_error(e):
+            circuit_breaker.record_failure(conn, e)
+        raise
+    finally:
+        query_stats.record(
+            query, time.perf_counter() - start, outcome["rows"], outcome["wait"], outcome["error"]
+        )
+
+
+def _recent_key(conn, query, params):
+    """Key of a read in the recent results, params by repr so lists and dicts can be keys."""
+    return (id(conn), query, tuple(sorted((name, repr(value)) for name, value in (params or {}).items())))
+
+
+def _remember(key, value):
+    """Keep the result of a read made with fallback=True."""
+    with _recent_lock:
+        _recent[key] = value
+        _recent.move_to_end(key)
+        while len(_recent) > MAX_RECENT_RESULTS:
+            _recent.popitem(last=False)
+
+
+def _recall(key, query, error):
+    """
+    Get the last result of a read that failed because the database is unavailable.
+
+    Returns:
+        The result, or None if the read had no result or failed for another reason
+    """
+    if key is None or not circuit_breaker.is_connection_error(error):
+        return None
+    recent = _recent.get(key)
+    if recent is not None:
+        logger.warning(f"Database unavailable, serving the last result of: {query_stats.normalize(query)[:200]}")
+    return recent
+
+
+def _map_rows(result, as_dict, row_type):
+    """Convert the rows of a result to tuples, dicts or row_type instances."""
+    if row_type is not None:
+        return [row_type(**row) for row in result.mappings()]
+    if as_dict:
+        return [dict(row) for row in result.mappings()]
+    return result.fetchall()
+
+
+def execute_query(conn, query, params=None, fetch_all=True, as_dict=False, row_type=None,
+                  connection=None, fallback=False):
+    """
+    Execute a SQL query and fetch its rows.
+
+    Args:
+        conn: SQLAlchemy engine
+        query (str): SQL query with named parameters
+        params (dict, optional): Parameters for the query
+        fetch_all (bool): Whether to fetch all results (True) or just one (False)
+        as_dict (bool): Whether to return results as dictionaries (True) or tuples (False)
+        row_type (type, optional): Build every row as row_type(**columns), e.g. a NamedTuple
+        connection (Connection, optional): Connection of an open transaction
+        fallback (bool): Return the last result of the query if the database is unavailable
+
+    Returns:
+        list: Query results (a single row or None if fetch_all is False)
+    """
+    key = _recent_key(conn, query, params) if fallback else None
+    try:
+        with _measured(conn, query, connection) as (active, outcome):
+            result = active.execute(statement(query), params or {})
+            if not result.returns_rows:
+                return [] if fetch_all else None
+            rows = _map_rows(result, as_dict, row_type)
+            outcome["rows"] = len(rows)
+        value = rows if fetch_all else (rows[0] if rows else None)
+        if key is not None:
+            _remember(key, value)
+        return value
+    except Exception as e:
+        recent = _recall(key, query, e)
+        if recent is not None:
+            return recent
+        if isinstance(e, DatabaseUnavailable):
+            raise
+        logger.error(f"Error executing query: {str(e)}", exc_info=True)
+        logger.error(f"Query: {query}")
+        logger.error(f"Params: {params}")
+        raise Exception(f"Database query error: {str(e)}")
+
+
+def execute_scalar(conn, query, params=None, default=None, connection=None, fallback=False):
+    """
+    Execute a SQL query and return the first column of its first row.
+
+    Args:
+        conn: SQLAlchemy engine
+        query (str): SQL query with named parameters
+        params (dict, optional): Parameters for the query
+        default: Value returned when there are no rows or the value is NULL
+        connection (Connection, optional): Connection of an open transaction
+        fallback (bool): Return the last result of the query if the database is unavailable
+
+    Returns:
+        The value
+    """
+    row = execute_query(conn, query, params, fetch_all=False, connection=connection, fallback=fallback)
+    if row is None or row[0] is None:
+        return default
+    return row[0]
+
+
+def query_frame(conn, query, params=None, columns=None, connection=None, fallback=False):
+    """
+    Execute a SQL query and return its rows as a DataFrame.
+
+    Args:
+        conn: SQLAlchemy engine
+        query (str): SQL query with named parameters
+        params (dict, optional): Parameters for the query
+        columns (List[str], optional): Column names, defaults to the result columns
+        connection (Connection, optional): Connection of an open transaction
+        fallback (bool): Return the last result of the query if the database is unavailable
+
+    Returns:
+        pd.DataFrame: The rows
+    """
+    key = _recent_key(conn, query, params) if fallback else None
+    try:
+        with _measured(conn, query, connection) as (active, outcome):
+            result = active.execute(statement(query), params or {})
+            rows = result.fetchall()
+            outcome["rows"] = len(rows)
+            frame = pd.DataFrame(rows, columns=columns or list(result.keys()))
+        if key is not None:
+            _remember(key, frame.copy())
+        return frame
+    except Exception as e:
+        recent = _recall(key, query, e)
+        if recent is not None:
+            return recent.copy()
+        if isinstance(e, DatabaseUnavailable):
+            raise
+        logger.error(f"Error executing query: {str(e)}", exc_info=True)
+        logger.error(f"Query: {query}")
+        logger.error(f"Params: {params}")
+        raise Exception(f"Database query error: {str(e)}")
+
+
+def execute_non_query(conn, query, params=None, connection=None):
+    """
+    Execute a non-query SQL statement (INSERT, UPDATE, DELETE).
+
+    Outside a transaction() the statement is committed on its own.
+
+    Args:
+        conn: SQLAlchemy engine
+        query (str): SQL statement with named parameters
+        params (dict, optional): Parameters for the statement
+        connection (Connection, optional): Connection of an open transaction
+
+    Returns:
+        int: Number of affected rows
+    """
+    try:
+        with _measured(conn, query, connection, begin=True) as (active, outcome):
+            outcome["rows"] = active.execute(statement(query), params or {}).rowcount
+            return outcome["rows"]
+    except DatabaseUnavailable:
+        raise
+    except Exception as e:
+        logger.error(f"Error executing non-query: {str(e)}", exc_info=True)
+        logger.error(f"Query: {query}")
+        logger.error(f"Params: {params}")
+        raise Exception(f"Database update error: {str(e)}")
+
+
+def execute_many(conn, query, params_list, connection=None):
+    """
+    Execute a statement once per parameter set, in a single round of executemany.
+
+    Args:
+        conn: SQLAlchemy engine
+        query (str): SQL statement with named parameters
+        params_list (List[dict]): One parameter set per execution
+        connection (Connection, optional): Connection of an open transaction
+
+    Returns:
+        int: Number of parameter sets executed
+    """
+    if not params_list:
+        return 0
+    try:
+        with _measured(conn, query, connection, begin=True) as (active, outcome):
+            active.execute(statement(query), list(params_list))
+            outcome["rows"] = len(params_list)
+        return len(params_list)
+    except DatabaseUnavailable:
+        raise
+    except Exception as e:
+        logger.error(f"Error executing batch: {str(e)}", exc_info=True)
+        logger.error(f"Query: {query}")
+        logger.error(f"Rows: {len(params_list)}")
+        raise Exception(f"Database update error: {str(e)}")
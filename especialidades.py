@@ -23,6 +23,12 @@ import sql_especialidad.tools_sql as tsql
 import helper as h
 import json_and_excels_admin as jtc
 import pandas as pd
+import warmup
+import query_stats
+import circuit_breaker
+
+# Warm up the caches once per process (no-op if the container entrypoint already did)
+warmup.start()
 
 # Constants
 PAGES = [
@@ -235,9 +241,16 @@ def render_certification_page(certification_type):
     # Initialize database connection
     conn = h.init_connection(certification_type)
     
-    # Initialize data
+    # Pin one question bank version for the whole rerun
     datos = t.get_datos(certification_type)
     
+    # Read-only mode while the database is unavailable
+    if circuit_breaker.is_open(conn):
+        st.warning(
+            "La base de datos no está disponible: se muestran los últimos datos guardados. "
+            "Tus respuestas se guardarán cuando vuelva a estar disponible."
+        )
+    
     # Get user
     user = h.get_user_none()
     
@@ -265,6 +278,7 @@ def render_certification_page(certification_type):
     
     # Update session state
     st.session_state["current_page"] = current_page
+    query_stats.set_page(f"{certification_type} - {current_page}")
     
     # Render selected page
     try:
@@ -364,20 +378,21 @@ def render_admin_page():
         go_to_main()
         st.rerun()
 
-# Main application flow
-if "page" not in st.session_state or st.session_state.page == "main":
-    main_page()
-elif st.session_state.page == "snowflake":
-    render_snowflake_page()
-elif st.session_state.page == "snowflake_pro":
-    render_certification_page("snowflake_pro")
-elif st.session_state.page == "snowflake_arch":
-    render_certification_page("snowflake_arch")
-elif st.session_state.page == "dbt":
-    render_certification_page("dbt")
-elif st.session_state.page == "google":
-    render_certification_page("google")
-elif st.session_state.page == "sql":
-    render_sql_page()
-elif st.session_state.page == "ADMIN":
-    render_admin_page()
\ No newline at end of file
+# Main application flow, timing the database round trips of the render
+with query_stats.render(st.session_state.get("page", "main")):
+    if "page" not in st.session_state or st.session_state.page == "main":
+        main_page()
+    elif st.session_state.page == "snowflake":
+        render_snowflake_page()
+    elif st.session_state.page == "snowflake_pro":
+        render_certification_page("snowflake_pro")
+    elif st.session_state.page == "snowflake_arch":
+        render_certification_page("snowflake_arch")
+    elif st.session_state.page == "dbt":
+        render_certification_page("dbt")
+    elif st.session_state.page == "google":
+        render_certification_page("google")
+    elif st.session_state.page == "sql":
+        render_sql_page()
+    elif st.session_state.page == "ADMIN":
+        render_admin_page()
\ No newline at end of file
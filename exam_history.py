@@ -0,0 +1,142 @@
+"""
+Exam history of a user, one page at a time.
+
+get_page() reads PAGE_SIZE exams of a user, newest first, with keyset
+pagination on (start_time, id_exam): the cursor of a page is the last exam it
+shows, and the next page starts right after it. Every page is one seek on
+IX_Exams_User_Start, however old the exams are, unlike OFFSET paging.
+
+get_details() reads the answers of one exam from Fact_Answers (through
+IX_Answers_Exam). The progress page only calls it for exams whose detail the
+user opens.
+"""
+import logging
+import pandas as pd
+import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 6
+
+COLUMNS = [
+    "id_exam", "start_time", "duration_minutes",
+    "number_of_questions", "number_of_correct_questions",
+    "number_of_failed_questions"
+]
+
+DETAIL_COLUMNS = ["question_id", "is_correct", "is_answered", "answered_at"]
+
+PAGE_QUERY = """
+    SELECT
+        id_exam, start_time, duration_minutes,
+        number_of_questions, number_of_correct_questions,
+        number_of_failed_questions
+    FROM [esnowflake].[dbo].FACT_EXAMS
+    WHERE user_nickname = :user
+    {after}
+    ORDER BY start_time DESC, id_exam DESC
+    OFFSET 0 ROWS FETCH NEXT :rows ROWS ONLY
+"""
+
+AFTER_CURSOR = """
+    AND (start_time < :start_time OR (start_time = :start_time AND id_exam < :id_exam))
+"""
+
+
+def get_page(conn, user, cursor=None, page_size=PAGE_SIZE):
+    """
+    Get a page of the exams of a user, newest first.
+
+    Args:
+        conn: Database connection
+        user (str): Username
+        cursor (tuple, optional): (start_time, id_exam) of the last exam of the
+            previous page, None for the first page
+        page_size (int): Exams per page
+
+    Returns:
+        tuple: (pd.DataFrame with COLUMNS, cursor of the next page or None if
+            this is the last one)
+    """
+    params = {"user": user, "rows": page_size + 1}
+    if cursor is not None:
+        params["start_time"], params["id_exam"] = cursor
+    exams = db.query_frame(
+        conn,
+        PAGE_QUERY.format(after=AFTER_CURSOR if cursor is not None else ""),
+        params,
+        columns=COLUMNS,
+        fallback=True
+    )
+
+    # Handle null values
+    for col in ["number_of_questions", "number_of_correct_questions", "number_of_failed_questions"]:
+        exams[col] = exams[col].fillna(0).astype(int)
+
+    # One extra row tells whether there is a next page
+    if len(exams) <= page_size:
+        return exams, None
+    exams = exams.iloc[:page_size]
+    last = exams.iloc[-1]
+    if pd.isnull(last["start_time"]):
+        # Exams without start time sort last and cannot be sought past
+        return exams, None
+    return exams, (pd.Timestamp(last["start_time"]).to_pydatetime(), int(last["id_exam"]))
+
+
+def get_details(conn, exam_id):
+    """
+    Get the answers of an exam.
+
+    Args:
+        conn: Database connection
+        exam_id: Id of the exam
+
+    Returns:
+        pd.DataFrame: question_id, is_correct, is_answered and answered_at of
+            every question of the exam
+    """
+    return db.query_frame(
+        conn,
+        """
+        SELECT question_id, is_correct, is_answered, ANSWER_TIMESTAMP
+        FROM [esnowflake].[dbo].FACT_ANSWERS
+        WHERE exam_id = :exam_id
+        ORDER BY question_id
+        """,
+        {"exam_id": exam_id},
+        columns=DETAIL_COLUMNS,
+        fallback=True
+    )
+
+
+def breakdown(bank, details):
+    """
+    Describe every question of an exam for display.
+
+    Args:
+        bank (qb.QuestionBank): Bank of the exam
+        details (pd.DataFrame): Answers from get_details()
+
+    Returns:
+        pd.DataFrame: Pregunta, Sección and Resultado per question
+    """
+    resultados = []
+    for answer in details.itertuples(index=False):
+        record = bank.record(int(answer.question_id)) or {}
+        areas = record.get("question_area") or []
+        if isinstance(areas, str):
+            areas = [areas]
+        if not answer.is_answered:
+            resultado = "En blanco"
+        elif answer.is_correct:
+            resultado = "Acertada"
+        else:
+            resultado = "Fallada"
+        resultados.append({
+            "Pregunta": int(answer.question_id),
+            "Sección": ", ".join(areas),
+            "Resultado": resultado,
+        })
+    return pd.DataFrame(resultados, columns=["Pregunta", "Sección", "Resultado"])
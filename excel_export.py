@@ -0,0 +1,192 @@
+"""
+Prebuilt Excel exports of the question banks.
+
+The workbook of a bank is built once per bank version with openpyxl's
+write-only writer and stored next to the JSON file as <especialidad>_export.xlsx.
+Its sheet is named after a placeholder, and the two parts that carry the sheet
+name (xl/workbook.xml and docProps/app.xml) are left out of the stored zip and
+kept as templates in its comment, together with the bank version.
+
+Every download is stamped with its own watermark (the sheet name) by copying
+the stored zip and appending the two small parts with the placeholder
+replaced, so the sheet data is never generated again.
+
+The export is built ahead of the downloads: by the warm-up when the app starts
+and by the question bank compactor after admin edits are folded, so a page
+never builds it on a rerun.
+"""
+import io
+import os
+import json
+import zipfile
+import threading
+import logging
+from openpyxl import Workbook
+import question_bank as qb
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER = "__MARCA__"
+STAMPED_PARTS = ("xl/workbook.xml", "docProps/app.xml")
+EXPORT_COLUMNS = [
+    "question_number", "question_area", "question", "question_extra_info",
+    "answers", "correct_answer", "explanation", "reference",
+]
+
+# especialidad -> (version, zip bytes without the stamped parts, templates)
+_artifacts = {}
+_artifacts_lock = threading.Lock()
+_build_locks = {especialidad: threading.Lock() for especialidad in qb.ESPECIALIDADES}
+
+
+def export_path(especialidad):
+    """Path of the prebuilt export of a bank."""
+    return os.path.join(qb.RUTA, f"{especialidad}_export.xlsx")
+
+
+def _export_row(question):
+    """Row of the export for a question, lists written as Python literals."""
+    return [
+        question.get("question_number"),
+        str(question.get("question_area", [])),
+        question.get("question"),
+        question.get("question_extra_info", ""),
+        str(question.get("answers", [])),
+        str(question.get("correct_answer", [])),
+        (question.get("explanation") or "").replace("\n", " ").replace("\r", ""),
+        str(question.get("reference", [])),
+    ]
+
+
+def build_artifact(bank):
+    """
+    Build the export of a bank.
+
+    Args:
+        bank (qb.QuestionBank): The published bank
+
+    Returns:
+        Tuple[bytes, Dict[str, str]]: The zip without the stamped parts and the
+            templates of those parts
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(PLACEHOLDER)
+    sheet.append(EXPORT_COLUMNS)
+    for question in bank.records:
+        sheet.append(_export_row(question))
+
+    full = io.BytesIO()
+    workbook.save(full)
+
+    templates = {}
+    base = io.BytesIO()
+    with zipfile.ZipFile(full) as source, \
+            zipfile.ZipFile(base, "w", zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            if info.filename in STAMPED_PARTS:
+                templates[info.filename] = source.read(info).decode("utf-8")
+            else:
+                target.writestr(info, source.read(info))
+        target.comment = json.dumps(
+            {"version": list(bank.cache_version or ()), "templates": templates}
+        ).encode("utf-8")
+    return base.getvalue(), templates
+
+
+def _read_artifact(path, version):
+    """Load a stored export if it was built from the given bank version."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        with zipfile.ZipFile(io.BytesIO(data)) as stored:
+            meta = json.loads(stored.comment.decode("utf-8"))
+    except (OSError, ValueError, zipfile.BadZipFile):
+        return None
+    if tuple(meta.get("version", ())) != tuple(version):
+        return None
+    return data, meta["templates"]
+
+
+def _write_artifact(path, data):
+    """Store an export atomically, next to the JSON file."""
+    # Unique per thread: the compactor and a page can build the same export
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def get_artifact(especialidad):
+    """
+    Get the export of the current version of a bank, building it if needed.
+
+    Args:
+        especialidad (str): The specialization type
+
+    Returns:
+        Tuple[bytes, Dict[str, str]]: The zip without the stamped parts and their templates
+    """
+    bank = qb.get_bank(especialidad)
+    version = bank.cache_version
+    cached = _artifacts.get(especialidad)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+
+    with _build_locks[especialidad]:
+        cached = _artifacts.get(especialidad)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+
+        path = export_path(especialidad)
+        artifact = _read_artifact(path, version)
+        if artifact is None:
+            artifact = build_artifact(bank)
+            try:
+                _write_artifact(path, artifact[0])
+            except OSError as e:
+                logger.warning(f"Could not store the Excel export of {especialidad}: {str(e)}")
+            logger.info(f"Excel export built for {especialidad}: {len(bank)} questions")
+
+        with _artifacts_lock:
+            _artifacts[especialidad] = (version, artifact[0], artifact[1])
+        return artifact
+
+
+def prebuild(especialidad):
+    """
+    Build the export of the current version of a bank ahead of its downloads.
+
+    Args:
+        especialidad (str): The specialization type
+
+    Returns:
+        str: Size of the export, for the warm-up state
+    """
+    data, _ = get_artifact(especialidad)
+    return f"{len(data)} bytes"
+
+
+qb.add_compaction_listener(prebuild)
+
+
+def stamp(especialidad, marca):
+    """
+    Get a copy of the export of a bank with its own watermark.
+
+    Args:
+        especialidad (str): The specialization type
+        marca (str): Watermark, used as the sheet name
+
+    Returns:
+        io.BytesIO: The .xlsx file, positioned at the start
+    """
+    data, templates = get_artifact(especialidad)
+    buffer = io.BytesIO(data)
+    with zipfile.ZipFile(buffer, "a", zipfile.ZIP_DEFLATED) as target:
+        target.comment = b""
+        for name in STAMPED_PARTS:
+            target.writestr(name, templates[name].replace(PLACEHOLDER, marca))
+    buffer.seek(0)
+    return buffer
+
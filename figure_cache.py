@@ -0,0 +1,116 @@
+"""
+Cache of the Plotly figures of the progress, exam and XP pages.
+
+Those pages built every figure again on each rerun (a donut per section and per
+past exam, the daily timeline, the XP chart) although the numbers behind them
+rarely change between reruns. get_figure() keys a figure by its kind and a hash
+of the aggregate it shows, and only calls the builder on a miss. Built figures
+are kept in an LRU of MAX_FIGURES entries shared by every session.
+
+The cache keeps plotly Figure objects, not their JSON: st.plotly_chart
+validates dict input again, which costs more than building the figure, while a
+Figure is only serialized. Figures from the cache must not be modified.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAX_FIGURES = 1024
+
+# (kind, digest) -> figure, least recently used first
+_figures = OrderedDict()
+_figures_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _update(hasher, data):
+    """Feed an aggregate (frames, sequences, dicts and scalars) to a hash."""
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        labels = list(data.columns) if isinstance(data, pd.DataFrame) else data.name
+        hasher.update(repr((type(data).__name__, labels)).encode())
+        hasher.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    elif isinstance(data, (list, tuple)):
+        hasher.update(b"[")
+        for item in data:
+            _update(hasher, item)
+            hasher.update(b",")
+        hasher.update(b"]")
+    elif isinstance(data, dict):
+        _update(hasher, sorted(data.items(), key=lambda item: repr(item[0])))
+    else:
+        hasher.update(repr(data).encode())
+
+
+def digest(data):
+    """
+    Hash the aggregate behind a figure.
+
+    Args:
+        data: Numbers and labels shown by the figure (frames, lists, tuples,
+            dicts or scalars, nested in any way)
+
+    Returns:
+        str: Hex digest, equal for equal aggregates
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    _update(hasher, data)
+    return hasher.hexdigest()
+
+
+def get_figure(kind, data, build):
+    """
+    Get the figure of an aggregate, building it only if it is not cached.
+
+    Args:
+        kind (str): Kind of figure, so equal data in different charts do not collide
+        data: Everything the figure depends on (see digest())
+        build (callable): Function without arguments that builds the figure
+
+    Returns:
+        go.Figure: The figure, shared with other sessions (do not modify it)
+    """
+    key = (kind, digest(data))
+    with _figures_lock:
+        figure = _figures.get(key)
+        if figure is not None:
+            _figures.move_to_end(key)
+            _stats["hits"] += 1
+            return figure
+
+    figure = build()
+    with _figures_lock:
+        _figures[key] = figure
+        _figures.move_to_end(key)
+        _stats["misses"] += 1
+        while len(_figures) > MAX_FIGURES:
+            _figures.popitem(last=False)
+            _stats["evictions"] += 1
+    return figure
+
+
+def get_stats():
+    """
+    Get the statistics of the cache.
+
+    Returns:
+        Dict: figures cached, hits, misses, evictions and hit_rate (percent)
+    """
+    with _figures_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return dict(
+            _stats,
+            figures=len(_figures),
+            hit_rate=round(_stats["hits"] / lookups * 100, 1) if lookups else 0.0,
+        )
+
+
+def clear():
+    """Drop every cached figure."""
+    with _figures_lock:
+        _figures.clear()
+    logger.info("Figure cache cleared")
@@ -3,6 +3,9 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import helper as h
+import leaderboard as lb
+import circuit_breaker
+import figure_cache
 import logging
 from datetime import datetime, timedelta
 
@@ -126,7 +129,7 @@ def display_achievements(conn, user, is_sql=False):
             ORDER BY ua.earned_date DESC
             """
         
-        achievements = h.execute_query(conn, query, {"username": user}, as_dict=True)
+        achievements = h.execute_query(conn, query, {"username": user}, as_dict=True, fallback=True)
         
         if not achievements:
             st.markdown("### Logros")
@@ -176,7 +179,7 @@ def display_achievements(conn, user, is_sql=False):
             )
             """
         
-        available_achievements = h.execute_query(conn, query, {"username": user}, as_dict=True)
+        available_achievements = h.execute_query(conn, query, {"username": user}, as_dict=True, fallback=True)
         
         if available_achievements:
             st.markdown("### Logros disponibles")
@@ -198,6 +201,37 @@ def display_achievements(conn, user, is_sql=False):
         logger.error(f"Error displaying achievements: {str(e)}", exc_info=True)
         st.error("Error displaying achievements")
 
+def _xp_history_figure(df):
+    """
+    Build the bar chart of the XP gained per day.
+    
+    Args:
+        df (pd.DataFrame): date and daily_xp of the last 30 days
+        
+    Returns:
+        go.Figure: The chart
+    """
+    fig = px.bar(
+        df, 
+        x='date', 
+        y='daily_xp',
+        labels={'date': 'Fecha', 'daily_xp': 'XP diario'},
+        title='XP ganado en los últimos 30 días'
+    )
+    
+    # Set color based on XP amount
+    fig.update_traces(marker_color=df['daily_xp'].apply(
+        lambda x: 'lightblue' if x < 20 else ('royalblue' if x < 50 else 'darkblue')
+    ))
+    
+    # Update layout
+    fig.update_layout(
+        xaxis_title="Fecha",
+        yaxis_title="XP ganado",
+        showlegend=False
+    )
+    return fig
+
 def display_xp_history(conn, user, is_sql=False):
     """
     Display a user's XP gain history as a chart.
@@ -232,7 +266,7 @@ def display_xp_history(conn, user, is_sql=False):
             ORDER BY date
             """
         
-        xp_history = h.execute_query(conn, query, {"username": user}, as_dict=True)
+        xp_history = h.execute_query(conn, query, {"username": user}, as_dict=True, fallback=True)
         
         if not xp_history:
             st.markdown("### Historial de XP")
@@ -250,26 +284,8 @@ def display_xp_history(conn, user, is_sql=False):
         date_df = pd.DataFrame({'date': date_range})
         df = pd.merge(date_df, df, on='date', how='left').fillna(0)
         
-        # Create the chart
-        fig = px.bar(
-            df, 
-            x='date', 
-            y='daily_xp',
-            labels={'date': 'Fecha', 'daily_xp': 'XP diario'},
-            title='XP ganado en los últimos 30 días'
-        )
-        
-        # Set color based on XP amount
-        fig.update_traces(marker_color=df['daily_xp'].apply(
-            lambda x: 'lightblue' if x < 20 else ('royalblue' if x < 50 else 'darkblue')
-        ))
-        
-        # Update layout
-        fig.update_layout(
-            xaxis_title="Fecha",
-            yaxis_title="XP ganado",
-            showlegend=False
-        )
+        # Create the chart, only if the XP of the last 30 days changed
+        fig = figure_cache.get_figure("xp_history", df, lambda: _xp_history_figure(df))
         
         # Display chart
         st.plotly_chart(fig, use_container_width=True)
@@ -281,43 +297,18 @@ def display_xp_history(conn, user, is_sql=False):
         logger.error(f"Error displaying XP history: {str(e)}", exc_info=True)
         st.error("Error displaying XP history")
 
-def display_leaderboard(conn, is_sql=False):
+def display_leaderboard(conn, is_sql=False, user=None):
     """
     Display a leaderboard of top users.
     
     Args:
         conn: Database connection
         is_sql (bool): Whether this is for SQL specialization
+        user (str, optional): Username, whose position is shown if outside the top
     """
     try:
-        # Get top 10 users by XP
-        if is_sql:
-            query = """
-            SELECT 
-                username,
-                level,
-                xp,
-                streak_days
-            FROM [dbo].Dim_Users
-            ORDER BY level DESC, xp DESC
-            OFFSET 0 ROWS FETCH NEXT 10 ROWS ONLY
-            """
-            name_field = "username"
-        else:
-            query = """
-            SELECT 
-                name as username,
-                level,
-                xp,
-                rango,
-                streak_days
-            FROM [esnowflake].[dbo].Dim_Users
-            ORDER BY level DESC, xp DESC
-            OFFSET 0 ROWS FETCH NEXT 10 ROWS ONLY
-            """
-            name_field = "username"
-        
-        leaderboard = h.execute_query(conn, query, as_dict=True)
+        # Top users, shared by every session and refreshed every few seconds
+        leaderboard = lb.get_top(conn, is_sql)
         
         if not leaderboard:
             st.markdown("### Clasificación")
@@ -344,8 +335,14 @@ def display_leaderboard(conn, is_sql=False):
         st.markdown("### Clasificación")
         st.dataframe(df, use_container_width=True, hide_index=True)
         
+        # Position of the user when outside the top
+        if user and user not in df["Usuario"].values:
+            posicion = lb.get_rank(conn, user, is_sql)
+            if posicion is not None:
+                st.markdown(f"Tu posición: **{posicion}**")
+        
         # Add note about leaderboard
-        st.markdown("*La clasificación se actualiza diariamente basada en nivel y XP.*")
+        st.markdown(f"*La clasificación se actualiza cada {lb.LEADERBOARD_TTL} segundos basada en nivel y XP.*")
     except Exception as e:
         logger.error(f"Error displaying leaderboard: {str(e)}", exc_info=True)
         st.error("Error displaying leaderboard")
@@ -378,8 +375,11 @@ def gamification_tab(conn, user, is_sql=False):
             # Display level progress
             display_level_progress(user_data)
             
-            # Update streak
-            streak_days, is_new_streak = h.update_streak(conn, user, is_sql)
+            # Update streak (not in read-only mode, while the database is unavailable)
+            if circuit_breaker.is_open(conn):
+                streak_days, is_new_streak = user_data.get("streak_days", 0), False
+            else:
+                streak_days, is_new_streak = h.update_streak(conn, user, is_sql)
             
             # Display streak
             display_streak(streak_days)
@@ -413,7 +413,7 @@ def gamification_tab(conn, user, is_sql=False):
         display_achievements(conn, user, is_sql)
         
         # Display leaderboard
-        display_leaderboard(conn, is_sql)
+        display_leaderboard(conn, is_sql, user)
     except Exception as e:
         logger.error(f"Error in gamification tab: {str(e)}", exc_info=True)
         st.error("Error displaying gamification information")
@@ -42,25 +42,12 @@ def apply_patch():
                             is_correct_int = 1 if is_correct else 0
                             is_answered_int = 1 if is_answered else 0
                             
-                            # Use direct query for now, will migrate to stored procedure once created
-                            cursor = conn.cursor()
-                            cursor.execute(
-                                "INSERT INTO [esnowflake].[dbo].Fact_Answers (question_id, user_nickname, type, exam_id, is_correct, is_answered, ANSWER_TIMESTAMP) VALUES (?, ?, ?, NULL, ?, ?, CURRENT_TIMESTAMP)",
-                                (n, user, mode, is_correct_int, is_answered_int)
+                            # Queued for the background writer, which inserts the answers
+                            # in batches and awards the XP of the correct ones
+                            answer_writer.record(
+                                conn, n, user, mode, is_correct_int, is_answered_int,
+                                especialidad=especialidad
                             )
-                            conn.commit()
-                            
-                            # Award XP for correct answers
-                            if is_correct and 'add_experience' in globals():
-                                add_experience(conn, user, 5, "Correct answer in practice", False)
-                                
-                                # Check if this is the first correct answer (for achievement)
-                                count_query = "SELECT COUNT(*) FROM [esnowflake].[dbo].Fact_Answers WHERE user_nickname = ? AND is_correct = 1"
-                                correct_count = cursor.execute(count_query, (user,)).fetchone()[0]
-                                
-                                # If this is the first correct answer, we would award achievement here
-                                # This requires importing gamification which creates circular imports
-                                # Will be handled through stored procedures instead
                         except Exception as e:
                             logger.error(f"Error recording answer: {str(e)}", exc_info=True)
 """
@@ -46,11 +46,15 @@ import constantes as c
 
 
 
-from pathlib import Path
+import db
+
 
 
+import daily_activity
 
-from sqlalchemy import create_engine, text
+
+
+from pathlib import Path
 
 
 
@@ -98,6 +102,18 @@ def init_connection(especialidad):
 
 
 
+    The engines come from the db pool registry, so specialties using the same
+
+
+
+    database share one pool.
+
+
+
+    
+
+
+
     Args:
 
 
@@ -114,7 +130,7 @@ def init_connection(especialidad):
 
 
 
-        Connection object: Either a pyodbc connection or SQLAlchemy engine
+        Engine: SQLAlchemy engine of the target database
 
 
 
@@ -194,31 +210,19 @@ def init_connection(especialidad):
 
 
 
-            # Use SQLAlchemy for all connections to benefit from connection pooling
-
-
-
-            return create_engine(f"mssql+pyodbc:///?odbc_connect={conn_string}", 
-
-
-
-                                 pool_pre_ping=True,        # Check connection validity before use
+            # One pooled engine per target database, shared by the four specialties
 
 
 
-                                 pool_recycle=1800,         # Recycle connections after 30 minutes
+            return db.get_engine(tipo,
 
 
 
-                                 pool_size=20,              # Pool size per Streamlit instance
+                                 (st.secrets["server"], st.secrets[f"database_{tipo}"]),
 
 
 
-                                 max_overflow=30,           # Allow additional connections when pool is full
-
-
-
-                                 pool_timeout=30)           # Wait max 30s for available connection
+                                 f"mssql+pyodbc:///?odbc_connect={conn_string}")
 
 
 
@@ -278,27 +282,15 @@ def init_connection(especialidad):
 
 
 
-            return create_engine(connection_str, 
-
-
-
-                                 pool_pre_ping=True,        # Check connection validity before use
+            return db.get_engine(tipo,
 
 
 
-                                 pool_recycle=1800,         # Recycle connections after 30 minutes
+                                 (st.secrets["server"], st.secrets[f"database_{tipo}"]),
 
 
 
-                                 pool_size=20,              # Pool size per Streamlit instance
-
-
-
-                                 max_overflow=30,           # Allow additional connections when pool is full
-
-
-
-                                 pool_timeout=30)           # Wait max 30s for available connection
+                                 connection_str)
 
 
 
@@ -338,7 +330,7 @@ def init_connection(especialidad):
 
 
 
-                return pyodbc.connect(
+                odbc_string = (
 
 
 
@@ -382,6 +374,38 @@ def init_connection(especialidad):
 
 
 
+                # Plain pyodbc connections wrapped in an engine, so callers keep sharing a pool
+
+
+
+                engine = db.get_engine(tipo,
+
+
+
+                                       (st.secrets["server"], st.secrets[f"database_{tipo}"]),
+
+
+
+                                       "mssql+pyodbc://",
+
+
+
+                                       creator=lambda: pyodbc.connect(odbc_string))
+
+
+
+                with engine.connect():
+
+
+
+                    pass
+
+
+
+                return engine
+
+
+
             raise Exception("Fallback connection also failed")
 
 
@@ -634,271 +658,9 @@ def orden_preguntas(question_set):
                 return []
             return random.sample(question_set, len(question_set))
 
-def execute_query(conn, query, params=None, fetch_all=True, as_dict=False):
-    """Execute a SQL query consistently handling both pyodbc and SQLAlchemy connections.
-    
-    Args:
-        conn: Database connection (either pyodbc connection or SQLAlchemy engine)
-        query (str): SQL query to execute
-        params (dict or tuple, optional): Parameters for the query
-        fetch_all (bool): Whether to fetch all results (True) or just one (False)
-        as_dict (bool): Whether to return results as dictionaries (True) or tuples (False)
-        
-    Returns:
-        list: Query results
-    """
-    try:
-
-
-        # Check if connection is SQLAlchemy engine
-
-
-        if hasattr(conn, 'connect'):
-
-
-            with conn.connect() as connection:
-
-
-                if params:
-
-
-                    result = connection.execute(text(query), params)
-
-
-                else:
-
-
-                    result = connection.execute(text(query))
-
-
-                
-
-
-                if not result.returns_rows:
-
-
-                    return []
-
-
-                
-
-
-                if as_dict:
-
-
-                    columns = result.keys()
-
-
-                    if fetch_all:
-
-
-                        return [dict(zip(columns, row)) for row in result.fetchall()]
-
-
-                    else:
-
-
-                        row = result.fetchone()
-
-
-                        return dict(zip(columns, row)) if row else None
-
-
-                else:
-
-
-                    return result.fetchall() if fetch_all else result.fetchone()
-
-
-        else:
-
-
-            # Assume it's a pyodbc connection
-
-
-            cursor = conn.cursor()
-
-
-            if params:
-
-
-                cursor.execute(query, params)
-
-
-            else:
-
-
-                cursor.execute(query)
-
-
-            
-
-
-            if cursor.description is None:  # No results expected
-
-
-                conn.commit()
-
-
-                return []
-
-
-            
-
-
-            if as_dict:
-
-
-                columns = [column[0] for column in cursor.description]
-
-
-                if fetch_all:
-
-
-                    return [dict(zip(columns, row)) for row in cursor.fetchall()]
-
-
-                else:
-
-
-                    row = cursor.fetchone()
-
-
-                    return dict(zip(columns, row)) if row else None
-
-
-            else:
-
-
-                return cursor.fetchall() if fetch_all else cursor.fetchone()
-
-
-    except Exception as e:
-
-
-        logger.error(f"Error executing query: {str(e)}", exc_info=True)
-
-
-        logger.error(f"Query: {query}")
-
-
-        logger.error(f"Params: {params}")
-
-
-        raise Exception(f"Database query error: {str(e)}")
-
-
-
-
-
-def execute_non_query(conn, query, params=None):
-
-
-    """
-
-
-    Execute a non-query SQL statement (INSERT, UPDATE, DELETE).
-
-
-    
-
-
-    Args:
-
-
-        conn: Database connection (either pyodbc connection or SQLAlchemy engine)
-
-
-        query (str): SQL statement to execute
-
-
-        params (dict or tuple, optional): Parameters for the statement
-
-
-        
-
-
-    Returns:
-
-
-        int: Number of affected rows
-
-
-    """
-
-
-    try:
-
-
-        # Check if connection is SQLAlchemy engine
-
-
-        if hasattr(conn, 'connect'):
-
-
-            with conn.connect() as connection:
-
-
-                with connection.begin():  # Start a transaction
-
-
-                    if params:
-
-
-                        result = connection.execute(text(query), params)
-
-
-                    else:
-
-
-                        result = connection.execute(text(query))
-
-
-                    return result.rowcount
-
-
-        else:
-
-
-            # Assume it's a pyodbc connection
-
-
-            cursor = conn.cursor()
-
-
-            if params:
-
-
-                cursor.execute(query, params)
-
-
-            else:
-
-
-                cursor.execute(query)
-
-
-            conn.commit()
-
-
-            return cursor.rowcount
-
-
-    except Exception as e:
-
-
-        logger.error(f"Error executing non-query: {str(e)}", exc_info=True)
-
-
-        logger.error(f"Query: {query}")
-
-
-        logger.error(f"Params: {params}")
-
-
-        raise Exception(f"Database update error: {str(e)}")
-
-
+# All database access goes through the shared data-access layer
+execute_query = db.execute_query
+execute_non_query = db.execute_non_query
 
 
 
@@ -1004,7 +766,7 @@ def get_user_experience(conn, user, is_sql=False):
         
 
 
-        result = execute_query(conn, query, {"username": user}, fetch_all=False, as_dict=True)
+        result = execute_query(conn, query, {"username": user}, fetch_all=False, as_dict=True, fallback=True)
 
 
         
@@ -1034,330 +796,288 @@ def get_user_experience(conn, user, is_sql=False):
 
 
 
-def add_experience(conn, user, xp_amount, reason, is_sql=False):
-
-
-    """
+def add_experience_bulk(conn, awards, is_sql=False):
 
 
-    Add experience points to a user and update their level if needed.
 
+    """
 
-    
 
 
-    Args:
+    Add experience points to many users in one atomic server-side call.
 
 
-        conn: Database connection
-
-
-        user (str): Username
 
+    
 
-        xp_amount (int): Amount of XP to add
 
 
-        reason (str): Reason for the XP gain
+    sp_AwardXP (sp_AwardSQLXP for SQL) adds the XP, derives level and rango
 
 
-        is_sql (bool): Whether this is for SQL specialization
 
+    from Dim_Levels and records the history in one transaction, so concurrent
 
-        
 
 
-    Returns:
+    awards to the same user are never lost.
 
 
-        dict: Updated user experience data with level up information
 
+    
 
-    """
 
 
-    try:
+    Args:
 
 
-        # Get current user data
 
+        conn: Database connection
 
-        user_data = get_user_experience(conn, user, is_sql)
 
 
-        current_xp = user_data.get("xp", 0)
+        awards (List[Tuple[str, int, str]]): (username, xp_amount, reason) per award
 
 
-        current_level = user_data.get("level", 1)
 
+        is_sql (bool): Whether this is for SQL specialization
 
-        current_rango = user_data.get("rango", "Iniciado")
 
 
         
 
 
-        # Calculate new XP and level
 
+    Returns:
 
-        new_xp = current_xp + xp_amount
 
 
-        
+        Dict[str, dict]: Updated experience data per user (users not found are left out)
 
 
-        # XP required for each level (increases with level)
 
+    """
 
-        level_xp_requirements = {
 
 
-            1: 100,   # 100 XP for level 1->2
+    if not awards:
 
 
-            2: 200,   # 200 XP for level 2->3
 
+        return {}
 
-            3: 400,   # 400 XP for level 3->4
 
 
-            4: 800,   # 800 XP for level 4->5
+    
 
 
-            5: 1600   # 1600 XP for level 5->6
 
+    payload = json.dumps([
 
-        }
 
 
-        
+        {"user": user, "xp": int(xp_amount), "reason": reason}
 
 
-        # Calculate new level
 
+        for user, xp_amount, reason in awards
 
-        new_level = current_level
 
 
-        level_up = False
+    ])
 
 
-        
 
+    procedure = "sp_AwardSQLXP" if is_sql else "sp_AwardXP"
 
-        while new_level < 6 and new_xp >= level_xp_requirements.get(new_level, 3000):
 
 
-            new_xp -= level_xp_requirements.get(new_level, 3000)
+    
 
 
-            new_level += 1
 
+    # The procedure commits its own transaction, run it in one so the commit reaches the server
 
-            level_up = True
 
 
-        
+    with db.transaction(conn) as connection:
 
 
-        # Determine rango based on level
 
+        rows = execute_query(
 
-        new_rango = current_rango
 
 
-        if new_level >= 5:
+            conn,
 
 
-            new_rango = "Parra"  # Top rank
 
+            f"EXEC {procedure} @awards=:awards",
 
-        elif new_level >= 3:
 
 
-            new_rango = "Maestro"
+            {"awards": payload},
 
 
-        elif new_level >= 2:
 
+            as_dict=True,
 
-            new_rango = "Padawan"
 
 
-        else:
+            connection=connection
 
 
-            new_rango = "Iniciado"
 
+        )
 
-        
 
 
-        # Update user data in database
+    
 
 
-        if is_sql:
 
+    return {
 
-            query = """
 
 
-            UPDATE [dbo].Dim_Users 
+        row["username"]: {
 
 
-            SET xp = :xp, level = :level, last_active = CURRENT_TIMESTAMP
 
+            "username": row["username"],
 
-            WHERE username = :username
 
 
-            """
+            "xp": row["xp"],
 
 
-            execute_non_query(conn, query, {
 
+            "level": row["level"],
 
-                "xp": new_xp,
 
 
-                "level": new_level,
+            "rango": row["rango"],
 
 
-                "username": user
 
+            "level_up": bool(row["level_up"]),
 
-            })
 
 
-        else:
+            "xp_gained": row["xp_gained"]
 
 
-            query = """
 
+        }
 
-            UPDATE [esnowflake].[dbo].Dim_Users 
 
 
-            SET xp = :xp, level = :level, rango = :rango, last_active = CURRENT_TIMESTAMP
+        for row in rows
 
 
-            WHERE name = :username
 
+    }
 
-            """
 
 
-            execute_non_query(conn, query, {
 
 
-                "xp": new_xp,
-
-
-                "level": new_level,
+def add_experience(conn, user, xp_amount, reason, is_sql=False):
 
 
-                "rango": new_rango,
 
+    """
 
-                "username": user
 
 
-            })
+    Add experience points to a user and update their level if needed.
 
 
-        
 
+    
 
-        # Record XP gain in history
 
 
-        if is_sql:
+    Args:
 
 
-            query = """
 
+        conn: Database connection
 
-            INSERT INTO [dbo].Fact_XP_History (username, xp_amount, reason, timestamp)
 
 
-            VALUES (:username, :xp_amount, :reason, CURRENT_TIMESTAMP)
+        user (str): Username
 
 
-            """
 
+        xp_amount (int): Amount of XP to add
 
-        else:
 
 
-            query = """
+        reason (str): Reason for the XP gain
 
 
-            INSERT INTO [esnowflake].[dbo].Fact_XP_History (user_nickname, xp_amount, reason, timestamp)
 
+        is_sql (bool): Whether this is for SQL specialization
 
-            VALUES (:username, :xp_amount, :reason, CURRENT_TIMESTAMP)
 
 
-            """
+        
 
 
-            
 
+    Returns:
 
-        execute_non_query(conn, query, {
 
 
-            "username": user,
+        dict: Updated user experience data with level up information
 
 
-            "xp_amount": xp_amount,
 
+    """
 
-            "reason": reason
 
 
-        })
+    try:
 
 
-        
 
+        result = add_experience_bulk(conn, [(user, xp_amount, reason)], is_sql).get(user)
 
-        # Return updated user data
 
 
-        return {
+        if result is None:
 
 
-            "username": user,
 
+            logger.warning(f"User {user} not found, no XP added")
 
-            "xp": new_xp,
 
 
-            "level": new_level,
+            return None
 
 
-            "rango": new_rango,
 
+        
 
-            "level_up": level_up,
 
 
-            "xp_gained": xp_amount,
+        result["reason"] = reason
 
 
-            "reason": reason
 
+        return result
 
-        }
 
 
     except Exception as e:
 
 
+
         logger.error(f"Error adding user experience: {str(e)}", exc_info=True)
 
 
+
         return None
 
 
@@ -1376,6 +1096,15 @@ def update_streak(conn, user, is_sql=False):
     
 
 
+    Specialties whose answers are in Fact_Answers take the streak from their
+
+
+    daily activity (daily_activity.sync_streak), the same one the progress page shows.
+
+
+    
+
+
     Args:
 
 
@@ -1403,43 +1132,31 @@ def update_streak(conn, user, is_sql=False):
     try:
 
 
-        # Get user's last active date
+        if not is_sql:
 
 
-        if is_sql:
-
-
-            query = """
-
-
-            SELECT username, streak_days, CONVERT(DATE, last_active) as last_date
-
-
-            FROM [dbo].Dim_Users
-
-
-            WHERE username = :username
+            return daily_activity.sync_streak(conn, user)
 
 
-            """
+        
 
 
-        else:
+        # Last day the streak was credited (last_active is touched by every XP award)
 
 
-            query = """
+        query = """
 
 
-            SELECT name as username, streak_days, CONVERT(DATE, last_active) as last_date
+        SELECT username, streak_days, streak_date as last_date
 
 
-            FROM [esnowflake].[dbo].Dim_Users
+        FROM [dbo].Dim_Users
 
 
-            WHERE name = :username
+        WHERE username = :username
 
 
-            """
+        """
 
 
         
@@ -1460,7 +1177,7 @@ def update_streak(conn, user, is_sql=False):
             
 
 
-        # Get streak days and last active date
+        # Get streak days and last credited date
 
 
         streak_days = result.get('streak_days', 0) or 0
@@ -1472,166 +1189,73 @@ def update_streak(conn, user, is_sql=False):
         
 
 
-        # Get today's date
+        # Get today's date, on the clock of the answers
 
 
-        today = datetime.datetime.now().date()
+        today = db.utc_now().date()
 
 
         
 
 
-        # Check if user was active yesterday
+        # Already credited today
 
 
-        yesterday = today - datetime.timedelta(days=1)
-
-
-        
+        if last_date == today:
 
 
-        new_streak_day = False
+            return streak_days, False
 
 
         
 
 
-        # If last active date is yesterday, increment streak
-
-
-        if last_date and (last_date == yesterday or last_date == today):
-
-
-            if last_date != today:
-
-
-                streak_days += 1
-
-
-                new_streak_day = True
-
-
-                
-
-
-                # Update streak days in database
-
-
-                if is_sql:
-
+        # Continue the streak if it was credited yesterday, otherwise start a new one
 
-                    query = """
 
-
-                    UPDATE [dbo].Dim_Users
-
-
-                    SET streak_days = :streak_days, last_active = CURRENT_TIMESTAMP
-
-
-                    WHERE username = :username
-
-
-                    """
-
-
-                else:
-
-
-                    query = """
-
-
-                    UPDATE [esnowflake].[dbo].Dim_Users
-
-
-                    SET streak_days = :streak_days, last_active = CURRENT_TIMESTAMP
-
-
-                    WHERE name = :username
-
-
-                    """
-
-
-                
-
-
-                execute_non_query(conn, query, {
-
-
-                    "streak_days": streak_days,
-
-
-                    "username": user
-
-
-                })
-
-
-        # If last active date is not yesterday or today, reset streak
-
-
-        elif last_date != today:
-
-
-            streak_days = 1
-
-
-            new_streak_day = True
-
-
-            
-
-
-            # Reset streak days in database
-
-
-            if is_sql:
-
-
-                query = """
+        yesterday = today - datetime.timedelta(days=1)
 
 
-                UPDATE [dbo].Dim_Users
+        streak_days = streak_days + 1 if last_date == yesterday else 1
 
 
-                SET streak_days = 1, last_active = CURRENT_TIMESTAMP
+        
 
 
-                WHERE username = :username
+        # Only the first call of the day credits it
 
 
-                """
+        query = """
 
 
-            else:
+        UPDATE [dbo].Dim_Users
 
 
-                query = """
+        SET streak_days = :streak_days, streak_date = :today
 
 
-                UPDATE [esnowflake].[dbo].Dim_Users
+        WHERE username = :username AND (streak_date IS NULL OR streak_date <> :today)
 
 
-                SET streak_days = 1, last_active = CURRENT_TIMESTAMP
+        """
 
 
-                WHERE name = :username
+        
 
 
-                """
+        new_streak_day = execute_non_query(conn, query, {
 
 
-            
+            "streak_days": streak_days,
 
 
-            execute_non_query(conn, query, {
+            "today": today,
 
 
-                "username": user
+            "username": user
 
 
-            })
+        }) == 1
 
 
         
@@ -6,7 +6,9 @@ This is a temporary fix to ensure the application can run without issues.
 import streamlit as st
 import time
 import logging
-from sqlalchemy import text
+import db
+import answer_history
+import leaderboard
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -24,18 +26,10 @@ def recharge_user_list(conn, es_sql=False):
     """
     try:
         if es_sql:
-            # For SQLAlchemy connection
-            with conn.connect() as connection:
-                query = "SELECT username FROM [dbo].Dim_Users ORDER BY username"
-                result = connection.execute(text(query))
-                lista_plana = [row[0] for row in result.fetchall()]
+            query = "SELECT username FROM [dbo].Dim_Users ORDER BY username"
         else:
-            # For pyodbc connection
-            cursor = conn.cursor()
             query = "SELECT name FROM [esnowflake].[dbo].Dim_Users ORDER BY name"
-            cursor.execute(query)
-            user_list_v = cursor.fetchall()
-            lista_plana = [item[0] for item in user_list_v]
+        lista_plana = [row[0] for row in db.execute_query(conn, query, fallback=True)]
         
         return lista_plana
     except Exception as e:
@@ -54,21 +48,18 @@ def new_user(conn, new_user, message=None, es_sql=False):
     """
     try:
         if es_sql:
-            # For SQLAlchemy connection
-            with conn.connect() as connection:
-                with connection.begin():
-                    connection.execute(
-                        text("INSERT INTO [dbo].Dim_Users (username) VALUES (:username)"),
-                        {'username': new_user}
-                    )
+            db.execute_non_query(
+                conn,
+                "INSERT INTO [dbo].Dim_Users (username) VALUES (:username)",
+                {'username': new_user}
+            )
         else:
-            # For pyodbc connection
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO [esnowflake].[dbo].Dim_Users (name, rango) VALUES (?, ?)",
-                (new_user, 'Iniciado')
+            db.execute_non_query(
+                conn,
+                "INSERT INTO [esnowflake].[dbo].Dim_Users (name, rango) VALUES (:username, :rango)",
+                {'username': new_user, 'rango': 'Iniciado'}
             )
-            conn.commit()
+        leaderboard.invalidate(conn, es_sql)
 
         if message:
             st.success('New user added successfully!')
@@ -99,33 +90,25 @@ def reset_delete_user(conn, useri, delete, es_sql=False):
     
     try:
         if es_sql:
-            # For SQLAlchemy connection
-            with conn.connect() as connection:
-                with connection.begin():
-                    connection.execute(
-                        text("DELETE FROM [dbo].Dim_Users WHERE username = :username"),
-                        {'username': useri}
-                    )
-                    connection.execute(
-                        text("DELETE FROM [dbo].Fact_Answers WHERE username = :username"),
-                        {'username': useri}
-                    )
+            queries = [
+                "DELETE FROM [dbo].Dim_Users WHERE username = :username",
+                "DELETE FROM [dbo].Fact_Answers WHERE username = :username",
+            ]
         else:
-            # For pyodbc connection
-            cursor = conn.cursor()
-            cursor.execute(
-                "DELETE FROM [esnowflake].[dbo].Dim_Users WHERE name = ?",
-                (useri,)
-            )
-            cursor.execute(
-                "DELETE FROM [esnowflake].[dbo].FACT_ANSWERS WHERE user_nickname = ?",
-                (useri,)
-            )
-            cursor.execute(
-                "DELETE FROM [esnowflake].[dbo].FACT_EXAMS WHERE user_nickname = ?",
-                (useri,)
-            )
-            conn.commit()
+            queries = [
+                "DELETE FROM [esnowflake].[dbo].Dim_Users WHERE name = :username",
+                "DELETE FROM [esnowflake].[dbo].FACT_ANSWERS WHERE user_nickname = :username",
+                "DELETE FROM [esnowflake].[dbo].FACT_EXAMS WHERE user_nickname = :username",
+                "DELETE FROM [esnowflake].[dbo].Fact_User_Section_Progress WHERE user_nickname = :username",
+                "DELETE FROM [esnowflake].[dbo].Fact_User_Daily_Activity WHERE user_nickname = :username",
+            ]
+        
+        # Delete the user and its history together
+        with db.transaction(conn) as connection:
+            for query in queries:
+                db.execute_non_query(conn, query, {'username': useri}, connection=connection)
+        answer_history.invalidate(useri)
+        leaderboard.invalidate(conn, es_sql)
         
         st.success("Action completed!")
 
@@ -2,13 +2,22 @@ import streamlit as st
 import pandas as pd
 import json
 import os
-import numpy as np
 import subprocess
 import random
 import logging
 from io import BytesIO
-import ast
 import helper as h
+import db
+import answer_writer
+import section_progress
+import daily_activity
+import question_stats
+import query_stats
+import figure_cache
+import circuit_breaker
+import question_bank as qb
+import question_import as qi
+import excel_export
 from datetime import datetime
 from itertools import islice
 import pytz
@@ -109,9 +118,9 @@ def fetch_download_records(conn):
         pd.DataFrame: Download records
     """
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT TOP 10 name, id_excel, fecha_descarga FROM [esnowflake].[dbo].excel")
-        records = cursor.fetchall()
+        records = db.execute_query(
+            conn, "SELECT TOP 10 name, id_excel, fecha_descarga FROM [esnowflake].[dbo].excel"
+        )
         
         # Format dates
         formatted_records = [
@@ -130,58 +139,6 @@ def fetch_download_records(conn):
 ############################################################
 # Excel and JSON functions
 ############################################################
-def create_excel(especialidad):
-    """
-    Create an Excel file from JSON data.
-    
-    Args:
-        especialidad (str): The specialization type
-        
-    Returns:
-        pd.DataFrame: The data as a DataFrame
-    """
-    try:
-        # Get JSON file path
-        if especialidad == 'snowflake_pro':
-            nombre_fichero = os.path.join(RUTA, 'snowflake_pro_examtopics')
-        elif especialidad == 'snowflake_arch':
-            nombre_fichero = os.path.join(RUTA, 'snowflake_arch_examtopics')
-        elif especialidad == 'dbt':
-            nombre_fichero = os.path.join(RUTA, 'dbt_examtopics')
-        elif especialidad == 'google':
-            nombre_fichero = os.path.join(RUTA, 'google_examtopics')
-        else:
-            raise ValueError(f"Unsupported specialization: {especialidad}")
-        
-        nombre_completo = nombre_fichero + '.json'
-        
-        # Read JSON file
-        with open(nombre_completo, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-        
-        # Transform data for Excel
-        rows = []
-        for question in data:
-            row = {
-                "question_number": question.get("question_number"),
-                "question_area": question.get("question_area", []),
-                "question": question.get("question"),
-                "question_extra_info": question.get("question_extra_info", ""),
-                "answers": question.get("answers", []),
-                "correct_answer": question.get("correct_answer", []),
-                "explanation": question.get("explanation", "").replace("\n", " ").replace("\r", ""),
-                "reference": question.get("reference", [])
-            }
-            rows.append(row)
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(rows)
-        return df
-    except Exception as e:
-        logger.error(f"Error creating Excel: {str(e)}", exc_info=True)
-        st.error(f"Error creating Excel: {str(e)}")
-        return pd.DataFrame()
-
 def generar_numero_aleatorio():
     """
     Generate a random 10-digit number.
@@ -191,33 +148,29 @@ def generar_numero_aleatorio():
     """
     return ''.join([str(random.randint(0, 9)) for _ in range(10)])
 
-@st.cache_data
 def download_excel(especialidad):
     """
     Prepare an Excel file for download.
     
+    The sheet data comes from the export prebuilt for the current bank version;
+    only the watermark (the sheet name) is stamped for this download.
+    
     Args:
         especialidad (str): The specialization type
         
     Returns:
         Tuple: BytesIO object, filename, and random number
     """
+    numero_aleatorio = generar_numero_aleatorio()
     try:
-        df = create_excel(especialidad)
-        numero_aleatorio = generar_numero_aleatorio()
-        
-        # Create Excel file
-        excel_buffer = BytesIO()
-        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name=numero_aleatorio, index=False)
-        excel_buffer.seek(0)
+        excel_buffer = excel_export.stamp(especialidad, numero_aleatorio)
         
         nombre_fichero = especialidad + '.xlsx'
         return excel_buffer, nombre_fichero, numero_aleatorio
     except Exception as e:
         logger.error(f"Error preparing Excel for download: {str(e)}", exc_info=True)
         st.error(f"Error preparing Excel for download: {str(e)}")
-        return BytesIO(), f"{especialidad}.xlsx", generar_numero_aleatorio()
+        return BytesIO(), f"{especialidad}.xlsx", numero_aleatorio
 
 def insert_download_db(username, numero_aleatorio, especialidad):
     """
@@ -230,12 +183,11 @@ def insert_download_db(username, numero_aleatorio, especialidad):
     """
     try:
         conn = h.init_connection(especialidad)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO [esnowflake].[dbo].excel (name, id_excel, fecha_descarga) VALUES (?, ?, GETDATE())",
-            (username, numero_aleatorio)
+        db.execute_non_query(
+            conn,
+            "INSERT INTO [esnowflake].[dbo].excel (name, id_excel, fecha_descarga) VALUES (:username, :id_excel, GETDATE())",
+            {"username": username, "id_excel": numero_aleatorio}
         )
-        conn.commit()
         logger.info(f"Executed insert for Excel download: {username}, {numero_aleatorio}")
         log_action("Creación de Excel para descarga", especialidad, username, numero_aleatorio)
     except Exception as e:
@@ -243,7 +195,11 @@ def insert_download_db(username, numero_aleatorio, especialidad):
 
 def save_to_json_append(new_data, especialidad, user=None):
     """
-    Append new data to a JSON file.
+    Append new data to a specialization's questions.
+    
+    The questions are recorded in the bank's edit journal in batches and folded
+    into the JSON file in the background, so the cost does not depend on the
+    bank size. A question with an existing question_number replaces it.
     
     Args:
         new_data (List[Dict]): New data to append
@@ -253,30 +209,14 @@ def save_to_json_append(new_data, especialidad, user=None):
     try:
         filename = os.path.join(RUTA, f"{especialidad}_examtopics.json")
         
-        # Check if file exists
-        if os.path.exists(filename):
-            # Read existing JSON
-            with open(filename, "r", encoding="utf-8") as json_file:
-                try:
-                    existing_data = json.load(json_file)
-                    if isinstance(existing_data, dict):  # Convert dict to list
-                        existing_data = [existing_data]
-                except json.JSONDecodeError:
-                    existing_data = []
-            
-            # Append new data
-            existing_data.extend(new_data)
-            
-            # Write updated data
-            with open(filename, "w", encoding="utf-8") as json_file:
-                json.dump(existing_data, json_file, indent=4, ensure_ascii=False)
-                json_file.truncate()  # Truncate if new content is shorter
-        else:
-            # Create new file
-            with open(filename, "w", encoding="utf-8") as json_file:
-                json.dump(new_data, json_file, indent=4, ensure_ascii=False)
+        # Journal the new questions (or create the file if there is none yet)
+        commit_stats = qi.commit(especialidad, new_data)
         
-        st.success(f"Datos añadidos exitosamente al archivo {filename}")
+        st.success(
+            f"Datos añadidos exitosamente al archivo {filename}: "
+            f"{commit_stats['questions']} preguntas en {commit_stats['seconds']:.2f} s "
+            f"({commit_stats['rows_per_second']:,.0f} preguntas/s)"
+        )
         log_action("Datos añadidos a JSON (modo append)", especialidad, user)
     except Exception as e:
         logger.error(f"Error saving to JSON: {str(e)}", exc_info=True)
@@ -284,7 +224,7 @@ def save_to_json_append(new_data, especialidad, user=None):
 
 def delete_question_by_number(especialidad, question_number, user=None):
     """
-    Delete a question from a JSON file by question number.
+    Delete a question from a specialization by question number.
     
     Args:
         especialidad (str): The specialization type
@@ -299,21 +239,16 @@ def delete_question_by_number(especialidad, question_number, user=None):
             st.error("El archivo JSON no existe.")
             return
         
-        # Read current JSON
-        with open(filename, "r", encoding="utf-8") as json_file:
-            data = json.load(json_file)
-        
-        # Filter out the question to delete
-        updated_data = [question for question in data if question.get("question_number") != question_number]
-        
-        # Check if any question was deleted
-        if len(data) == len(updated_data):
+        # Check the question exists
+        if qb.get_bank(especialidad).position(question_number) is None:
             st.warning(f"No se encontró ninguna pregunta con question_number {question_number}.")
             return
         
-        # Save updated JSON
-        with open(filename, "w", encoding="utf-8") as json_file:
-            json.dump(updated_data, json_file, indent=4, ensure_ascii=False)
+        # Journal the deletion
+        qb.append_journal(
+            especialidad,
+            [{"op": "delete", "question_number": int(question_number)}]
+        )
         
         st.success(f"La pregunta con question_number {question_number} ha sido eliminada.")
         log_action(f"Pregunta eliminada (question_number {question_number})", especialidad, user)
@@ -368,65 +303,63 @@ def restart_docker_container(user=None):
         logger.error(f"Error restarting Docker container: {str(e)}", exc_info=True)
         st.error(f"Error: {str(e)}")
 
-def process_excel_file(uploaded_file):
+def process_upload(uploaded_file):
     """
-    Process an uploaded Excel file.
+    Parse and validate an uploaded Excel or JSON file.
+    
+    The result is kept in the session for the uploaded file, so paging through
+    the preview does not parse the file again.
     
     Args:
         uploaded_file: The uploaded file
         
     Returns:
-        List[Dict]: Processed data
+        Dict: records, errors and stats as returned by qi.parse_upload, or None on error
     """
+    upload_key = (uploaded_file.name, uploaded_file.size)
+    cached = st.session_state.get("admin_upload")
+    if cached and cached["key"] == upload_key:
+        return cached["result"]
+    
     try:
-        df = pd.read_excel(uploaded_file)
-        df = df.replace({np.nan: None})
-        
-        # Convert DataFrame to list of dictionaries
-        new_data = []
-        for _, row in df.iterrows():
-            # Build dictionary row by row
-            row_data = {
-                "question_number": row["question_number"],
-                "question_area": ast.literal_eval(row["question_area"]) if row["question_area"] else [],
-                "question": row["question"],
-                "answers": ast.literal_eval(row["answers"]) if row["answers"] else [],
-                "correct_answer": ast.literal_eval(row["correct_answer"]) if row["correct_answer"] else [],
-                "explanation": row["explanation"].replace("\r", "").replace("\n", "\n") if row["explanation"] else "",
-                "reference": ast.literal_eval(row["reference"]) if row["reference"] else []
-            }
-            
-            # Add question_extra_info if present
-            if "question_extra_info" in df.columns and row["question_extra_info"] is not None:
-                row_data["question_extra_info"] = row["question_extra_info"]
-            
-            new_data.append(row_data)
-        
-        return new_data
+        with st.spinner("Procesando archivo..."):
+            result = qi.parse_upload(uploaded_file)
+        st.session_state["admin_upload"] = {"key": upload_key, "result": result}
+        return result
     except Exception as e:
-        logger.error(f"Error processing Excel file: {str(e)}", exc_info=True)
-        st.error(f"Error processing Excel file: {str(e)}")
-        return []
+        logger.error(f"Error processing uploaded file: {str(e)}", exc_info=True)
+        st.error(f"Error processing uploaded file: {str(e)}")
+        return None
 
-def process_json_file(uploaded_file):
+def show_upload_preview(result, page_size=50):
     """
-    Process an uploaded JSON file.
+    Show the parse report and a paginated preview of an uploaded file.
     
     Args:
-        uploaded_file: The uploaded file
-        
-    Returns:
-        List[Dict]: Processed data
+        result (Dict): Parsed upload from process_upload
+        page_size (int): Questions per preview page
     """
-    try:
-        new_data = json.load(uploaded_file)
-        if isinstance(new_data, dict):
-            new_data = [new_data]
-        return new_data
-    except Exception as e:
-        logger.error(f"Error processing JSON file: {str(e)}", exc_info=True)
-        st.error(f"Error processing JSON file: {str(e)}")
-        return []
+    records, errors, stats = result["records"], result["errors"], result["stats"]
+    
+    rows_col, valid_col, errors_col, speed_col = st.columns(4)
+    rows_col.metric("Filas leídas", stats["rows"])
+    valid_col.metric("Preguntas válidas", len(records))
+    errors_col.metric("Errores", len(errors))
+    speed_col.metric("Filas/s", f"{stats['rows_per_second']:,.0f}")
+    
+    if errors:
+        st.warning("Las filas con errores no se guardarán:")
+        st.dataframe(pd.DataFrame(errors), use_container_width=True)
+    
+    if records:
+        pages = (len(records) - 1) // page_size + 1
+        page = st.number_input("Página", min_value=1, max_value=pages, value=1, step=1)
+        start = (page - 1) * page_size
+        st.caption(f"Preguntas {start + 1}-{min(start + page_size, len(records))} de {len(records)}")
+        st.dataframe(
+            pd.DataFrame(records[start:start + page_size]).astype(str),
+            use_container_width=True
+        )
 
 def download_specialty_json(especialidad):
     """
@@ -441,6 +374,8 @@ def download_specialty_json(especialidad):
     try:
         filename = os.path.join(RUTA, f"{especialidad}_examtopics.json")
         if os.path.exists(filename):
+            # Fold pending edits so the file is complete
+            qb.compact(especialidad)
             with open(filename, "r", encoding="utf-8") as file:
                 json_data = file.read()
             return BytesIO(json_data.encode()), f"{especialidad}_examtopics.json", "application/json"
@@ -452,49 +387,23 @@ def download_specialty_json(especialidad):
         st.error(f"Error: {str(e)}")
         return None, None, None
 
-def load_json(especialidad):
+def save_question(question, especialidad, user=None):
     """
-    Load a JSON file.
+    Save a modified question, matched by its question_number.
     
     Args:
+        question (Dict): The question
         especialidad (str): The specialization type
-        
-    Returns:
-        Dict: The loaded JSON data
-    """
-    try:
-        filename = os.path.join(RUTA, f"{especialidad}_examtopics.json")
-        
-        if os.path.exists(filename):
-            with open(filename, "r", encoding="utf-8") as file:
-                data = json.load(file)
-            return data
-        else:
-            st.warning(f"No existe un archivo JSON para la especialidad {especialidad}.")
-            return None
-    except Exception as e:
-        logger.error(f"Error loading JSON: {str(e)}", exc_info=True)
-        st.error(f"Error loading JSON: {str(e)}")
-        return None
-
-def save_json(data, especialidad):
-    """
-    Save data to a JSON file.
-    
-    Args:
-        data (Dict): Data to save
-        especialidad (str): The specialization type
+        user (str, optional): Username
     """
     try:
-        filename = os.path.join(RUTA, f"{especialidad}_examtopics.json")
+        qb.append_journal(especialidad, [{"op": "modify", "question": question}])
         
-        with open(filename, "w", encoding="utf-8") as file:
-            json.dump(data, file, indent=4, ensure_ascii=False)
-        
-        st.success(f"Pregunta modificada guardada exitosamente en {filename}")
+        st.success(f"Pregunta {question.get('question_number')} modificada guardada exitosamente")
+        log_action(f"Pregunta modificada (question_number {question.get('question_number')})", especialidad, user)
     except Exception as e:
-        logger.error(f"Error saving JSON: {str(e)}", exc_info=True)
-        st.error(f"Error saving JSON: {str(e)}")
+        logger.error(f"Error saving question: {str(e)}", exc_info=True)
+        st.error(f"Error saving question: {str(e)}")
 
 def delete_all_questions(especialidad, user=None):
     """
@@ -510,8 +419,7 @@ def delete_all_questions(especialidad, user=None):
         # Check if file exists
         if os.path.exists(filename):
             # Empty the JSON file
-            with open(filename, "w", encoding="utf-8") as json_file:
-                json.dump([], json_file, indent=4, ensure_ascii=False)
+            qb.write_base(especialidad, [])
             
             st.success(f"Todas las preguntas de la especialidad '{especialidad}' han sido eliminadas.")
             log_action("Todas las preguntas eliminadas", especialidad, user)
@@ -623,18 +531,15 @@ def show_admin_panel():
                 )
                 
                 if uploaded_file is not None:
-                    if uploaded_file.name.endswith(".xlsx"):
-                        # Process Excel file
-                        new_data = process_excel_file(uploaded_file)
-                    elif uploaded_file.name.endswith(".json"):
-                        # Process JSON file
-                        new_data = process_json_file(uploaded_file)
-                    
-                    st.write("Contenido del archivo subido:")
-                    st.write(new_data)
+                    # Stream, validate and preview the uploaded file
+                    upload = process_upload(uploaded_file)
                     
-                    if st.button("Guardar en JSON (modo append)"):
-                        save_to_json_append(new_data, especialidad)
+                    if upload is not None:
+                        st.write("Contenido del archivo subido:")
+                        show_upload_preview(upload)
+                        
+                        if upload["records"] and st.button("Guardar en JSON (modo append)"):
+                            save_to_json_append(upload["records"], especialidad)
             
             # Download JSON section
             with st.expander("❇️ Descargar archivos JSON de especialidades"):
@@ -718,6 +623,152 @@ def show_admin_panel():
                 else:
                     st.info(f"No se encontraron imágenes para la especialidad seleccionada: {selected_especialidad}")
             
+            # Question bank cache section
+            with st.expander("📊 Ver estado de la caché de preguntas"):
+                st.subheader("Caché de bancos de preguntas")
+                cache_stats = qb.get_cache_stats()
+                hits, misses, reloads, stale, errors = st.columns(5)
+                hits.metric("Aciertos", cache_stats["hits"])
+                misses.metric("Fallos", cache_stats["misses"])
+                reloads.metric("Recargas", cache_stats["reloads"])
+                stale.metric("Versión previa servida", cache_stats["stale_serves"])
+                errors.metric("Errores de recarga", cache_stats["load_errors"])
+                if cache_stats["banks"]:
+                    st.dataframe(
+                        pd.DataFrame.from_dict(cache_stats["banks"], orient="index"),
+                        use_container_width=True
+                    )
+                else:
+                    st.info("Todavía no se ha cargado ningún banco de preguntas.")
+            
+            # Connection pools section
+            with st.expander("🔌 Ver estado de las conexiones a la base de datos"):
+                pool_stats = db.get_pool_stats()
+                st.caption(
+                    f"Presupuesto de conexiones: {db.POOL_BUDGET} "
+                    f"(asignadas: {sum(pool['limit'] for pool in pool_stats)})"
+                )
+                if pool_stats:
+                    st.dataframe(pd.DataFrame(pool_stats), use_container_width=True)
+                else:
+                    st.info("Todavía no se ha abierto ninguna conexión.")
+                
+                writer_stats = answer_writer.get_stats()
+                pending, written, spooled, replayed, failed = st.columns(5)
+                pending.metric("Respuestas en cola", writer_stats["pending"])
+                written.metric("Respuestas escritas", writer_stats["written"])
+                spooled.metric("Respuestas guardadas en local", writer_stats["spooled"])
+                replayed.metric("Respuestas recuperadas", writer_stats["replayed"])
+                failed.metric("Respuestas perdidas", writer_stats["failed"])
+                
+                breakers = circuit_breaker.get_stats()
+                if any(breaker["open"] for breaker in breakers):
+                    st.error("Base de datos no disponible: la aplicación funciona en modo solo lectura.")
+                if breakers:
+                    st.dataframe(pd.DataFrame(breakers), use_container_width=True)
+            
+            # Query performance section
+            with st.expander("⏱️ Ver rendimiento de las consultas"):
+                umbral = st.number_input(
+                    "Umbral de consulta lenta (ms)",
+                    min_value=1.0,
+                    value=float(query_stats.SLOW_QUERY_MS),
+                    step=50.0
+                )
+                if umbral != query_stats.SLOW_QUERY_MS:
+                    query_stats.set_slow_threshold(umbral)
+                
+                query_data = query_stats.get_stats()
+                st.subheader("Consultas")
+                if query_data["statements"]:
+                    st.dataframe(
+                        pd.DataFrame(query_data["statements"]).drop(columns=["histogram"]),
+                        use_container_width=True
+                    )
+                else:
+                    st.info("Todavía no se ha ejecutado ninguna consulta.")
+                
+                st.subheader("Consultas por página")
+                if query_data["renders"]:
+                    st.dataframe(pd.DataFrame(query_data["renders"]), use_container_width=True)
+                
+                st.subheader("Consultas lentas")
+                if query_data["slow_queries"]:
+                    st.dataframe(pd.DataFrame(query_data["slow_queries"]), use_container_width=True)
+                else:
+                    st.info("No hay consultas por encima del umbral.")
+                
+                st.subheader("Caché de gráficos")
+                figure_data = figure_cache.get_stats()
+                figures, hit_rate, evictions = st.columns(3)
+                figures.metric("Gráficos en caché", figure_data["figures"])
+                hit_rate.metric("Aciertos de caché", f"{figure_data['hit_rate']}%")
+                evictions.metric("Gráficos descartados", figure_data["evictions"])
+                
+                export, reset = st.columns(2)
+                with export:
+                    st.download_button(
+                        label="Exportar a JSON",
+                        data=query_stats.export_json(),
+                        file_name=f"query_stats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                        mime="application/json"
+                    )
+                with reset:
+                    if st.button("Reiniciar estadísticas"):
+                        query_stats.reset()
+                        st.rerun()
+            
+            # Section progress section
+            with st.expander("🔄 Reconstruir el progreso por secciones"):
+                st.write("Recalcula el progreso por secciones de todos los usuarios a partir del historial de respuestas.")
+                progress_especialidad = st.selectbox(
+                    "Selecciona la especialidad", qb.ESPECIALIDADES, key="progress_especialidad"
+                )
+                if st.button("Reconstruir progreso"):
+                    try:
+                        conn = h.init_connection(progress_especialidad)
+                        with st.spinner("Reconstruyendo el progreso..."):
+                            filas = section_progress.rebuild(conn, progress_especialidad)
+                        st.success(f"Progreso de {progress_especialidad} reconstruido: {filas} filas.")
+                    except Exception as e:
+                        logger.error(f"Error rebuilding section progress: {str(e)}", exc_info=True)
+                        st.error(f"Error: {str(e)}")
+            
+            # Question difficulty section
+            with st.expander("📈 Ver la dificultad de las preguntas"):
+                stats_especialidad = st.selectbox(
+                    "Selecciona la especialidad", qb.ESPECIALIDADES, key="stats_especialidad"
+                )
+                try:
+                    conn = h.init_connection(stats_especialidad)
+                    if st.button("Recalcular estadísticas"):
+                        with st.spinner("Recalculando las estadísticas de todas las preguntas..."):
+                            resultado = question_stats.refresh(conn)
+                        st.success(f"Estadísticas recalculadas: {resultado['questions']} preguntas.")
+                    
+                    stats = question_stats.get_stats(conn, stats_especialidad)
+                    if len(stats) == 0:
+                        st.info("Todavía no hay estadísticas. Se calculan con el proceso diario o con el botón.")
+                    else:
+                        st.caption(f"Datos del {stats['snapshot_at'].max()}, de la más difícil a la más fácil.")
+                        st.dataframe(stats.drop(columns=["snapshot_at"]), use_container_width=True, hide_index=True)
+                except Exception as e:
+                    logger.error(f"Error loading question statistics: {str(e)}", exc_info=True)
+                    st.error(f"Error: {str(e)}")
+            
+            # Daily activity section
+            with st.expander("📅 Reconstruir la actividad diaria"):
+                st.write("Recalcula las preguntas por día de todos los usuarios a partir del historial de respuestas.")
+                if st.button("Reconstruir actividad diaria"):
+                    try:
+                        conn = h.init_connection("snowflake_pro")  # Use any type
+                        with st.spinner("Reconstruyendo la actividad diaria..."):
+                            filas = daily_activity.rebuild(conn)
+                        st.success(f"Actividad diaria reconstruida: {filas} filas.")
+                    except Exception as e:
+                        logger.error(f"Error rebuilding daily activity: {str(e)}", exc_info=True)
+                        st.error(f"Error: {str(e)}")
+            
             # View downloads section
             with st.expander("📊 Ver registros de descargas en la base de datos"):
                 st.subheader("Registros de descargas")
@@ -757,6 +808,47 @@ def show_admin_panel():
                 if st.button("Eliminar imagen de pregunta"):
                     delete_image(image_name, especialidad_borrar)
             
+            # Modify question section
+            with st.expander("✏️ Modificar una pregunta"):
+                st.subheader("Modificar pregunta por número")
+                
+                # Select specialization
+                especialidad_modificar = st.selectbox(
+                    "Selecciona la especialidad de la pregunta:", 
+                    ["snowflake_pro", "snowflake_arch", "dbt", "google"], 
+                    key="modify_question"
+                )
+                
+                # Input question number
+                numero_modificar = st.number_input(
+                    "Ingrese el question_number de la pregunta a modificar:", 
+                    min_value=1, 
+                    step=1,
+                    key="modify_question_number"
+                )
+                
+                pregunta = qb.get_bank(especialidad_modificar).record(int(numero_modificar))
+                if pregunta is None:
+                    st.info(f"No hay ninguna pregunta con question_number {numero_modificar}.")
+                else:
+                    # Edit the question as JSON, the question_number identifies it
+                    texto = st.text_area(
+                        "Pregunta (JSON):",
+                        json.dumps(pregunta, indent=4, ensure_ascii=False, default=str),
+                        height=400,
+                        key=f"modify_{especialidad_modificar}_{numero_modificar}"
+                    )
+                    if st.button("Guardar pregunta"):
+                        try:
+                            modificada = json.loads(texto)
+                        except ValueError as e:
+                            st.error(f"El JSON no es válido: {str(e)}")
+                        else:
+                            if modificada.get("question_number") != pregunta.get("question_number"):
+                                st.error("No se puede cambiar el question_number de una pregunta.")
+                            else:
+                                save_question(modificada, especialidad_modificar)
+            
             # Delete question section
             with st.expander("⛔Borrar preguntas"):
                 st.subheader("Eliminar pregunta por número")
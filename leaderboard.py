@@ -0,0 +1,153 @@
+"""
+Leaderboard shared by every session of the process.
+
+The top TOP_N users are read from Dim_Users at most once every LEADERBOARD_TTL
+seconds per database (the target of the engine, see db.engine_target): the
+first session that finds the cached list expired refreshes it while the others
+keep showing the previous one, so any number of concurrent viewers cause a
+single query per refresh window. The admin paths that add, reset or delete
+users drop the cached list with invalidate().
+
+The rank of a user outside the top comes from get_rank(), which counts the
+users ahead of them on the (level, xp) index instead of sorting the table.
+"""
+import time
+import logging
+import threading
+import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+TOP_N = 10
+LEADERBOARD_TTL = 30
+
+TOP_QUERY = {
+    False: """
+        SELECT
+            name as username,
+            level,
+            xp,
+            rango,
+            streak_days
+        FROM [esnowflake].[dbo].Dim_Users
+        ORDER BY level DESC, xp DESC
+        OFFSET 0 ROWS FETCH NEXT :top ROWS ONLY
+    """,
+    True: """
+        SELECT
+            username,
+            level,
+            xp,
+            streak_days
+        FROM [dbo].Dim_Users
+        ORDER BY level DESC, xp DESC
+        OFFSET 0 ROWS FETCH NEXT :top ROWS ONLY
+    """,
+}
+
+RANK_QUERY = {
+    False: """
+        SELECT
+            1
+            + (SELECT COUNT(*) FROM [esnowflake].[dbo].Dim_Users WHERE level > u.level)
+            + (SELECT COUNT(*) FROM [esnowflake].[dbo].Dim_Users WHERE level = u.level AND xp > u.xp)
+        FROM [esnowflake].[dbo].Dim_Users u
+        WHERE u.name = :username
+    """,
+    True: """
+        SELECT
+            1
+            + (SELECT COUNT(*) FROM [dbo].Dim_Users WHERE level > u.level)
+            + (SELECT COUNT(*) FROM [dbo].Dim_Users WHERE level = u.level AND xp > u.xp)
+        FROM [dbo].Dim_Users u
+        WHERE u.username = :username
+    """,
+}
+
+# (database, is_sql) -> (time.monotonic() of the load, rows)
+_leaderboards = {}
+_refresh_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _key(conn, is_sql):
+    """Key of the leaderboard of a database, engines outside the registry by identity."""
+    return (db.engine_target(conn) or id(conn), is_sql)
+
+
+def _refresh_lock(key):
+    """Get the lock that serializes the refreshes of a leaderboard."""
+    lock = _refresh_locks.get(key)
+    if lock is None:
+        with _locks_lock:
+            lock = _refresh_locks.setdefault(key, threading.Lock())
+    return lock
+
+
+def get_top(conn, is_sql=False):
+    """
+    Get the top users, from the shared cache if it is fresh.
+
+    Args:
+        conn: Database connection
+        is_sql (bool): Whether this is for SQL specialization
+
+    Returns:
+        List[Dict]: The top TOP_N users by level and xp
+    """
+    key = _key(conn, is_sql)
+    cached = _leaderboards.get(key)
+    if cached is not None and time.monotonic() - cached[0] <= LEADERBOARD_TTL:
+        return cached[1]
+
+    # Only one session refreshes, the others serve the previous list meanwhile
+    refresh_lock = _refresh_lock(key)
+    if not refresh_lock.acquire(blocking=cached is None):
+        return cached[1]
+    try:
+        latest = _leaderboards.get(key)
+        if latest is not None and latest is not cached and time.monotonic() - latest[0] <= LEADERBOARD_TTL:
+            return latest[1]
+
+        try:
+            rows = db.execute_query(conn, TOP_QUERY[is_sql], {"top": TOP_N}, as_dict=True)
+        except Exception as e:
+            if cached is None:
+                raise
+            logger.error(f"Error refreshing the leaderboard, serving the previous one: {str(e)}", exc_info=True)
+            return cached[1]
+        _leaderboards[key] = (time.monotonic(), rows)
+        return rows
+    finally:
+        refresh_lock.release()
+
+
+def get_rank(conn, user, is_sql=False):
+    """
+    Get the position of a user in the leaderboard.
+
+    Args:
+        conn: Database connection
+        user (str): Username
+        is_sql (bool): Whether this is for SQL specialization
+
+    Returns:
+        int or None: The position (1 is the first), or None if the user does not exist
+    """
+    return db.execute_scalar(conn, RANK_QUERY[is_sql], {"username": user})
+
+
+def invalidate(conn=None, is_sql=False):
+    """
+    Drop cached leaderboards, so they are read again on next use.
+
+    Args:
+        conn: Only drop the leaderboard of the database of this connection
+        is_sql (bool): Whether this is for SQL specialization (with conn)
+    """
+    if conn is None:
+        _leaderboards.clear()
+    else:
+        _leaderboards.pop(_key(conn, is_sql), None)
+
@@ -0,0 +1,156 @@
+"""
+Vectorized progress by section.
+
+A question can belong to several sections, so the progress pages used to
+explode the bank into (question, section) rows and merge them with the
+answers. The engine instead keeps, per bank version, a question x section
+matrix (row i marks the sections of the question at position i of the bank)
+and turns answers into section counts with NumPy only.
+
+The progress page counts the questions never answered per section with
+unseen(): a mask of the answered questions times the matrix. The answer
+writers and section_progress.rebuild() count answers per user and section with
+grouped_counts(): the sections of every answer are looked up in a padded
+question -> sections table and added up with one np.bincount over (group,
+section) codes. benchmarks/progress_benchmark.py times those three paths
+against the pandas computation they replace.
+"""
+import threading
+import numpy as np
+import pandas as pd
+
+# especialidad -> ProgressEngine of its current bank
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+class ProgressEngine:
+    """
+    Section counts of a question bank.
+
+    Attributes:
+        bank (qb.QuestionBank): The bank the matrix was built from
+        sections (List[str]): Section names, the column of each in the matrix
+        matrix (np.ndarray): Question x section incidence (float64, 0 or 1)
+        totals (np.ndarray): Questions per section (int64)
+        question_sections (np.ndarray): Section columns of every question,
+            padded with -1 (questions x most sections of a question)
+    """
+
+    def __init__(self, bank):
+        self.bank = bank
+        self.sections = list(bank.sections)
+        if self.sections:
+            self.matrix = np.column_stack(
+                [bank.section_sets[seccion] for seccion in self.sections]
+            ).astype(np.float64)
+        else:
+            self.matrix = np.zeros((len(bank), 0))
+        self.totals = self.matrix.sum(axis=0).astype(np.int64)
+
+        # Sections of every question as column numbers, padded with -1
+        width = int(self.matrix.sum(axis=1).max()) if self.matrix.size else 0
+        order = np.argsort(-self.matrix, axis=1, kind="stable")[:, :width]
+        self.question_sections = np.where(
+            np.take_along_axis(self.matrix, order, axis=1) > 0, order, -1
+        )
+
+    def positions(self, question_numbers):
+        """
+        Get the positions in the bank of question numbers.
+
+        Args:
+            question_numbers (array-like): Question numbers
+
+        Returns:
+            np.ndarray: Positions (int64), -1 for questions not in the bank
+        """
+        numbers = np.asarray(question_numbers, dtype=np.int64)
+        positions = np.full(len(numbers), -1, dtype=np.int64)
+        known = (numbers >= 0) & (numbers < len(self.bank.index))
+        positions[known] = self.bank.index[numbers[known]]
+        return positions
+
+    def unseen(self, answered_numbers):
+        """
+        Count the questions never answered per section.
+
+        Args:
+            answered_numbers (array-like): Questions answered at least once
+
+        Returns:
+            np.ndarray: Unseen questions per section (int64)
+        """
+        seen = self.bank.numbers_mask(answered_numbers).astype(np.float64)
+        return self.totals - (seen @ self.matrix).round().astype(np.int64)
+
+    def grouped_counts(self, groups, question_numbers, correct, incorrect, answered_at=None):
+        """
+        Count answers per group (e.g. user) and section.
+
+        Args:
+            groups (array-like): Group of every row
+            question_numbers (array-like): Question of every row
+            correct (array-like): Correct answers of every row
+            incorrect (array-like): Incorrect answers of every row
+            answered_at (array-like, optional): Time of every row (datetime64)
+
+        Returns:
+            Tuple: group values, and correct, incorrect and last answered time
+                (datetime64, NaT if never) per group and section, each of shape
+                (groups, sections)
+        """
+        positions = self.positions(question_numbers)
+        known = positions != -1
+        groups = np.asarray(groups)[known]
+        positions = positions[known]
+        correct = np.asarray(correct, dtype=np.float64)[known]
+        incorrect = np.asarray(incorrect, dtype=np.float64)[known]
+
+        # factorize hashes the rows and only sorts the distinct groups, np.unique would sort every row
+        codes, values = pd.factorize(groups, sort=True)
+        values = np.asarray(values)
+
+        # One (row, section) entry per section of the question of every row
+        sections = self.question_sections[positions]
+        entries = sections >= 0
+        rows = np.broadcast_to(np.arange(len(positions))[:, None], sections.shape)[entries]
+        keys = (codes[:, None].astype(np.int64) * len(self.sections) + sections)[entries]
+
+        shape = (len(values), len(self.sections))
+        cells = shape[0] * shape[1]
+        correct_counts = np.bincount(keys, weights=correct[rows], minlength=cells).reshape(shape)
+        incorrect_counts = np.bincount(keys, weights=incorrect[rows], minlength=cells).reshape(shape)
+
+        last = np.full(shape, np.datetime64("NaT"), dtype="datetime64[ns]")
+        if answered_at is not None:
+            times = np.asarray(answered_at, dtype="datetime64[ns]")[known].astype(np.int64)
+            # NaT is the smallest int64, so it never wins the maximum
+            latest = np.full(cells, np.iinfo(np.int64).min, dtype=np.int64)
+            np.maximum.at(latest, keys, times[rows])
+            last = latest.reshape(shape).view("datetime64[ns]")
+
+        return (
+            values,
+            correct_counts.round().astype(np.int64),
+            incorrect_counts.round().astype(np.int64),
+            last,
+        )
+
+
+def for_bank(bank):
+    """
+    Get the engine of a bank, built once per bank version.
+
+    Args:
+        bank (qb.QuestionBank): The question bank
+
+    Returns:
+        ProgressEngine: The engine
+    """
+    engine = _engines.get(bank.especialidad)
+    if engine is None or engine.bank is not bank:
+        engine = ProgressEngine(bank)
+        with _engines_lock:
+            _engines[bank.especialidad] = engine
+    return engine
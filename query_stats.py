@@ -0,0 +1,241 @@
+"""
+Timing of the database statements and page renders.
+
+Every statement run through db is recorded under its normalized SQL text
+(whitespace collapsed, literals replaced by ?): number of executions, errors,
+latency histogram, rows and the wait for a pool connection. Statements slower
+than the slow-query threshold (SLOW_QUERY_MS, from the environment variable of
+the same name) are also kept in a bounded slow-query log.
+
+Page renders are wrapped in render(), which counts the statements run by the
+thread of the render, so the round trips per page show up next to their time.
+The admin panel shows get_stats() and offers export_json() as a download.
+"""
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+MAX_SLOW_QUERIES = 200
+MAX_STATEMENTS = 512
+# Upper bounds of the latency histogram buckets, the last one takes the rest
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+# SQL -> normalized SQL
+_normalized = {}
+# normalized SQL -> statistics
+_statements = {}
+# page -> render statistics
+_renders = {}
+_slow_queries = deque(maxlen=MAX_SLOW_QUERIES)
+_stats_lock = threading.Lock()
+_local = threading.local()
+
+
+def normalize(query):
+    """
+    Normalize a SQL statement, so its executions are recorded together.
+
+    Args:
+        query (str): SQL text
+
+    Returns:
+        str: The text in one line, with literals replaced by ?
+    """
+    normalized = _normalized.get(query)
+    if normalized is None:
+        normalized = _SPACES.sub(" ", _LITERALS.sub("?", query)).strip()
+        if len(_normalized) >= MAX_STATEMENTS:
+            _normalized.clear()
+        _normalized[query] = normalized
+    return normalized
+
+
+def set_slow_threshold(milliseconds):
+    """
+    Change the slow-query threshold of the process.
+
+    Args:
+        milliseconds (float): Statements slower than this go to the slow-query log
+    """
+    global SLOW_QUERY_MS
+    SLOW_QUERY_MS = float(milliseconds)
+
+
+def record(query, seconds, rows=0, wait=0.0, error=False):
+    """
+    Record one execution of a statement.
+
+    Args:
+        query (str): SQL text
+        seconds (float): Time of the execution, including the pool wait
+        rows (int): Rows returned or affected
+        wait (float): Seconds waiting for a pool connection
+        error (bool): Whether the statement failed
+    """
+    sql = normalize(query)
+    elapsed_ms = seconds * 1000
+    bucket = next(i for i, bound in enumerate(BUCKETS_MS) if elapsed_ms <= bound)
+    with _stats_lock:
+        stats = _statements.get(sql)
+        if stats is None:
+            if len(_statements) >= MAX_STATEMENTS:
+                logger.warning(f"More than {MAX_STATEMENTS} distinct statements, query statistics reset")
+                _statements.clear()
+            stats = _statements[sql] = {
+                "executions": 0,
+                "errors": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "rows": 0,
+                "wait_ms": 0.0,
+                "histogram": [0] * len(BUCKETS_MS),
+            }
+        stats["executions"] += 1
+        stats["errors"] += int(error)
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        stats["rows"] += max(rows or 0, 0)
+        stats["wait_ms"] += wait * 1000
+        stats["histogram"][bucket] += 1
+
+        if elapsed_ms >= SLOW_QUERY_MS:
+            _slow_queries.append({
+                "at": datetime.now().isoformat(timespec="seconds"),
+                "sql": sql,
+                "ms": round(elapsed_ms, 2),
+                "rows": rows,
+                "wait_ms": round(wait * 1000, 2),
+                "page": getattr(_local, "page", None),
+                "error": error,
+            })
+
+    if getattr(_local, "page", None) is not None:
+        _local.round_trips += 1
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning(f"Slow query ({elapsed_ms:.0f} ms, {rows} rows): {sql[:200]}")
+
+
+@contextmanager
+def render(page):
+    """
+    Count the round trips and the time of a page render.
+
+    Args:
+        page (str): Page name, can be refined during the render with set_page()
+    """
+    _local.page = page
+    _local.round_trips = 0
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        page, round_trips = _local.page, _local.round_trips
+        _local.page = None
+        with _stats_lock:
+            stats = _renders.setdefault(
+                page, {"renders": 0, "round_trips": 0, "max_round_trips": 0, "total_ms": 0.0}
+            )
+            stats["renders"] += 1
+            stats["round_trips"] += round_trips
+            stats["max_round_trips"] = max(stats["max_round_trips"], round_trips)
+            stats["total_ms"] += elapsed_ms
+
+
+def set_page(page):
+    """Rename the page of the render running in this thread."""
+    if getattr(_local, "page", None) is not None:
+        _local.page = page
+
+
+def _percentile(stats, fraction):
+    """Upper bound of the bucket holding the given fraction of the executions."""
+    target = stats["executions"] * fraction
+    seen = 0
+    for bound, count in zip(BUCKETS_MS, stats["histogram"]):
+        seen += count
+        if seen >= target and count:
+            # The last bucket has no bound, the slowest execution is the best estimate
+            return bound if bound != float("inf") else round(stats["max_ms"], 2)
+    return None
+
+
+def _bucket_label(bound):
+    """Label of a histogram bucket."""
+    return f"<={bound:g}ms" if bound != float("inf") else f">{BUCKETS_MS[-2]:g}ms"
+
+
+def get_stats():
+    """
+    Get the statement, render and slow-query statistics.
+
+    Returns:
+        Dict: statements (one entry per normalized statement, slowest total first),
+            renders (one entry per page), slow_queries and slow_query_ms
+    """
+    with _stats_lock:
+        statements = [
+            {
+                "sql": sql,
+                "executions": stats["executions"],
+                "errors": stats["errors"],
+                "total_ms": round(stats["total_ms"], 2),
+                "avg_ms": round(stats["total_ms"] / stats["executions"], 2),
+                "p50_ms": _percentile(stats, 0.5),
+                "p95_ms": _percentile(stats, 0.95),
+                "max_ms": round(stats["max_ms"], 2),
+                "avg_rows": round(stats["rows"] / stats["executions"], 1),
+                "avg_wait_ms": round(stats["wait_ms"] / stats["executions"], 2),
+                "histogram": dict(zip(map(_bucket_label, BUCKETS_MS), stats["histogram"])),
+            }
+            for sql, stats in _statements.items()
+        ]
+        renders = [
+            {
+                "page": page,
+                "renders": stats["renders"],
+                "avg_round_trips": round(stats["round_trips"] / stats["renders"], 1),
+                "max_round_trips": stats["max_round_trips"],
+                "avg_ms": round(stats["total_ms"] / stats["renders"], 2),
+            }
+            for page, stats in _renders.items()
+        ]
+        slow_queries = list(_slow_queries)
+    statements.sort(key=lambda stats: stats["total_ms"], reverse=True)
+    return {
+        "statements": statements,
+        "renders": renders,
+        "slow_queries": slow_queries,
+        "slow_query_ms": SLOW_QUERY_MS,
+    }
+
+
+def export_json():
+    """
+    Get the statistics as a JSON document.
+
+    Returns:
+        str: get_stats() as indented JSON
+    """
+    return json.dumps(get_stats(), indent=4, default=str)
+
+
+def reset():
+    """Clear all the statistics."""
+    with _stats_lock:
+        _statements.clear()
+        _renders.clear()
+        _slow_queries.clear()
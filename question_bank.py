@@ -0,0 +1,942 @@
+"""
+Process-wide cache for the question banks stored in jsons/<especialidad>_examtopics.json.
+
+Every Streamlit session shares one in-memory copy of each bank. The cached copy is
+keyed by the file version (mtime + size) so an edit made by the admin panel is
+picked up automatically on the next read, and the admin writers also call
+invalidate() explicitly after touching a file.
+
+Each cached bank is a QuestionBank: the original records plus NumPy columns
+(question numbers, a section bitmask and a digest of the correct answers) so the
+practice, exam and progress pages can filter and score without walking the dicts.
+
+Next to every JSON file a compiled snapshot (<especialidad>_examtopics.qbank) is
+kept: a versioned binary file with the columns and a string table holding each
+question as compact JSON. It is memory-mapped on load, so a restarted container
+gets its banks back without parsing the JSON, worker processes share the pages,
+and questions are only decoded when a page actually reads them. The JSON file
+stays the source of truth; the snapshot is ignored whenever it is stale.
+
+Admin edits do not rewrite the JSON file: they are appended to an edit journal
+(<especialidad>_examtopics.journal, one JSON line per add/modify/delete) that
+readers replay over the base file. A background thread later folds the journal
+into a fresh base file, written next to it and swapped in with an atomic rename,
+so readers never see a half-written bank. Appends, compactions and base rewrites
+hold a file lock (<especialidad>_examtopics.lock), so the worker processes never
+truncate an edit another one just appended.
+
+Published banks are immutable snapshots (MVCC): a new version is built aside and
+swapped into the cache by reference, so a reader keeps the bank it started with
+for the whole rerun, a session never waits while another one builds a new
+version, and a failed load keeps serving the last good bank.
+
+The banks returned by get_bank() are shared between sessions: treat them as read-only.
+"""
+
+import os
+import json
+import fcntl
+import mmap
+import struct
+import hashlib
+import time
+import itertools
+import threading
+import logging
+from collections.abc import Sequence
+from contextlib import contextmanager
+import numpy as np
+import constantes as c
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Constants
+RUTA = os.path.join(os.path.dirname(__file__), "jsons")
+ESPECIALIDADES = ["snowflake_pro", "snowflake_arch", "dbt", "google"]
+
+# Section bitmasks are stored as uint64
+MAX_SECCIONES = 64
+
+# Compiled snapshot layout: header, sections (JSON), numbers, section masks,
+# correct keys, record offsets and the string table, arrays aligned to 8 bytes
+SNAPSHOT_MAGIC = b"QBNK"
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_HEADER = struct.Struct("<4sHHqqQQQQQQQQ")
+
+# Seconds to wait after an edit before compacting, so an import is folded at once
+COMPACTION_DELAY = 5
+
+# especialidad -> (version, QuestionBank)
+_banks = {}
+_banks_lock = threading.Lock()
+# One lock per specialty so a slow load does not block the other banks
+_load_locks = {especialidad: threading.Lock() for especialidad in ESPECIALIDADES}
+# Serialize journal appends, compactions and base rewrites of the same specialty
+# between the threads of a process; _write_lock() adds a file lock for the processes
+_write_locks = {especialidad: threading.Lock() for especialidad in ESPECIALIDADES}
+_stats = {"hits": 0, "misses": 0, "reloads": 0, "stale_serves": 0, "load_errors": 0, "compactions": 0}
+# Generation number of every published bank
+_generations = itertools.count(1)
+
+_compaction_pending = set()
+_compaction_event = threading.Event()
+_compactor = None
+# Callbacks run by the compactor with the specialty of every bank it folded
+_compaction_listeners = []
+
+
+def bank_path(especialidad):
+    """
+    Get the path of the JSON file holding a specialty's questions.
+
+    Args:
+        especialidad (str): The specialization type
+
+    Returns:
+        str: Path to the JSON file
+
+    Raises:
+        ValueError: If the specialization is not supported
+    """
+    if especialidad not in ESPECIALIDADES:
+        raise ValueError(f"Unsupported specialization: {especialidad}")
+    return os.path.join(RUTA, f"{especialidad}_examtopics.json")
+
+
+def _file_version(path):
+    """
+    Get the version of a file as (mtime in ns, size in bytes).
+
+    Args:
+        path (str): Path to the file
+
+    Returns:
+        Tuple[int, int]: The file version
+    """
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def snapshot_path(especialidad):
+    """
+    Get the path of the compiled snapshot of a specialty's questions.
+
+    Args:
+        especialidad (str): The specialization type
+
+    Returns:
+        str: Path to the .qbank file
+    """
+    return os.path.splitext(bank_path(especialidad))[0] + ".qbank"
+
+
+def journal_path(especialidad):
+    """
+    Get the path of the edit journal of a specialty's questions.
+
+    Args:
+        especialidad (str): The specialization type
+
+    Returns:
+        str: Path to the .journal file
+    """
+    return os.path.splitext(bank_path(especialidad))[0] + ".journal"
+
+
+def lock_path(especialidad):
+    """
+    Get the path of the file locked by the writers of a specialty's questions.
+
+    Args:
+        especialidad (str): The specialization type
+
+    Returns:
+        str: Path to the .lock file
+    """
+    return os.path.splitext(bank_path(especialidad))[0] + ".lock"
+
+
+@contextmanager
+def _write_lock(especialidad):
+    """
+    Hold the write lock of a bank in this process and in every other worker.
+
+    Worker processes share the journal and base files and each one runs its own
+    compactor, so the thread lock alone would let an append of another process
+    land between a compaction reading the journal and truncating it.
+    """
+    with _write_locks[especialidad]:
+        with open(lock_path(especialidad), "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _current_version(especialidad):
+    """
+    Get the version of a bank: the JSON file version plus the journal size.
+
+    Args:
+        especialidad (str): The specialization type
+
+    Returns:
+        Tuple[int, int, int]: mtime and size of the JSON file, size of the journal
+    """
+    try:
+        journal_size = os.stat(journal_path(especialidad)).st_size
+    except FileNotFoundError:
+        journal_size = 0
+    return _file_version(bank_path(especialidad)) + (journal_size,)
+
+
+def answer_key(answers):
+    """
+    Get a stable 64-bit digest of a set of answers.
+
+    The order of the answers and surrounding whitespace are ignored, so a
+    multi-choice answer matches regardless of the order it was selected in.
+
+    Args:
+        answers (List[str]): The answers
+
+    Returns:
+        int: The signed 64-bit digest
+    """
+    normalizadas = sorted(str(answer).strip() for answer in answers)
+    digest = hashlib.blake2b("\x1f".join(normalizadas).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class QuestionBank:
+    """
+    Read-only columnar view of a question bank, built once per file version.
+
+    Attributes:
+        especialidad (str): The specialization type
+        version (Tuple[int, int]): Version of the file it was built from
+        generation (int): Publication number in the cache, 0 until published
+        cache_version (Tuple[int, int, int]): Version it was published under (file
+            version plus journal size), stable across processes; None until published
+        records (Sequence[Dict]): The original questions, used for the text fields
+        sections (List[str]): Section names, the index is the bit in section_mask
+        numbers (np.ndarray): question_number of every question (int32)
+        section_mask (np.ndarray): Bitmask of the question_area of every question (uint64)
+        correct_keys (np.ndarray): answer_key() of every correct_answer (int64)
+        index (np.ndarray): Position of every question_number in the bank, -1 if missing (int32)
+        section_sets (Dict[str, np.ndarray]): Inverted index, section -> boolean mask of its questions
+    """
+
+    def __init__(self, especialidad, records, sections, numbers, section_mask, correct_keys,
+                 version=None, source="json"):
+        self.especialidad = especialidad
+        self.version = version
+        self.generation = 0
+        self.cache_version = None
+        self.source = source
+        self.records = records
+        self.sections = sections
+        self.numbers = numbers
+        self.section_mask = section_mask
+        self.correct_keys = correct_keys
+
+        # Dense question_number -> position index, robust to gaps left by deletions
+        size = len(numbers)
+        self.index = np.full(max(int(numbers.max()) + 1, 1) if size else 1, -1, dtype=np.int32)
+        valid = np.flatnonzero(numbers >= 0)
+        # Assigned in reverse so the first question wins on duplicates
+        self.index[numbers[valid[::-1]]] = valid[::-1]
+        if np.count_nonzero(self.index != -1) < len(valid):
+            logger.warning(f"Duplicated question_number values in {especialidad}")
+
+        # Inverted index section -> questions, so filters are just ANDs and ORs
+        self.section_sets = {
+            seccion: (section_mask & np.uint64(1 << bit)) != 0
+            for bit, seccion in enumerate(sections)
+        }
+
+        for column in (self.numbers, self.section_mask, self.correct_keys, self.index,
+                       *self.section_sets.values()):
+            column.setflags(write=False)
+
+    @classmethod
+    def from_records(cls, especialidad, records, version=None):
+        """
+        Build the columns of a bank from its parsed questions.
+
+        Args:
+            especialidad (str): The specialization type
+            records (List[Dict]): The questions
+            version (Tuple[int, int], optional): Version of the file they come from
+
+        Returns:
+            QuestionBank: The bank
+        """
+        # Known sections first, then any other area found in the file
+        sections = [
+            seccion for seccion in getattr(c, f"SECCIONES_{especialidad.upper()}", [])
+            if seccion != "Todas"
+        ]
+        section_bits = {seccion: bit for bit, seccion in enumerate(sections)}
+
+        size = len(records)
+        numbers = np.empty(size, dtype=np.int32)
+        section_mask = np.zeros(size, dtype=np.uint64)
+        correct_keys = np.empty(size, dtype=np.int64)
+
+        for pos, question in enumerate(records):
+            numbers[pos] = int(question.get("question_number") or 0)
+            mask = 0
+            for area in question.get("question_area") or []:
+                bit = section_bits.get(area)
+                if bit is None:
+                    if len(sections) >= MAX_SECCIONES:
+                        logger.warning(f"Too many sections in {especialidad}, ignoring '{area}'")
+                        continue
+                    bit = section_bits[area] = len(sections)
+                    sections.append(area)
+                mask |= 1 << bit
+            section_mask[pos] = mask
+            correct_keys[pos] = answer_key(question.get("correct_answer") or [])
+
+        return cls(
+            especialidad, tuple(records), sections, numbers, section_mask, correct_keys, version
+        )
+
+    def __len__(self):
+        return len(self.records)
+
+    def position(self, question_number):
+        """
+        Get the position of a question in the bank.
+
+        Args:
+            question_number (int): The question number
+
+        Returns:
+            int or None: The position, or None if there is no such question
+        """
+        number = int(question_number)
+        if 0 <= number < len(self.index) and self.index[number] != -1:
+            return int(self.index[number])
+        return None
+
+    def record(self, question_number):
+        """
+        Get a question by its number.
+
+        Args:
+            question_number (int): The question number
+
+        Returns:
+            Dict or None: The question, or None if there is no such question
+        """
+        pos = self.position(question_number)
+        return self.records[pos] if pos is not None else None
+
+    def numbers_mask(self, question_numbers):
+        """
+        Get a boolean mask over the bank selecting the given question numbers.
+
+        Args:
+            question_numbers (Iterable[int]): Question numbers, unknown ones are ignored
+
+        Returns:
+            np.ndarray: Boolean mask aligned with the bank columns
+        """
+        mask = np.zeros(len(self.records), dtype=bool)
+        numbers = np.fromiter((int(number) for number in question_numbers), dtype=np.int64)
+        numbers = numbers[(numbers >= 0) & (numbers < len(self.index))]
+        positions = self.index[numbers]
+        mask[positions[positions != -1]] = True
+        return mask
+
+    def field(self, pos, name, default=None):
+        """
+        Get a text field of a question.
+
+        Args:
+            pos (int): Position of the question in the bank
+            name (str): Field name (question, answers, explanation...)
+            default: Value returned if the field is missing
+
+        Returns:
+            The field value
+        """
+        return self.records[pos].get(name, default)
+
+    def filter(self, rango=None, secciones=None, incluir=None):
+        """
+        Combine the practice/exam filters into a boolean mask over the bank.
+
+        Args:
+            rango (Tuple[int, int], optional): Inclusive range of question numbers
+            secciones (List[str], optional): Sections, a question matches if it is in any of them.
+                Ignored when empty or when it contains "Todas"
+            incluir (np.ndarray, optional): Boolean mask the result is restricted to
+
+        Returns:
+            np.ndarray: Boolean mask aligned with the bank columns
+        """
+        if rango is not None:
+            seleccion = (self.numbers >= rango[0]) & (self.numbers <= rango[1])
+        else:
+            seleccion = np.ones(len(self.records), dtype=bool)
+
+        if secciones and "Todas" not in secciones:
+            en_secciones = np.zeros(len(self.records), dtype=bool)
+            for seccion in secciones:
+                if seccion in self.section_sets:
+                    en_secciones |= self.section_sets[seccion]
+            seleccion &= en_secciones
+
+        if incluir is not None:
+            seleccion &= incluir
+        return seleccion
+
+    def score(self, pos, user_answer):
+        """
+        Score a user answer against the packed correct answer.
+
+        Args:
+            pos (int): Position of the question in the bank
+            user_answer (List[str]): The selected answers
+
+        Returns:
+            int or None: 1 if correct, 0 if wrong, None if not answered
+        """
+        if isinstance(user_answer, str):
+            user_answer = [user_answer]
+        respuestas = [answer for answer in (user_answer or []) if answer]
+        if not respuestas:
+            return None
+        return 1 if answer_key(respuestas) == self.correct_keys[pos] else 0
+
+
+class SnapshotRecords(Sequence):
+    """
+    Questions of a memory-mapped snapshot, decoded from the string table on first access.
+    """
+
+    def __init__(self, buffer, offsets, base):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._base = base
+        self._decoded = {}
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self[i] for i in range(*pos.indices(len(self)))]
+        if pos < 0:
+            pos += len(self)
+        if not 0 <= pos < len(self):
+            raise IndexError("question position out of range")
+        record = self._decoded.get(pos)
+        if record is None:
+            start = self._base + int(self._offsets[pos])
+            end = self._base + int(self._offsets[pos + 1])
+            record = self._decoded[pos] = json.loads(self._buffer[start:end].decode("utf-8"))
+        return record
+
+
+def _align(size):
+    """Round a size up to the next multiple of 8 bytes."""
+    return (size + 7) & ~7
+
+
+def write_snapshot(bank, path):
+    """
+    Write the compiled snapshot of a bank.
+
+    The file is written next to its final path and moved into place with an
+    atomic rename, so readers see either the old snapshot or the new one.
+
+    Args:
+        bank (QuestionBank): The bank, with its version set to the JSON file version
+        path (str): Path of the .qbank file
+    """
+    sections = json.dumps(bank.sections, ensure_ascii=False).encode("utf-8")
+    strings = [
+        json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        for record in bank.records
+    ]
+    offsets = np.zeros(len(strings) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(string) for string in strings], dtype=np.uint64)
+
+    sections_off = SNAPSHOT_HEADER.size
+    numbers_off = _align(sections_off + len(sections))
+    masks_off = _align(numbers_off + bank.numbers.nbytes)
+    keys_off = masks_off + bank.section_mask.nbytes
+    offsets_off = keys_off + bank.correct_keys.nbytes
+    strings_off = offsets_off + offsets.nbytes
+
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, 0, bank.version[0], bank.version[1], len(strings),
+        sections_off, len(sections), numbers_off, masks_off, keys_off, offsets_off, strings_off,
+    )
+
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, "wb") as snapshot:
+        snapshot.write(header)
+        snapshot.write(sections)
+        snapshot.write(b"\0" * (numbers_off - sections_off - len(sections)))
+        snapshot.write(bank.numbers.tobytes())
+        snapshot.write(b"\0" * (masks_off - numbers_off - bank.numbers.nbytes))
+        snapshot.write(bank.section_mask.tobytes())
+        snapshot.write(bank.correct_keys.tobytes())
+        snapshot.write(offsets.tobytes())
+        for string in strings:
+            snapshot.write(string)
+    os.replace(tmp_path, path)
+
+
+def _read_snapshot(especialidad, version):
+    """
+    Load a bank from its compiled snapshot if it matches the JSON file version.
+
+    Args:
+        especialidad (str): The specialization type
+        version (Tuple[int, int]): Current version of the JSON file
+
+    Returns:
+        QuestionBank or None: The bank, or None if the snapshot is missing or stale
+    """
+    path = snapshot_path(especialidad)
+    try:
+        with open(path, "rb") as snapshot:
+            buffer = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):  # Missing or empty file
+        return None
+
+    if len(buffer) < SNAPSHOT_HEADER.size:
+        return None
+    (magic, formato, _, mtime_ns, size, count, sections_off, sections_len,
+     numbers_off, masks_off, keys_off, offsets_off, strings_off) = SNAPSHOT_HEADER.unpack_from(buffer)
+    if magic != SNAPSHOT_MAGIC or formato != SNAPSHOT_FORMAT or (mtime_ns, size) != version:
+        return None
+
+    sections = json.loads(buffer[sections_off:sections_off + sections_len].decode("utf-8"))
+    numbers = np.frombuffer(buffer, dtype=np.int32, count=count, offset=numbers_off)
+    section_mask = np.frombuffer(buffer, dtype=np.uint64, count=count, offset=masks_off)
+    correct_keys = np.frombuffer(buffer, dtype=np.int64, count=count, offset=keys_off)
+    offsets = np.frombuffer(buffer, dtype=np.uint64, count=count + 1, offset=offsets_off)
+    records = SnapshotRecords(buffer, offsets, strings_off)
+    return QuestionBank(
+        especialidad, records, sections, numbers, section_mask, correct_keys, version, "snapshot"
+    )
+
+
+def _compile(especialidad, path, version):
+    """
+    Parse a JSON bank and refresh its compiled snapshot.
+
+    Args:
+        especialidad (str): The specialization type
+        path (str): Path to the JSON file
+        version (Tuple[int, int]): Version of the JSON file
+
+    Returns:
+        QuestionBank: The bank
+    """
+    bank = QuestionBank.from_records(especialidad, _load(path), version)
+    try:
+        write_snapshot(bank, snapshot_path(especialidad))
+    except OSError as e:
+        logger.warning(f"Could not write the question bank snapshot for {especialidad}: {str(e)}")
+    return bank
+
+
+def _install(especialidad, version, bank, cached):
+    """Publish a freshly loaded bank in the cache, swapping it in by reference."""
+    with _banks_lock:
+        _stats["reloads" if cached is not None else "misses"] += 1
+        bank.generation = next(_generations)
+        bank.cache_version = version
+        _banks[especialidad] = (version, bank)
+    logger.info(
+        f"Question bank generation {bank.generation} published for {especialidad} "
+        f"from {bank.source}: {len(bank)} questions"
+    )
+
+
+def _count(counter):
+    """Increment one of the cache counters."""
+    with _banks_lock:
+        _stats[counter] += 1
+
+
+def _load(path):
+    """
+    Parse a question bank file.
+
+    Args:
+        path (str): Path to the JSON file
+
+    Returns:
+        List[Dict]: The questions
+    """
+    with open(path, "r", encoding="utf-8") as archivo:
+        datos = json.load(archivo)
+    if isinstance(datos, dict):  # A single question saved as an object
+        datos = [datos]
+    return datos
+
+
+def _json_default(value):
+    """Serialize NumPy scalars coming from pandas (Excel imports)."""
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _tmp_path(path):
+    """
+    Name of the file a write goes to before it is moved into place.
+
+    Unique per thread: compaction and request threads of the same process can
+    write the same file at once.
+    """
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _write_json_atomic(path, data):
+    """
+    Write a JSON file next to its final path and move it into place atomically.
+
+    Args:
+        path (str): Path to the JSON file
+        data: The data to save
+    """
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, "w", encoding="utf-8") as archivo:
+        json.dump(data, archivo, indent=4, ensure_ascii=False, default=_json_default)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_journal(especialidad):
+    """
+    Read the pending edits of a bank.
+
+    A trailing line without newline is an append still in progress and is skipped.
+
+    Args:
+        especialidad (str): The specialization type
+
+    Returns:
+        Tuple[int, List[Dict]]: Bytes read and the journal entries
+    """
+    try:
+        with open(journal_path(especialidad), "rb") as journal:
+            data = journal.read()
+    except FileNotFoundError:
+        return 0, []
+
+    entries = []
+    for line in data[:data.rfind(b"\n") + 1].splitlines():
+        if not line.strip():
+            continue
+        try:
+            entries.append(json.loads(line.decode("utf-8")))
+        except (ValueError, UnicodeDecodeError):
+            logger.warning(f"Skipping corrupt journal entry in {especialidad}")
+    return len(data), entries
+
+
+def _apply_journal(records, entries):
+    """
+    Replay journal entries over a list of questions.
+
+    add and modify insert or replace the question with the same question_number,
+    delete removes it. Replaying entries already folded into the base is harmless.
+
+    Args:
+        records (Sequence[Dict]): The base questions
+        entries (List[Dict]): The journal entries, oldest first
+
+    Returns:
+        List[Dict]: The resulting questions
+    """
+    merged = list(records)
+    positions = {
+        question.get("question_number"): pos for pos, question in enumerate(merged)
+    }
+    for entry in entries:
+        operacion = entry.get("op")
+        if operacion in ("add", "modify"):
+            question = entry["question"]
+            number = question.get("question_number")
+            pos = positions.get(number) if number is not None else None
+            if pos is None:
+                positions[number] = len(merged)
+                merged.append(question)
+            else:
+                merged[pos] = question
+        elif operacion == "delete":
+            pos = positions.pop(entry.get("question_number"), None)
+            if pos is not None:
+                merged[pos] = None
+    return [question for question in merged if question is not None]
+
+
+def get_bank(especialidad):
+    """
+    Get the questions of a specialty from the process-wide cache.
+
+    When the cached copy is missing or out of date the bank is loaded from its
+    compiled snapshot, and the JSON file is parsed only if the snapshot is stale.
+    Pending journal edits are replayed on top.
+
+    Only one session builds a new version; the others keep getting the previous
+    bank meanwhile. If the new version cannot be loaded the previous bank is
+    served too, so only the very first load of a bank can fail.
+
+    Args:
+        especialidad (str): The specialization type
+
+    Returns:
+        QuestionBank: The questions and their columns (shared, do not modify)
+
+    Raises:
+        ValueError: If the specialization is not supported
+        OSError: If the file cannot be read
+        json.JSONDecodeError: If the file is not valid JSON
+    """
+    path = bank_path(especialidad)
+    version = _current_version(especialidad)
+
+    cached = _banks.get(especialidad)
+    if cached is not None and cached[0] == version:
+        _count("hits")
+        return cached[1]
+
+    load_lock = _load_locks[especialidad]
+    if not load_lock.acquire(blocking=cached is None):
+        # Another session is building the new version, keep serving the previous one
+        _count("stale_serves")
+        return cached[1]
+
+    try:
+        # Another session may have loaded it while we were waiting
+        cached = _banks.get(especialidad)
+        if cached is not None and cached[0] == _current_version(especialidad):
+            _count("hits")
+            return cached[1]
+
+        # The journal is read before the base: if a compaction runs in between we
+        # get the new base plus already folded entries, which replay harmlessly
+        journal_size, entries = _read_journal(especialidad)
+        base_version = _file_version(path)
+        bank = _read_snapshot(especialidad, base_version)
+        if bank is None:
+            bank = _compile(especialidad, path, base_version)
+        if entries:
+            bank = QuestionBank.from_records(
+                especialidad, _apply_journal(bank.records, entries), base_version
+            )
+            bank.source = "journal"
+        _install(especialidad, base_version + (journal_size,), bank, cached)
+        return bank
+    except Exception as e:
+        if cached is None:
+            raise
+        logger.error(f"Error reloading question bank {especialidad}, serving the previous one: {str(e)}", exc_info=True)
+        _count("load_errors")
+        return cached[1]
+    finally:
+        load_lock.release()
+
+
+def compile_snapshot(especialidad):
+    """
+    Rebuild the compiled snapshot of a bank and publish it in the cache.
+
+    Called whenever the base JSON file is rewritten.
+
+    Args:
+        especialidad (str): The specialization type
+    """
+    path = bank_path(especialidad)
+    with _load_locks[especialidad]:
+        version = _current_version(especialidad)
+        bank = _compile(especialidad, path, version[:2])
+        if version[2]:
+            # Edits still pending in the journal, let the next read replay them
+            invalidate(especialidad)
+        else:
+            _install(especialidad, version, bank, _banks.get(especialidad))
+
+
+def append_journal(especialidad, entries):
+    """
+    Record admin edits in the journal of a bank.
+
+    Each call is a single append to the journal, whatever the size of the bank.
+
+    Args:
+        especialidad (str): The specialization type
+        entries (List[Dict]): Edits, each one of {"op": "add", "question": {...}},
+            {"op": "modify", "question": {...}} or {"op": "delete", "question_number": n}
+    """
+    lines = "".join(
+        json.dumps(entry, ensure_ascii=False, default=_json_default) + "\n" for entry in entries
+    )
+    with _write_lock(especialidad):
+        with open(journal_path(especialidad), "a", encoding="utf-8") as journal:
+            journal.write(lines)
+            journal.flush()
+            os.fsync(journal.fileno())
+    schedule_compaction(especialidad)
+
+
+def write_base(especialidad, records):
+    """
+    Replace all the questions of a bank, discarding its pending journal.
+
+    Args:
+        especialidad (str): The specialization type
+        records (List[Dict]): The questions
+    """
+    with _write_lock(especialidad):
+        _write_json_atomic(bank_path(especialidad), records)
+        if os.path.exists(journal_path(especialidad)):
+            open(journal_path(especialidad), "w").close()
+    compile_snapshot(especialidad)
+
+
+def compact(especialidad):
+    """
+    Fold the journal of a bank into a fresh base file and snapshot.
+
+    Args:
+        especialidad (str): The specialization type
+
+    Returns:
+        bool: Whether there was anything to fold
+    """
+    path = bank_path(especialidad)
+    with _write_lock(especialidad):
+        _, entries = _read_journal(especialidad)
+        if not entries:
+            return False
+        records = _apply_journal(_load(path), entries)
+        _write_json_atomic(path, records)
+        bank = QuestionBank.from_records(especialidad, records, _file_version(path))
+        write_snapshot(bank, snapshot_path(especialidad))
+        # Readers that already saw the new base replay these entries harmlessly
+        open(journal_path(especialidad), "w").close()
+    _count("compactions")
+    logger.info(f"Question bank journal compacted for {especialidad}: {len(entries)} edits")
+    return True
+
+
+def _compaction_worker():
+    """Background loop compacting the banks that received edits."""
+    while True:
+        _compaction_event.wait()
+        # Let a burst of edits (e.g. a batched import) land before folding it
+        time.sleep(COMPACTION_DELAY)
+        _compaction_event.clear()
+        with _banks_lock:
+            pending = list(_compaction_pending)
+            _compaction_pending.clear()
+        for especialidad in pending:
+            try:
+                compact(especialidad)
+            except Exception as e:
+                logger.error(f"Error compacting question bank {especialidad}: {str(e)}", exc_info=True)
+                continue
+            for listener in list(_compaction_listeners):
+                try:
+                    listener(especialidad)
+                except Exception as e:
+                    logger.error(f"Error after compacting question bank {especialidad}: {str(e)}", exc_info=True)
+
+
+def add_compaction_listener(listener):
+    """
+    Run a callback in the compactor thread after it folds the journal of a bank.
+
+    Used to rebuild what is derived from a bank (e.g. its Excel export) once
+    the edits have settled, outside of any page rerun.
+
+    Args:
+        listener (callable): Function taking the specialty
+    """
+    with _banks_lock:
+        if listener not in _compaction_listeners:
+            _compaction_listeners.append(listener)
+
+
+def schedule_compaction(especialidad):
+    """
+    Ask the background compactor to fold the journal of a bank.
+
+    Args:
+        especialidad (str): The specialization type
+    """
+    global _compactor
+    with _banks_lock:
+        _compaction_pending.add(especialidad)
+        if _compactor is None or not _compactor.is_alive():
+            _compactor = threading.Thread(
+                target=_compaction_worker, name="question-bank-compactor", daemon=True
+            )
+            _compactor.start()
+    _compaction_event.set()
+
+
+def invalidate(especialidad=None):
+    """
+    Drop the cached version of a bank so the next read reloads it.
+
+    Args:
+        especialidad (str, optional): The specialization type. All banks if None
+    """
+    with _banks_lock:
+        targets = [especialidad] if especialidad else list(_banks)
+        for target in targets:
+            if target in _banks:
+                # Keep the entry so the next load is counted as a reload
+                _banks[target] = (None, _banks[target][1])
+
+
+def get_cache_stats():
+    """
+    Get the cache counters and the state of every cached bank.
+
+    Returns:
+        Dict: hits, misses, reloads and per-specialty bank information
+    """
+    with _banks_lock:
+        stats = dict(_stats)
+        stats["banks"] = {
+            especialidad: {
+                "questions": len(bank),
+                "generation": bank.generation,
+                "sections": len(bank.sections),
+                "source": bank.source,
+                "column_bytes": bank.numbers.nbytes + bank.section_mask.nbytes + bank.correct_keys.nbytes,
+                "mtime_ns": version[0] if version else None,
+                "size_bytes": version[1] if version else None,
+                "journal_bytes": version[2] if version else None,
+            }
+            for especialidad, (version, bank) in _banks.items()
+        }
+    return stats
+
+
+if __name__ == "__main__":
+    # Fold pending edits and compile the snapshots of every bank, e.g. when
+    # building the Docker image
+    logging.basicConfig(level=logging.INFO)
+    for especialidad in ESPECIALIDADES:
+        if os.path.exists(bank_path(especialidad)):
+            compact(especialidad)
+            compile_snapshot(especialidad)
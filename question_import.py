@@ -0,0 +1,297 @@
+"""
+Streaming import of question files uploaded in the admin panel.
+
+Excel sheets are read row by row with openpyxl in read-only mode and handed
+over in chunks of CHUNK_ROWS rows, so a big workbook is never loaded at once.
+Every chunk is parsed column by column: the list columns are stored as text
+("['A', 'B']"), each distinct cell is decoded only once, trying json first and
+falling back to ast.literal_eval. Invalid rows are reported with their row
+number and column instead of aborting the whole import. Fields other than the
+known columns are kept in the questions unchanged.
+
+The valid questions are committed to the bank journal in batches of
+COMMIT_BATCH questions, one append and fsync per batch.
+"""
+import io
+import os
+import ast
+import json
+import time
+import logging
+import pandas as pd
+from openpyxl import load_workbook
+import question_bank as qb
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 2000
+COMMIT_BATCH = 5000
+REQUIRED_COLUMNS = ["question_number", "question"]
+LIST_COLUMNS = ["question_area", "answers", "correct_answer", "reference"]
+TEXT_COLUMNS = ["question", "explanation", "question_extra_info"]
+
+
+def iter_excel_chunks(uploaded_file, chunk_rows=CHUNK_ROWS):
+    """
+    Read the first sheet of a workbook in chunks.
+
+    Args:
+        uploaded_file: The uploaded .xlsx file
+        chunk_rows (int): Rows per chunk
+
+    Yields:
+        Tuple[int, pd.DataFrame]: Sheet row number of the first row and the chunk
+    """
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name).strip() if name is not None else "" for name in header]
+
+        chunk = []
+        first_row = 2
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_rows:
+                yield first_row, pd.DataFrame.from_records(chunk, columns=columns)
+                first_row += len(chunk)
+                chunk = []
+        if chunk:
+            yield first_row, pd.DataFrame.from_records(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def iter_json_chunks(uploaded_file, chunk_rows=CHUNK_ROWS):
+    """
+    Read an uploaded JSON file (a question or a list of questions) in chunks.
+
+    Args:
+        uploaded_file: The uploaded .json file
+        chunk_rows (int): Rows per chunk
+
+    Yields:
+        Tuple[int, pd.DataFrame]: Position (1-based) of the first question and the chunk
+    """
+    data = json.load(uploaded_file)
+    if isinstance(data, dict):
+        data = [data]
+    for start in range(0, len(data), chunk_rows):
+        # object columns: fields missing in some questions must not turn ints into floats
+        yield start + 1, pd.DataFrame(data[start:start + chunk_rows], dtype=object)
+
+
+def _decode_literal(value):
+    """Decode a list cell written as text, json first and Python literal otherwise."""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return ast.literal_eval(value)
+
+
+def _parse_list_column(column):
+    """
+    Parse a list column, decoding every distinct text cell only once.
+
+    Args:
+        column (pd.Series): Raw cells, text, lists or empty
+
+    Returns:
+        Tuple[pd.Series, pd.Series]: Parsed lists and the error message of every
+            invalid cell (None when the cell is valid)
+    """
+    empty = column.isna() | column.astype(str).str.strip().eq("")
+    text = column[~empty & column.map(lambda value: isinstance(value, str))]
+
+    decoded = {}
+    for value in pd.unique(text):
+        try:
+            decoded[value] = _decode_literal(value)
+        except (ValueError, SyntaxError) as e:
+            decoded[value] = e
+
+    parsed = pd.Series(
+        [
+            [] if is_empty else decoded.get(value, value) if isinstance(value, str) else value
+            for value, is_empty in zip(column, empty)
+        ],
+        index=column.index,
+        dtype=object,
+    )
+
+    errors = parsed.map(
+        lambda value: None if isinstance(value, list)
+        else f"no se puede leer: {value}" if isinstance(value, Exception)
+        else f"se esperaba una lista, no {type(value).__name__}"
+    )
+    return parsed, errors
+
+
+def _is_missing(value):
+    """Whether a cell is empty: None, NaN or NaT (lists and dicts never are)."""
+    if isinstance(value, (list, dict)):
+        return False
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def validate_chunk(df, first_row, seen_numbers):
+    """
+    Validate and convert a chunk of questions.
+
+    Args:
+        df (pd.DataFrame): The chunk, one question per row
+        first_row (int): Row number of the first question, for the error report
+        seen_numbers (Set[int]): question_number values already imported, updated in place
+
+    Returns:
+        Tuple[List[Dict], List[Dict]]: Valid questions and the row errors
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(missing)}")
+
+    df = df.reset_index(drop=True)
+    row_numbers = pd.Series(range(first_row, first_row + len(df)))
+    errors = []
+
+    def report(mask, column, message):
+        if isinstance(message, str):
+            message = pd.Series(message, index=df.index)
+        for pos in mask[mask].index:
+            errors.append({"fila": int(row_numbers[pos]), "columna": column, "error": message[pos]})
+
+    numbers = pd.to_numeric(df["question_number"], errors="coerce")
+    invalid = numbers.isna() | (numbers % 1 != 0)
+    report(invalid, "question_number", "debe ser un número entero")
+    numbers = numbers.fillna(-1).astype("int64")
+
+    duplicated = ~invalid & (numbers.duplicated(keep="first") | numbers.isin(seen_numbers))
+    report(duplicated, "question_number", "número de pregunta repetido en el archivo")
+    invalid |= duplicated
+
+    for column in TEXT_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].where(df[column].notna(), None)
+    question_missing = df["question"].isna() | df["question"].astype(str).str.strip().eq("")
+    report(question_missing, "question", "la pregunta está vacía")
+    invalid |= question_missing
+
+    for column in LIST_COLUMNS:
+        if column not in df.columns:
+            df[column] = pd.Series([[] for _ in range(len(df))], dtype=object)
+            continue
+        df[column], column_errors = _parse_list_column(df[column])
+        bad = column_errors.notna()
+        report(bad, column, column_errors)
+        invalid |= bad
+
+    df["question_number"] = numbers
+    if "explanation" in df.columns:
+        df["explanation"] = df["explanation"].fillna("").astype(str).str.replace("\r", "", regex=False)
+    else:
+        df["explanation"] = ""
+
+    valid = df[~invalid]
+    seen_numbers.update(valid["question_number"].tolist())
+
+    columns = ["question_number", "question_area", "question", "answers",
+               "correct_answer", "explanation", "reference"]
+    records = valid[columns].to_dict("records")
+
+    # Any other field (question_extra_info, or keys of JSON questions) is kept as is
+    for column in valid.columns:
+        if not column or column in columns:
+            continue
+        for record, value in zip(records, valid[column]):
+            if not _is_missing(value):
+                record[column] = value.item() if hasattr(value, "item") else value
+    for record in records:
+        record["question_number"] = int(record["question_number"])
+
+    errors.sort(key=lambda error: error["fila"])
+    return records, errors
+
+
+def parse_upload(uploaded_file, chunk_rows=CHUNK_ROWS):
+    """
+    Parse and validate an uploaded Excel or JSON file.
+
+    Args:
+        uploaded_file: The uploaded file (.xlsx or .json)
+        chunk_rows (int): Rows per chunk
+
+    Returns:
+        Dict: records (valid questions), errors (one entry per invalid cell) and
+            stats (rows, seconds, rows_per_second)
+    """
+    start = time.perf_counter()
+    if uploaded_file.name.endswith(".xlsx"):
+        chunks = iter_excel_chunks(io.BytesIO(uploaded_file.getvalue()), chunk_rows)
+    else:
+        chunks = iter_json_chunks(io.BytesIO(uploaded_file.getvalue()), chunk_rows)
+
+    records = []
+    errors = []
+    rows = 0
+    seen_numbers = set()
+    for first_row, chunk in chunks:
+        chunk_records, chunk_errors = validate_chunk(chunk, first_row, seen_numbers)
+        records.extend(chunk_records)
+        errors.extend(chunk_errors)
+        rows += len(chunk)
+
+    seconds = time.perf_counter() - start
+    stats = {
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds else 0.0,
+    }
+    logger.info(
+        f"Parsed {uploaded_file.name}: {rows} rows, {len(records)} valid, "
+        f"{len(errors)} errors in {seconds:.2f}s"
+    )
+    return {"records": records, "errors": errors, "stats": stats}
+
+
+def commit(especialidad, records, batch_size=COMMIT_BATCH):
+    """
+    Add the imported questions to a bank, in journal batches.
+
+    A question with an existing question_number replaces it. If the bank has no
+    base file yet, it is created with the questions instead.
+
+    Args:
+        especialidad (str): The specialization type
+        records (List[Dict]): Validated questions
+        batch_size (int): Questions per journal append
+
+    Returns:
+        Dict: questions, batches, seconds and rows_per_second of the commit
+    """
+    start = time.perf_counter()
+    batches = 0
+    if not os.path.exists(qb.bank_path(especialidad)):
+        qb.write_base(especialidad, list(records))
+        batches = 1
+    else:
+        for pos in range(0, len(records), batch_size):
+            qb.append_journal(
+                especialidad,
+                [{"op": "add", "question": question} for question in records[pos:pos + batch_size]]
+            )
+            batches += 1
+
+    seconds = time.perf_counter() - start
+    return {
+        "questions": len(records),
+        "batches": batches,
+        "seconds": seconds,
+        "rows_per_second": len(records) / seconds if seconds else 0.0,
+    }
+
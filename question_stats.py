@@ -0,0 +1,143 @@
+"""
+Difficulty of every question across all users, computed offline.
+
+sp_RefreshQuestionStats aggregates Fact_Answers in one set-based pass: attempts,
+correct answers, correct rate and distinct users per specialty and question,
+plus the mean time to answer in practice (seconds since the previous practice
+answer of the same user, with LAG, gaps over MAX_ANSWER_SECONDS being breaks).
+It replaces the contents of Fact_Question_Stats, every row stamped with the
+time of the snapshot. Answers written before Fact_Answers had an especialidad
+column are left out, their question numbers are ambiguous across banks.
+
+refresh() runs it. Schedule it once a day with `python question_stats.py`
+(cron), or with a SQL Server Agent job calling the procedure. Pages read the
+snapshot through get_stats(), cached in process for STATS_TTL seconds, so the
+admin panel and the practice filter never aggregate Fact_Answers on a render.
+"""
+import sys
+import time
+import logging
+import threading
+import numpy as np
+import db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAX_ANSWER_SECONDS = 600
+STATS_TTL = 3600
+# A question is hard below this correct rate, once it has enough attempts
+HARD_CORRECT_RATE = 0.5
+MIN_ATTEMPTS = 5
+
+COLUMNS = ["question_id", "attempts", "correct", "users", "correct_rate", "mean_seconds", "snapshot_at"]
+
+# especialidad -> (time.monotonic() of the load, stats frame)
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def refresh(conn):
+    """
+    Recompute the statistics of every question from Fact_Answers.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        Dict: snapshot_at and questions (number of questions with statistics)
+    """
+    start = time.perf_counter()
+    # The procedure commits its own transaction, run it in one so the commit reaches the server
+    with db.transaction(conn) as connection:
+        result = db.execute_query(
+            conn,
+            "EXEC sp_RefreshQuestionStats @max_answer_seconds=:max_answer_seconds",
+            {"max_answer_seconds": MAX_ANSWER_SECONDS},
+            fetch_all=False,
+            as_dict=True,
+            connection=connection
+        )
+    invalidate()
+    logger.info(
+        f"Question statistics refreshed: {result['questions']} questions "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+    return result
+
+
+def get_stats(conn, especialidad):
+    """
+    Get the statistics of the questions of a specialty from the last snapshot.
+
+    Args:
+        conn: Database connection
+        especialidad (str): The specialization type
+
+    Returns:
+        pd.DataFrame: COLUMNS, one row per question answered at least once,
+            hardest first
+    """
+    cached = _stats.get(especialidad)
+    if cached is not None and time.monotonic() - cached[0] <= STATS_TTL:
+        return cached[1]
+
+    stats = db.query_frame(
+        conn,
+        """
+        SELECT question_id, attempts, correct, users, correct_rate, mean_seconds, snapshot_at
+        FROM [esnowflake].[dbo].Fact_Question_Stats
+        WHERE especialidad = :especialidad
+        ORDER BY correct_rate, attempts DESC
+        """,
+        {"especialidad": especialidad},
+        columns=COLUMNS,
+        fallback=True
+    )
+    with _stats_lock:
+        _stats[especialidad] = (time.monotonic(), stats)
+    return stats
+
+
+def hard_numbers(conn, especialidad):
+    """
+    Get the questions most users fail.
+
+    Args:
+        conn: Database connection
+        especialidad (str): The specialization type
+
+    Returns:
+        np.ndarray: Numbers of the questions with at least MIN_ATTEMPTS attempts
+            and a correct rate below HARD_CORRECT_RATE
+    """
+    stats = get_stats(conn, especialidad)
+    hard = (stats["attempts"] >= MIN_ATTEMPTS) & (stats["correct_rate"] < HARD_CORRECT_RATE)
+    return stats.loc[hard, "question_id"].to_numpy(dtype=np.int64)
+
+
+def invalidate(especialidad=None):
+    """
+    Drop cached statistics, so they are read again on next use.
+
+    Args:
+        especialidad (str, optional): Only drop the statistics of this specialty
+    """
+    with _stats_lock:
+        if especialidad is None:
+            _stats.clear()
+        else:
+            _stats.pop(especialidad, None)
+
+
+if __name__ == "__main__":
+    # Batch entry point: python question_stats.py
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    import helper as h
+
+    try:
+        resultado = refresh(h.init_connection("snowflake_pro"))
+    except Exception as e:
+        logger.error(f"Error refreshing question statistics: {str(e)}", exc_info=True)
+        sys.exit(1)
+    print(f"Snapshot {resultado['snapshot_at']}: {resultado['questions']} questions")
@@ -0,0 +1,189 @@
+"""
+Per-user progress by section of every specialty.
+
+The progress page shows, for every section of a bank, how many answers of the
+user were correct and incorrect. Fact_User_Section_Progress keeps those counts
+and the time of the last answer per user, specialty and section, so the page
+reads a handful of rows instead of the whole answer history. The code that
+writes answers adds them to the table with record(), in the same transaction
+as the insert into Fact_Answers.
+
+Sections come from the question bank, not from the database: the counts of an
+answer go to every question_area of its question, added up by progress_engine.
+rebuild() recomputes the table of a specialty from Fact_Answers; run it once
+after creating the table, and again whenever the counts need repairing.
+"""
+import json
+import logging
+import numpy as np
+import pandas as pd
+import db
+import question_bank as qb
+import progress_engine
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["question_area", "correct_count", "incorrect_count", "last_answered"]
+
+INSERT_PROGRESS = """
+    INSERT INTO [esnowflake].[dbo].Fact_User_Section_Progress
+    (user_nickname, especialidad, question_area, correct_count, incorrect_count, last_answered)
+    VALUES (:user, :especialidad, :area, :correct, :incorrect, :last_answered)
+"""
+
+
+def _section_rows(engine, users, correct, incorrect, last):
+    """One dict per user and section with answers, from the grouped counts of the engine."""
+    rows = []
+    for i, j in zip(*np.nonzero((correct + incorrect) > 0)):
+        rows.append({
+            "user": users[i],
+            "area": engine.sections[j],
+            "correct": int(correct[i, j]),
+            "incorrect": int(incorrect[i, j]),
+            "last_answered": pd.Timestamp(last[i, j]).to_pydatetime() if not np.isnat(last[i, j]) else None,
+        })
+    return rows
+
+
+def section_deltas(bank, answers):
+    """
+    Add up answers per user and section.
+
+    Args:
+        bank (qb.QuestionBank): Bank of the answers
+        answers (List[Dict]): Answers with user, question_id, is_correct and
+            optionally answered_at
+
+    Returns:
+        List[Dict]: One entry per user and section with user, area, correct,
+            incorrect and last_answered
+    """
+    if not answers:
+        return []
+    now = db.utc_now()
+    is_correct = np.array([1 if answer["is_correct"] else 0 for answer in answers])
+    engine = progress_engine.for_bank(bank)
+    users, correct, incorrect, last = engine.grouped_counts(
+        np.array([answer["user"] for answer in answers], dtype=object),
+        [int(answer["question_id"]) for answer in answers],
+        is_correct,
+        1 - is_correct,
+        np.array([answer.get("answered_at") or now for answer in answers], dtype="datetime64[ns]"),
+    )
+    return _section_rows(engine, users, correct, incorrect, last)
+
+
+def record(conn, especialidad, answers, connection=None):
+    """
+    Add answers written to Fact_Answers to the progress of their users.
+
+    Args:
+        conn: Database connection
+        especialidad (str): The specialization type of the answers
+        answers (List[Dict]): Answers with user, question_id, is_correct and
+            optionally answered_at
+        connection (Connection, optional): Connection of the transaction that
+            inserts the answers
+
+    Returns:
+        int: Number of (user, section) rows updated
+    """
+    deltas = section_deltas(qb.get_bank(especialidad), answers)
+    if not deltas:
+        return 0
+
+    payload = json.dumps([
+        dict(delta, last_answered=delta["last_answered"].isoformat(timespec="milliseconds"))
+        for delta in deltas
+    ])
+    db.execute_non_query(
+        conn,
+        "EXEC sp_AddSectionProgress @especialidad=:especialidad, @deltas=:deltas",
+        {"especialidad": especialidad, "deltas": payload},
+        connection=connection
+    )
+    return len(deltas)
+
+
+def get_progress(conn, user, especialidad):
+    """
+    Get the progress of a user by section.
+
+    Args:
+        conn: Database connection
+        user (str): Username
+        especialidad (str): The specialization type
+
+    Returns:
+        pd.DataFrame: question_area, correct_count, incorrect_count and last_answered
+            of the sections the user has answered
+    """
+    return db.query_frame(
+        conn,
+        """
+        SELECT question_area, correct_count, incorrect_count, last_answered
+        FROM [esnowflake].[dbo].Fact_User_Section_Progress
+        WHERE user_nickname = :user AND especialidad = :especialidad
+        """,
+        {"user": user, "especialidad": especialidad},
+        columns=COLUMNS,
+        fallback=True
+    )
+
+
+def rebuild(conn, especialidad):
+    """
+    Recompute the progress of every user in a specialty from Fact_Answers.
+
+    Answers written before Fact_Answers had an especialidad column count for
+    every specialty whose bank has their question, as the progress page did
+    before this table existed.
+
+    Args:
+        conn: Database connection
+        especialidad (str): The specialization type
+
+    Returns:
+        int: Number of (user, section) rows written
+    """
+    answers = db.query_frame(
+        conn,
+        """
+        SELECT
+            user_nickname, question_id,
+            SUM(CAST(is_correct AS INT)) AS correct,
+            COUNT(*) - SUM(CAST(is_correct AS INT)) AS incorrect,
+            MAX(ANSWER_TIMESTAMP) AS last_answered
+        FROM [esnowflake].[dbo].FACT_ANSWERS
+        WHERE especialidad = :especialidad OR especialidad IS NULL
+        GROUP BY user_nickname, question_id
+        """,
+        {"especialidad": especialidad},
+        columns=["user", "question_id", "correct", "incorrect", "last_answered"]
+    )
+
+    engine = progress_engine.for_bank(qb.get_bank(especialidad))
+    users, correct, incorrect, last = engine.grouped_counts(
+        answers["user"].to_numpy(dtype=object),
+        answers["question_id"].to_numpy(dtype=np.int64),
+        answers["correct"].to_numpy(),
+        answers["incorrect"].to_numpy(),
+        pd.to_datetime(answers["last_answered"]).to_numpy(dtype="datetime64[ns]"),
+    )
+    rows = [
+        dict(row, especialidad=especialidad)
+        for row in _section_rows(engine, users, correct, incorrect, last)
+    ]
+
+    with db.transaction(conn) as connection:
+        db.execute_non_query(
+            conn,
+            "DELETE FROM [esnowflake].[dbo].Fact_User_Section_Progress WHERE especialidad = :especialidad",
+            {"especialidad": especialidad},
+            connection=connection
+        )
+        db.execute_many(conn, INSERT_PROGRESS, rows, connection=connection)
+    logger.info(f"Section progress of {especialidad} rebuilt: {len(rows)} rows")
+    return len(rows)
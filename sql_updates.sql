@@ -281,4 +281,492 @@ BEGIN
             
         THROW;
     END CATCH
-END
\ No newline at end of file
+END
+
+GO
+
+-- Cover the per-question history of a user with IX_FACT_ANSWERS_USER (same keys)
+IF EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_FACT_ANSWERS_USER_HISTORY' AND object_id = OBJECT_ID('[esnowflake].[dbo].FACT_ANSWERS'))
+BEGIN
+    DROP INDEX IX_FACT_ANSWERS_USER_HISTORY ON [esnowflake].[dbo].FACT_ANSWERS
+END
+
+IF NOT EXISTS (
+    SELECT 1
+    FROM sys.indexes i
+    JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+    WHERE i.name = 'IX_FACT_ANSWERS_USER'
+      AND i.object_id = OBJECT_ID('[esnowflake].[dbo].FACT_ANSWERS')
+      AND ic.is_included_column = 1
+)
+BEGIN
+    CREATE INDEX IX_FACT_ANSWERS_USER ON [esnowflake].[dbo].FACT_ANSWERS (user_nickname, question_id)
+        INCLUDE (type, is_correct, is_answered)
+        WITH (DROP_EXISTING = ON)
+END
+
+-- Question history as one row per question instead of string-encoded lists
+IF OBJECT_ID('[esnowflake].[dbo].GetQuestionHistorySet', 'P') IS NOT NULL
+BEGIN
+    DROP PROCEDURE [esnowflake].[dbo].GetQuestionHistorySet
+END
+
+GO
+
+CREATE PROCEDURE [esnowflake].[dbo].GetQuestionHistorySet
+    @user NVARCHAR(255)
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    -- One row per answered question, with a flag per category
+    SELECT
+        question_id,
+        1 AS answered,
+        MAX(CASE WHEN type = 'examen' AND is_correct = 0 THEN 1 ELSE 0 END) AS failed_exam,
+        MAX(CASE WHEN type = 'practicar' AND is_correct = 0 THEN 1 ELSE 0 END) AS failed_practice
+    FROM [esnowflake].[dbo].FACT_ANSWERS
+    WHERE user_nickname = @user
+      AND is_answered = 1
+    GROUP BY question_id;
+END
+
+GO
+
+-- Level table: total XP needed to reach each level, and its rango
+IF OBJECT_ID('[esnowflake].[dbo].Dim_Levels', 'U') IS NULL
+BEGIN
+    CREATE TABLE [esnowflake].[dbo].Dim_Levels
+    (
+        level INT PRIMARY KEY,
+        min_total_xp INT NOT NULL,
+        rango NVARCHAR(50) NOT NULL
+    )
+    CREATE UNIQUE INDEX IX_Levels_Min_Total_XP ON [esnowflake].[dbo].Dim_Levels(min_total_xp) INCLUDE (rango)
+    
+    -- 100, 200, 400, 800 and 1600 XP to go from each level to the next one
+    INSERT INTO [esnowflake].[dbo].Dim_Levels (level, min_total_xp, rango)
+    VALUES
+        (1, 0, 'Iniciado'),
+        (2, 100, 'Padawan'),
+        (3, 300, 'Maestro'),
+        (4, 700, 'Maestro'),
+        (5, 1500, 'Parra'),
+        (6, 3100, 'Parra')
+END
+
+IF OBJECT_ID('[dbo].Dim_Levels', 'U') IS NULL
+BEGIN
+    CREATE TABLE [dbo].Dim_Levels
+    (
+        level INT PRIMARY KEY,
+        min_total_xp INT NOT NULL,
+        rango NVARCHAR(50) NOT NULL
+    )
+    CREATE UNIQUE INDEX IX_Levels_Min_Total_XP ON [dbo].Dim_Levels(min_total_xp) INCLUDE (rango)
+    
+    INSERT INTO [dbo].Dim_Levels (level, min_total_xp, rango)
+    VALUES
+        (1, 0, 'Iniciado'),
+        (2, 100, 'Padawan'),
+        (3, 300, 'Maestro'),
+        (4, 700, 'Maestro'),
+        (5, 1500, 'Parra'),
+        (6, 3100, 'Parra')
+END
+
+GO
+
+-- Award XP to one or many users in one call
+CREATE OR ALTER PROCEDURE [esnowflake].[dbo].sp_AwardXP
+    @awards NVARCHAR(MAX)  -- JSON array of {"user": ..., "xp": ..., "reason": ...}
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+    
+    DECLARE @rows TABLE (user_nickname NVARCHAR(255) NOT NULL, xp_amount INT NOT NULL, reason NVARCHAR(255) NOT NULL);
+    DECLARE @result TABLE (username NVARCHAR(255), xp INT, level INT, rango NVARCHAR(50), previous_level INT, xp_gained INT);
+    
+    INSERT INTO @rows (user_nickname, xp_amount, reason)
+    SELECT [user], xp, reason
+    FROM OPENJSON(@awards)
+    WITH ([user] NVARCHAR(255) '$.user', xp INT '$.xp', reason NVARCHAR(255) '$.reason');
+    
+    BEGIN TRY
+        BEGIN TRANSACTION;
+        
+        -- The stored xp is what the user has within the current level: add the
+        -- award to the total and derive level, rango and remainder from Dim_Levels,
+        -- reading and writing the row in the same statement
+        UPDATE u
+        SET xp = total.total_xp - lvl.min_total_xp,
+            level = lvl.level,
+            rango = lvl.rango,
+            last_active = CURRENT_TIMESTAMP
+        OUTPUT inserted.name, inserted.xp, inserted.level, inserted.rango, deleted.level, gained.xp_amount
+        INTO @result (username, xp, level, rango, previous_level, xp_gained)
+        FROM [esnowflake].[dbo].Dim_Users u
+        JOIN (
+            SELECT user_nickname, SUM(xp_amount) AS xp_amount
+            FROM @rows
+            GROUP BY user_nickname
+        ) gained ON gained.user_nickname = u.name
+        JOIN [esnowflake].[dbo].Dim_Levels cur ON cur.level = COALESCE(u.level, 1)
+        CROSS APPLY (SELECT cur.min_total_xp + COALESCE(u.xp, 0) + gained.xp_amount AS total_xp) total
+        CROSS APPLY (
+            SELECT TOP 1 level, min_total_xp, rango
+            FROM [esnowflake].[dbo].Dim_Levels
+            WHERE min_total_xp <= total.total_xp
+            ORDER BY min_total_xp DESC
+        ) lvl;
+        
+        -- Record every XP gain of the users updated
+        INSERT INTO [esnowflake].[dbo].Fact_XP_History (user_nickname, xp_amount, reason, timestamp)
+        SELECT r.user_nickname, r.xp_amount, r.reason, CURRENT_TIMESTAMP
+        FROM @rows r
+        WHERE EXISTS (SELECT 1 FROM @result res WHERE res.username = r.user_nickname);
+        
+        COMMIT TRANSACTION;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+            
+        THROW;
+    END CATCH
+    
+    SELECT username, xp, level, rango,
+           CASE WHEN level > previous_level THEN 1 ELSE 0 END AS level_up,
+           xp_gained
+    FROM @result;
+END
+
+GO
+
+CREATE OR ALTER PROCEDURE [dbo].sp_AwardSQLXP
+    @awards NVARCHAR(MAX)  -- JSON array of {"user": ..., "xp": ..., "reason": ...}
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+    
+    DECLARE @rows TABLE (username NVARCHAR(255) NOT NULL, xp_amount INT NOT NULL, reason NVARCHAR(255) NOT NULL);
+    DECLARE @result TABLE (username NVARCHAR(255), xp INT, level INT, rango NVARCHAR(50), previous_level INT, xp_gained INT);
+    
+    INSERT INTO @rows (username, xp_amount, reason)
+    SELECT [user], xp, reason
+    FROM OPENJSON(@awards)
+    WITH ([user] NVARCHAR(255) '$.user', xp INT '$.xp', reason NVARCHAR(255) '$.reason');
+    
+    BEGIN TRY
+        BEGIN TRANSACTION;
+        
+        -- The SQL users have no rango column: it is only returned
+        UPDATE u
+        SET xp = total.total_xp - lvl.min_total_xp,
+            level = lvl.level,
+            last_active = CURRENT_TIMESTAMP
+        OUTPUT inserted.username, inserted.xp, inserted.level, lvl.rango, deleted.level, gained.xp_amount
+        INTO @result (username, xp, level, rango, previous_level, xp_gained)
+        FROM [dbo].Dim_Users u
+        JOIN (
+            SELECT username, SUM(xp_amount) AS xp_amount
+            FROM @rows
+            GROUP BY username
+        ) gained ON gained.username = u.username
+        JOIN [dbo].Dim_Levels cur ON cur.level = COALESCE(u.level, 1)
+        CROSS APPLY (SELECT cur.min_total_xp + COALESCE(u.xp, 0) + gained.xp_amount AS total_xp) total
+        CROSS APPLY (
+            SELECT TOP 1 level, min_total_xp, rango
+            FROM [dbo].Dim_Levels
+            WHERE min_total_xp <= total.total_xp
+            ORDER BY min_total_xp DESC
+        ) lvl;
+        
+        INSERT INTO [dbo].Fact_XP_History (username, xp_amount, reason, timestamp)
+        SELECT r.username, r.xp_amount, r.reason, CURRENT_TIMESTAMP
+        FROM @rows r
+        WHERE EXISTS (SELECT 1 FROM @result res WHERE res.username = r.username);
+        
+        COMMIT TRANSACTION;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+            
+        THROW;
+    END CATCH
+    
+    SELECT username, xp, level, rango,
+           CASE WHEN level > previous_level THEN 1 ELSE 0 END AS level_up,
+           xp_gained
+    FROM @result;
+END
+
+GO
+
+-- Specialty of every answer, NULL for the answers written before it was recorded
+IF NOT EXISTS (SELECT 1 FROM sys.columns WHERE object_id = OBJECT_ID('[esnowflake].[dbo].FACT_ANSWERS') AND name = 'especialidad')
+BEGIN
+    ALTER TABLE [esnowflake].[dbo].FACT_ANSWERS
+    ADD especialidad NVARCHAR(50) NULL
+END
+
+-- Answers of every user by specialty and section, kept up to date as answers are written
+IF OBJECT_ID('[esnowflake].[dbo].Fact_User_Section_Progress', 'U') IS NULL
+BEGIN
+    CREATE TABLE [esnowflake].[dbo].Fact_User_Section_Progress
+    (
+        user_nickname NVARCHAR(255) NOT NULL,
+        especialidad NVARCHAR(50) NOT NULL,
+        question_area NVARCHAR(255) NOT NULL,
+        correct_count INT NOT NULL DEFAULT 0,
+        incorrect_count INT NOT NULL DEFAULT 0,
+        last_answered DATETIME NULL,
+        CONSTRAINT PK_User_Section_Progress PRIMARY KEY (user_nickname, especialidad, question_area)
+    )
+END
+
+GO
+
+-- Add the answers of a batch to the section progress
+CREATE OR ALTER PROCEDURE [esnowflake].[dbo].sp_AddSectionProgress
+    @especialidad NVARCHAR(50),
+    @deltas NVARCHAR(MAX)  -- JSON array of {"user", "area", "correct", "incorrect", "last_answered"}, one per user and area
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    MERGE [esnowflake].[dbo].Fact_User_Section_Progress WITH (HOLDLOCK) AS target
+    USING (
+        SELECT [user], area, correct, incorrect, last_answered
+        FROM OPENJSON(@deltas)
+        WITH (
+            [user] NVARCHAR(255) '$.user',
+            area NVARCHAR(255) '$.area',
+            correct INT '$.correct',
+            incorrect INT '$.incorrect',
+            last_answered DATETIME2 '$.last_answered'
+        )
+    ) AS source
+    ON target.user_nickname = source.[user]
+       AND target.especialidad = @especialidad
+       AND target.question_area = source.area
+    WHEN MATCHED THEN
+        UPDATE SET
+            correct_count = target.correct_count + source.correct,
+            incorrect_count = target.incorrect_count + source.incorrect,
+            last_answered = CASE
+                WHEN target.last_answered IS NULL OR source.last_answered > target.last_answered
+                THEN source.last_answered
+                ELSE target.last_answered
+            END
+    WHEN NOT MATCHED THEN
+        INSERT (user_nickname, especialidad, question_area, correct_count, incorrect_count, last_answered)
+        VALUES (source.[user], @especialidad, source.area, source.correct, source.incorrect, source.last_answered);
+END
+
+GO
+
+-- Answers of every user per day, kept up to date as answers are written
+IF OBJECT_ID('[esnowflake].[dbo].Fact_User_Daily_Activity', 'U') IS NULL
+BEGIN
+    CREATE TABLE [esnowflake].[dbo].Fact_User_Daily_Activity
+    (
+        user_nickname NVARCHAR(255) NOT NULL,
+        activity_date DATE NOT NULL,
+        answers INT NOT NULL DEFAULT 0,
+        correct INT NOT NULL DEFAULT 0,
+        CONSTRAINT PK_User_Daily_Activity PRIMARY KEY (user_nickname, activity_date)
+    )
+END
+
+GO
+
+-- Add the answers of a batch to the daily activity
+CREATE OR ALTER PROCEDURE [esnowflake].[dbo].sp_AddDailyActivity
+    @deltas NVARCHAR(MAX)  -- JSON array of {"user", "day", "answers", "correct"}, one per user and day
+AS
+BEGIN
+    SET NOCOUNT ON;
+    
+    MERGE [esnowflake].[dbo].Fact_User_Daily_Activity WITH (HOLDLOCK) AS target
+    USING (
+        SELECT [user], [day], answers, correct
+        FROM OPENJSON(@deltas)
+        WITH (
+            [user] NVARCHAR(255) '$.user',
+            [day] DATE '$.day',
+            answers INT '$.answers',
+            correct INT '$.correct'
+        )
+    ) AS source
+    ON target.user_nickname = source.[user]
+       AND target.activity_date = source.[day]
+    WHEN MATCHED THEN
+        UPDATE SET
+            answers = target.answers + source.answers,
+            correct = target.correct + source.correct
+    WHEN NOT MATCHED THEN
+        INSERT (user_nickname, activity_date, answers, correct)
+        VALUES (source.[user], source.[day], source.answers, source.correct);
+END
+
+GO
+
+-- Last day the study streak was credited, apart from last_active (set by every XP award)
+IF NOT EXISTS (SELECT 1 FROM sys.columns WHERE object_id = OBJECT_ID('[esnowflake].[dbo].Dim_Users') AND name = 'streak_date')
+BEGIN
+    ALTER TABLE [esnowflake].[dbo].Dim_Users
+    ADD streak_date DATE NULL
+END
+
+IF NOT EXISTS (SELECT 1 FROM sys.columns WHERE object_id = OBJECT_ID('[dbo].Dim_Users') AND name = 'streak_date')
+BEGIN
+    ALTER TABLE [dbo].Dim_Users
+    ADD streak_date DATE NULL
+END
+
+GO
+
+-- Users created before the gamification columns have NULL level and xp: give them
+-- the defaults and make the columns NOT NULL, so the leaderboard can compare and
+-- sort the bare columns through IX_Users_Level_XP
+IF EXISTS (SELECT 1 FROM sys.columns WHERE object_id = OBJECT_ID('[esnowflake].[dbo].Dim_Users') AND name IN ('level', 'xp') AND is_nullable = 1)
+BEGIN
+    IF EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Users_Level_XP' AND object_id = OBJECT_ID('[esnowflake].[dbo].Dim_Users'))
+        DROP INDEX IX_Users_Level_XP ON [esnowflake].[dbo].Dim_Users
+    UPDATE [esnowflake].[dbo].Dim_Users SET level = 1 WHERE level IS NULL
+    UPDATE [esnowflake].[dbo].Dim_Users SET xp = 0 WHERE xp IS NULL
+    ALTER TABLE [esnowflake].[dbo].Dim_Users ALTER COLUMN level INT NOT NULL
+    ALTER TABLE [esnowflake].[dbo].Dim_Users ALTER COLUMN xp INT NOT NULL
+END
+
+IF EXISTS (SELECT 1 FROM sys.columns WHERE object_id = OBJECT_ID('[dbo].Dim_Users') AND name IN ('level', 'xp') AND is_nullable = 1)
+BEGIN
+    IF EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Users_Level_XP' AND object_id = OBJECT_ID('[dbo].Dim_Users'))
+        DROP INDEX IX_Users_Level_XP ON [dbo].Dim_Users
+    UPDATE [dbo].Dim_Users SET level = 1 WHERE level IS NULL
+    UPDATE [dbo].Dim_Users SET xp = 0 WHERE xp IS NULL
+    ALTER TABLE [dbo].Dim_Users ALTER COLUMN level INT NOT NULL
+    ALTER TABLE [dbo].Dim_Users ALTER COLUMN xp INT NOT NULL
+END
+
+GO
+
+-- Leaderboard order, used for the top users and for the rank of a user
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Users_Level_XP' AND object_id = OBJECT_ID('[esnowflake].[dbo].Dim_Users'))
+BEGIN
+    CREATE INDEX IX_Users_Level_XP ON [esnowflake].[dbo].Dim_Users (level DESC, xp DESC)
+        INCLUDE (rango, streak_days)
+END
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Users_Level_XP' AND object_id = OBJECT_ID('[dbo].Dim_Users'))
+BEGIN
+    CREATE INDEX IX_Users_Level_XP ON [dbo].Dim_Users (level DESC, xp DESC)
+        INCLUDE (streak_days)
+END
+
+GO
+
+-- Exam history of a user, newest first, read one page at a time
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Exams_User_Start' AND object_id = OBJECT_ID('[esnowflake].[dbo].FACT_EXAMS'))
+BEGIN
+    CREATE INDEX IX_Exams_User_Start ON [esnowflake].[dbo].FACT_EXAMS (user_nickname, start_time DESC, id_exam DESC)
+        INCLUDE (duration_minutes, number_of_questions, number_of_correct_questions, number_of_failed_questions)
+END
+
+-- Answers of an exam, read when its detail is opened
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Answers_Exam' AND object_id = OBJECT_ID('[esnowflake].[dbo].FACT_ANSWERS'))
+BEGIN
+    CREATE INDEX IX_Answers_Exam ON [esnowflake].[dbo].FACT_ANSWERS (exam_id)
+        INCLUDE (question_id, is_correct, is_answered, ANSWER_TIMESTAMP)
+        WHERE exam_id IS NOT NULL
+END
+
+GO
+
+-- Difficulty of every question across all users, refreshed by a batch job
+IF OBJECT_ID('[esnowflake].[dbo].Fact_Question_Stats', 'U') IS NULL
+BEGIN
+    CREATE TABLE [esnowflake].[dbo].Fact_Question_Stats
+    (
+        especialidad NVARCHAR(50) NOT NULL,
+        question_id INT NOT NULL,
+        attempts INT NOT NULL,
+        correct INT NOT NULL,
+        users INT NOT NULL,
+        correct_rate FLOAT NOT NULL,
+        mean_seconds FLOAT NULL,
+        snapshot_at DATETIME2 NOT NULL,
+        CONSTRAINT PK_Question_Stats PRIMARY KEY (especialidad, question_id)
+    )
+END
+
+GO
+
+-- Recompute Fact_Question_Stats from Fact_Answers in one pass
+CREATE OR ALTER PROCEDURE [esnowflake].[dbo].sp_RefreshQuestionStats
+    @max_answer_seconds INT = 600  -- longer gaps between practice answers are breaks, not answer time
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+    
+    DECLARE @snapshot_at DATETIME2 = SYSDATETIME();
+    DECLARE @questions INT;
+    
+    BEGIN TRY
+        BEGIN TRANSACTION;
+        
+        DELETE FROM [esnowflake].[dbo].Fact_Question_Stats;
+        
+        -- Time to answer a practice question: seconds since the previous
+        -- practice answer of the same user (exam answers are all saved at once)
+        WITH timed AS (
+            SELECT
+                especialidad,
+                question_id,
+                user_nickname,
+                is_correct,
+                is_answered,
+                CASE WHEN type = 'practicar' THEN
+                    DATEDIFF(SECOND,
+                        LAG(ANSWER_TIMESTAMP) OVER (
+                            PARTITION BY user_nickname, especialidad, type
+                            ORDER BY ANSWER_TIMESTAMP
+                        ),
+                        ANSWER_TIMESTAMP)
+                END AS seconds
+            FROM [esnowflake].[dbo].FACT_ANSWERS
+            WHERE especialidad IS NOT NULL
+        )
+        INSERT INTO [esnowflake].[dbo].Fact_Question_Stats
+        (especialidad, question_id, attempts, correct, users, correct_rate, mean_seconds, snapshot_at)
+        SELECT
+            especialidad,
+            question_id,
+            COUNT(*),
+            SUM(CAST(is_correct AS INT)),
+            COUNT(DISTINCT user_nickname),
+            CAST(SUM(CAST(is_correct AS INT)) AS FLOAT) / COUNT(*),
+            AVG(CASE WHEN seconds BETWEEN 1 AND @max_answer_seconds THEN CAST(seconds AS FLOAT) END),
+            @snapshot_at
+        FROM timed
+        WHERE COALESCE(is_answered, 1) = 1
+        GROUP BY especialidad, question_id;
+        
+        SET @questions = @@ROWCOUNT;
+        
+        COMMIT TRANSACTION;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK TRANSACTION;
+            
+        THROW;
+    END CATCH
+    
+    SELECT @snapshot_at AS snapshot_at, @questions AS questions;
+END
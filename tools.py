@@ -3,17 +3,27 @@ import time
 import logging
 import streamlit as st
 import helper as h
+import db
+import answer_history
+import section_progress
+import daily_activity
+import circuit_breaker
+import figure_cache
+import exam_history
+import question_stats
+import progress_engine
 import constantes as c
-import ast
 import random
 import plotly.graph_objects as go
 from agent import chat
 import plotly.express as px
 import pandas as pd
+import numpy as np
 import os
 import json_and_excels_admin as jtc
 from openai import OpenAI
 import gamification as gamify
+import question_bank as qb
 from typing import Dict, List, Any, Optional, Union
 
 # Configure logging
@@ -24,32 +34,25 @@ RUTA = os.path.join(os.path.dirname(__file__), "jsons")
 
 def get_datos(especialidad):
     """
-    Get data from a JSON file based on the specialization.
+    Get the question bank of a specialization from the shared cache.
+    
+    The bank is an immutable snapshot: fetch it once per rerun and pass it down,
+    so every page of the rerun works on the same version even if an admin
+    publishes a new one meanwhile.
     
     Args:
         especialidad (str): The specialization type
         
     Returns:
-        List[Dict]: The data loaded from the JSON file
+        qb.QuestionBank: The questions of the specialization (shared, do not modify)
     """
     try:
-        if especialidad == "snowflake_pro":
-            archivo = os.path.join(RUTA, "snowflake_pro_examtopics.json")
-        elif especialidad == "snowflake_arch":
-            archivo = os.path.join(RUTA, "snowflake_arch_examtopics.json")
-        elif especialidad == "dbt":
-            archivo = os.path.join(RUTA, "dbt_examtopics.json")
-        elif especialidad == "google":
-            archivo = os.path.join(RUTA, "google_examtopics.json")
-        else:
-            raise ValueError(f"Unsupported specialization: {especialidad}")
-            
-        datos = h.open_file(archivo)
+        datos = qb.get_bank(especialidad)
         return datos
     except Exception as e:
         logger.error(f"Error getting data for {especialidad}: {str(e)}", exc_info=True)
         st.warning(f"Ha habido un error, no encuentro los json: {str(e)}")
-        return []
+        return qb.QuestionBank.from_records(especialidad, [])
 
 def init_users(conn, es_sql=False):
     """
@@ -90,12 +93,12 @@ def menu(conn, especialidad):
                     )
                 else:
                     if not es_sql:
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "SELECT rango FROM [esnowflake].[dbo].Dim_Users WHERE name = ?",
-                            (st.session_state['user'],)
+                        rango_v = db.execute_query(
+                            conn,
+                            "SELECT rango FROM [esnowflake].[dbo].Dim_Users WHERE name = :user",
+                            {"user": st.session_state['user']},
+                            fallback=True
                         )
-                        rango_v = cursor.fetchall()
                         if rango_v:
                             rango = rango_v[0][0]
                             emoji_map = {
@@ -224,7 +227,7 @@ def practicar(conn, datos, especialidad):
     
     Args:
         conn: Database connection
-        datos (List[Dict]): The questions and answers
+        datos (qb.QuestionBank): The question bank pinned for this rerun
         especialidad (str): The specialization type
     """
     try:
@@ -244,20 +247,27 @@ def practicar(conn, datos, especialidad):
         # Excel download option
         if user is not None:
             with st.expander("¿Quieres descargar un excel de las preguntas?"):
-                # Generate Excel file and register download
-                csv_buffer, nombre_fichero, numero_aleatorio = jtc.download_excel(especialidad)
-                
                 # Warning message
                 st.warning("Se quedará registrado cuándo se generó este excel. Recuerda que no se puede compartir la información, puesto que es propiedad de Cívica.")
                 
-                # Download button
-                st.download_button(
-                    label="Download excel",
-                    data=csv_buffer,
-                    file_name=nombre_fichero,
-                    on_click=lambda: jtc.insert_download_db(user, numero_aleatorio, especialidad),
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+                # The stamped excel is generated on request and kept for the session
+                descargas = st.session_state.setdefault("excel_downloads", {})
+                if especialidad not in descargas and st.button("Generar excel", key=f"generar_excel_{especialidad}"):
+                    csv_buffer, nombre_fichero, numero_aleatorio = jtc.download_excel(especialidad)
+                    if csv_buffer.getbuffer().nbytes:
+                        descargas[especialidad] = (csv_buffer.getvalue(), nombre_fichero, numero_aleatorio)
+                
+                if especialidad in descargas:
+                    excel_bytes, nombre_fichero, numero_aleatorio = descargas[especialidad]
+                    
+                    # Download button
+                    st.download_button(
+                        label="Download excel",
+                        data=excel_bytes,
+                        file_name=nombre_fichero,
+                        on_click=lambda: jtc.insert_download_db(user, numero_aleatorio, especialidad),
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    )
 
         # Filters and questions columns
         filtros, preguntas = st.columns([1, 3], gap="large")
@@ -266,12 +276,14 @@ def practicar(conn, datos, especialidad):
         with filtros:
             st.subheader("Filtros")
             
-            # Question range slider
+            # Question range slider, over the question numbers (they can have gaps)
+            primera = int(datos.numbers.min()) if len(datos) else 0
+            ultima = int(datos.numbers.max()) if len(datos) else 0
             values = st.slider(
                 "Seleccione rango de preguntas en el que practicar",
-                0,
-                len(datos),
-                (0, len(datos)),
+                primera,
+                max(ultima, primera + 1),
+                (primera, max(ultima, primera + 1)),
                 step=1,
             )
 
@@ -284,68 +296,39 @@ def practicar(conn, datos, especialidad):
             # Other filters
             option = st.multiselect(
                 "Otros filtros",
-                ["Todas", "Sin hacer", "Falladas en exámenes", "Falladas en práctica"],
+                ["Todas", "Sin hacer", "Falladas en exámenes", "Falladas en práctica", "Más difíciles para todos"],
             )
 
-            # Apply range filter
-            preguntas_filtradas = [
-                item for item in datos if values[0] <= item["question_number"] <= values[1]
-            ]
-            
-            # Apply section filter
-            if "Todas" not in secciones and secciones:
-                preguntas_filtradas = [
-                    item
-                    for item in preguntas_filtradas
-                    if any(area in secciones for area in item["question_area"])
-                ]
+            # Apply range and section filters
+            bank = datos
+            seleccion = bank.filter(rango=values, secciones=secciones)
 
-            # Get question history
+            # Get question history (cached in process, no query on filter changes)
             if user:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "EXEC GetQuestionHistory @user=?",
-                    (user,)
-                )
-                aux_opcion = cursor.fetchall()
+                historial = answer_history.get_history(conn, user)
 
-                no_hechas = []
-                opcion_examen_falsas = []
-                opcion_practicas_falsas = []
+                opcion_final = np.zeros(len(bank), dtype=bool)
 
                 # Process filter options
-                if "Falladas en exámenes" in option and aux_opcion[0][1]:
-                    opcion_examen_falsas = list(ast.literal_eval(aux_opcion[0][1]))
+                if "Falladas en exámenes" in option:
+                    opcion_final |= bank.numbers_mask(historial.numbers("failed_exam"))
 
-                if "Falladas en práctica" in option and aux_opcion[0][2]:
-                    opcion_practicas_falsas = list(ast.literal_eval(aux_opcion[0][2]))
+                if "Falladas en práctica" in option:
+                    opcion_final |= bank.numbers_mask(historial.numbers("failed_practice"))
 
                 if "Sin hacer" in option:
-                    hechas = aux_opcion[0][0]
-                    if hechas:
-                        hechas_lista = ast.literal_eval(hechas)
-                        hechas_int = [int(num) for num in list(hechas_lista)]
-                        no_hechas = [
-                            item["question_number"]
-                            for item in preguntas_filtradas
-                            if item["question_number"] not in hechas_int
-                        ]
+                    opcion_final |= seleccion & ~bank.numbers_mask(historial.numbers("answered"))
 
-                # Combine filter options
-                opcion_final = list(
-                    set(no_hechas + opcion_examen_falsas + opcion_practicas_falsas)
-                )
+                # Questions most users fail, from the last statistics snapshot
+                if "Más difíciles para todos" in option:
+                    opcion_final |= bank.numbers_mask(question_stats.hard_numbers(conn, especialidad))
 
                 # Apply combined filter if not "All"
                 if "Todas" not in option and option:
-                    preguntas_filtradas = [
-                        item
-                        for item in preguntas_filtradas
-                        if item["question_number"] in opcion_final
-                    ]
+                    seleccion &= opcion_final
 
             # Get question numbers
-            question_set = [item["question_number"] for item in preguntas_filtradas]
+            question_set = bank.numbers[seleccion].tolist()
 
             # Initialize session state for question set
             if "question_set" not in st.session_state:
@@ -359,7 +342,7 @@ def practicar(conn, datos, especialidad):
             if st.session_state["question_set"]:
                 h.setexam(
                     st.session_state["question_set"],
-                    datos,
+                    datos.records,
                     "practicar",
                     conn,
                     user,
@@ -373,13 +356,36 @@ def practicar(conn, datos, especialidad):
         logger.error(f"Error in practice page: {str(e)}", exc_info=True)
         st.warning(f"Error: {str(e)}")
 
+def _result_figure(values):
+    """
+    Build the donut of the results of an exam.
+    
+    Args:
+        values (List[int]): Correct, failed and unanswered questions
+    
+    Returns:
+        go.Figure: The chart
+    """
+    fig = go.Figure(
+        data=[
+            go.Pie(
+                labels=["Acertadas", "Falladas", "No Respondidas"],
+                values=values,
+                hole=0.5,
+                marker_colors=["green", "red", "blue"]
+            )
+        ]
+    )
+    fig.update_layout(title_text="Resultados")
+    return fig
+
 def examen(conn, datos, especialidad):
     """
     Display the exam page for a specialization.
     
     Args:
         conn: Database connection
-        datos (List[Dict]): The questions and answers
+        datos (qb.QuestionBank): The question bank pinned for this rerun
         especialidad (str): The specialization type
     """
     try:
@@ -412,7 +418,7 @@ def examen(conn, datos, especialidad):
                     # Filters section
                     with filtros_col:
                         preguntas_filtradas = h.filtros(
-                            especialidad, datos, conn, user, True
+                            especialidad, datos.records, conn, user, True
                         )
                         
                     # Settings section
@@ -440,12 +446,17 @@ def examen(conn, datos, especialidad):
                         )
                     else:
                         with boton:
+                            # Exams are written to the database, not available in read-only mode
+                            sin_bd = circuit_breaker.is_open(conn)
                             st.button(
                                 "Comenzar examen",
                                 use_container_width=True,
                                 on_click=h.aux_exam,
                                 args=("empezar", exam_duration, None),
+                                disabled=sin_bd,
                             )
+                            if sin_bd:
+                                st.caption("La base de datos no está disponible ahora mismo, vuelve a intentarlo en unos minutos.")
         
         # Exam taking mode
         elif st.session_state.get("exam_mode", 0) == 1:
@@ -453,7 +464,7 @@ def examen(conn, datos, especialidad):
                 exam_duration = st.session_state["exam_duration"]
                 h.setexam(
                     st.session_state["question_set"],
-                    datos,
+                    datos.records,
                     "examen",
                     conn,
                     user,
@@ -461,18 +472,30 @@ def examen(conn, datos, especialidad):
                     exam_time=exam_duration,
                 )
                 
+        # Exam results not saved yet while the database is unavailable
+        elif (st.session_state.get("exam_mode", 0) == 2
+              and st.session_state.get("aux_exam_insert", 0)
+              and circuit_breaker.is_open(conn)):
+            # Keep the submitted answers in the session until the database is back
+            st.warning(
+                "La base de datos no está disponible ahora mismo y el examen no se puede guardar todavía. "
+                "Tus respuestas se conservan: pulsa Reintentar en unos minutos."
+            )
+            _, reintentar, _ = st.columns([2, 1, 2], gap="large")
+            with reintentar:
+                st.button("Reintentar", use_container_width=True)
+        
         # Exam results mode
         elif st.session_state.get("exam_mode", 0) == 2:
             try:
                 # Get exam info
                 exam_duration = st.session_state["exam_duration"]
                 
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT COALESCE(MAX(id_exam), 1) FROM [esnowflake].[dbo].FACT_EXAMS WHERE user_nickname = ?",
-                    (user,)
+                exam_id = db.execute_scalar(
+                    conn,
+                    "SELECT COALESCE(MAX(id_exam), 1) FROM [esnowflake].[dbo].FACT_EXAMS WHERE user_nickname = :user",
+                    {"user": user}
                 )
-                exam_id = cursor.fetchone()[0]
                 
                 # Initialize review set
                 st.session_state["review_set"] = []
@@ -494,7 +517,9 @@ def examen(conn, datos, especialidad):
                 filtered_answers = list(latest_answers.values())
                 
                 # Build SQL insert
+                bank = datos
                 values_list = []
+                answered_at = db.utc_now()
                 preguntas_acertadas = 0
                 preguntas_falladas = 0
 
@@ -506,14 +531,14 @@ def examen(conn, datos, especialidad):
                         user_answer = [user_answer]
 
                     # Get correct answer
-                    if question_number <= len(datos):
-                        correcta = datos[question_number - 1]["correct_answer"]
-                    else:
-                        st.warning(f"Question number {question_number} exceeds available questions.")
+                    pos = bank.position(question_number)
+                    if pos is None:
+                        st.warning(f"Question number {question_number} does not exist in the question bank.")
                         continue
                         
-                    question = datos[question_number - 1]["question"]
-                    comofue = h.comparar_respuestas(user_answer, correcta)
+                    correcta = bank.field(pos, "correct_answer")
+                    question = bank.field(pos, "question")
+                    comofue = bank.score(pos, user_answer)
 
                     answer["result"] = comofue
                     answer["correcta"] = correcta
@@ -533,45 +558,69 @@ def examen(conn, datos, especialidad):
                         is_answered = 0
 
                     # Add values for SQL insert
-                    values_list.append((
-                        question_number, user, 'examen', exam_id, 
-                        is_correct, is_answered
-                    ))
+                    values_list.append({
+                        "question_id": question_number,
+                        "user": user,
+                        "type": 'examen',
+                        "exam_id": exam_id,
+                        "is_correct": is_correct,
+                        "is_answered": is_answered,
+                        "answered_at": answered_at,
+                        "especialidad": especialidad,
+                    })
 
                 # Execute SQL inserts if needed
                 try:
                     aux_exam_insert = st.session_state.get("aux_exam_insert", 0)
                     if aux_exam_insert:
-                        # Update exam record
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            """
-                            UPDATE [esnowflake].[dbo].FACT_EXAMS 
-                            SET 
-                                end_time = CURRENT_TIMESTAMP,
-                                number_of_questions = ?,
-                                number_of_failed_questions = ?,
-                                number_of_correct_questions = ?
-                            WHERE id_exam = ?
-                            """,
-                            (len(filtered_answers)-1, preguntas_falladas, preguntas_acertadas, exam_id)
-                        )
-                        
-                        # Insert answer records
-                        if values_list:
-                            cursor.executemany(
+                        # Update the exam record and insert its answers together
+                        with db.transaction(conn) as connection:
+                            db.execute_non_query(
+                                conn,
+                                """
+                                UPDATE [esnowflake].[dbo].FACT_EXAMS 
+                                SET 
+                                    end_time = CURRENT_TIMESTAMP,
+                                    number_of_questions = :number_of_questions,
+                                    number_of_failed_questions = :failed,
+                                    number_of_correct_questions = :correct
+                                WHERE id_exam = :exam_id
+                                """,
+                                {
+                                    "number_of_questions": len(filtered_answers)-1,
+                                    "failed": preguntas_falladas,
+                                    "correct": preguntas_acertadas,
+                                    "exam_id": exam_id,
+                                },
+                                connection=connection
+                            )
+                            
+                            # Insert answer records
+                            db.execute_many(
+                                conn,
                                 """
                                 INSERT INTO [esnowflake].[dbo].Fact_Answers 
-                                (question_id, user_nickname, type, exam_id, is_correct, is_answered, ANSWER_TIMESTAMP) 
-                                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                                (question_id, user_nickname, type, exam_id, is_correct, is_answered, ANSWER_TIMESTAMP, especialidad) 
+                                VALUES (:question_id, :user, :type, :exam_id, :is_correct, :is_answered, :answered_at, :especialidad)
                                 """,
-                                values_list
+                                values_list,
+                                connection=connection
                             )
-                        conn.commit()
+                            
+                            # Add the answers to the section progress and the daily activity
+                            section_progress.record(conn, especialidad, values_list, connection=connection)
+                            daily_activity.record(conn, values_list, connection=connection)
+                        
+                        # Keep the cached answer history in step
+                        answer_history.record_answers(user, values_list, 'examen')
                         
                     # Reset flag
                     if "aux_exam_insert" in st.session_state:
                         st.session_state["aux_exam_insert"] = 0
+                except db.DatabaseUnavailable as e:
+                    # The flag stays set, the answers are saved on the next rerun once the database is back
+                    logger.warning(f"Exam results not saved, database unavailable: {str(e)}")
+                    st.warning("La base de datos no está disponible y el examen aún no se ha guardado. Tus respuestas se conservan y se guardarán al reintentar.")
                 except Exception as e:
                     logger.error(f"Error saving exam results: {str(e)}", exc_info=True)
                     st.write(f"An error occurred while saving results: {str(e)}")
@@ -580,13 +629,12 @@ def examen(conn, datos, especialidad):
                 failed = [answer for answer in filtered_answers if answer["result"] == 0]
                 
                 # Get exam time
-                cursor.execute(
-                    "SELECT DATEDIFF(SECOND, start_time, end_time) FROM [esnowflake].[dbo].FACT_EXAMS WHERE id_exam = ?",
-                    (exam_id,)
+                tiempo = db.execute_scalar(
+                    conn,
+                    "SELECT DATEDIFF(SECOND, start_time, end_time) FROM [esnowflake].[dbo].FACT_EXAMS WHERE id_exam = :exam_id",
+                    {"exam_id": exam_id},
+                    default=0
                 )
-                tiempo_v = cursor.fetchone()
-                
-                tiempo = tiempo_v[0] if tiempo_v else 0
                 minutos = tiempo // 60
                 segundos = tiempo % 60
                 tiempo_formato = f"{minutos} minutos y {segundos} segundos"
@@ -628,17 +676,10 @@ def examen(conn, datos, especialidad):
                 # Results chart
                 with grafi:
                     # Chart data
-                    labels = ["Acertadas", "Falladas", "No Respondidas"]
                     values = [preguntas_acertadas, preguntas_falladas, preguntas_no_respondidas]
-                    colors = ["green", "red", "blue"]
                     
-                    # Create donut chart
-                    fig = go.Figure(
-                        data=[
-                            go.Pie(labels=labels, values=values, hole=0.5, marker_colors=colors)
-                        ]
-                    )
-                    fig.update_layout(title_text="Resultados")
+                    # Donut chart, built only for results not seen before
+                    fig = figure_cache.get_figure("exam_result", values, lambda: _result_figure(values))
                     
                     # Display chart
                     st.plotly_chart(fig)
@@ -663,6 +704,9 @@ def examen(conn, datos, especialidad):
                         on_click=h.aux_exam,
                         args=("Inicio", None, None),
                     )
+            except db.DatabaseUnavailable as e:
+                logger.warning(f"Exam results not shown, database unavailable: {str(e)}")
+                st.warning("La base de datos no está disponible y el examen aún no se ha guardado. Tus respuestas se conservan y se guardarán al reintentar.")
             except Exception as e:
                 logger.error(f"Error displaying exam results: {str(e)}", exc_info=True)
                 st.error(f"Error en los resultados del examen: {str(e)}")
@@ -670,13 +714,91 @@ def examen(conn, datos, especialidad):
         logger.error(f"Error in exam page: {str(e)}", exc_info=True)
         st.warning(f"Error: {str(e)}")
 
+def _section_figure(area, values):
+    """
+    Build the donut of the progress of a section.
+    
+    Args:
+        area (str): Section name
+        values (List[int]): Correct, incorrect and unseen questions
+    
+    Returns:
+        go.Figure: The chart
+    """
+    fig = go.Figure(
+        data=[
+            go.Pie(
+                labels=[
+                    "preguntas Correctas",
+                    "preguntas Incorrectas",
+                    "preguntas No Vistas"
+                ],
+                values=values,
+                hole=0.5,
+                marker_colors=["green", "red", "blue"]
+            )
+        ]
+    )
+    fig.update_layout(
+        title_text=f"{area}",
+        showlegend=False,
+        height=350,
+        width=350,
+        margin=dict(l=10, r=10, t=30, b=10)
+    )
+    return fig
+
+def _timeline_figure(df_resumen):
+    """
+    Build the bar chart of the questions answered per day.
+    
+    Args:
+        df_resumen (pd.DataFrame): Fecha and Número de preguntas per day
+    
+    Returns:
+        go.Figure: The chart
+    """
+    fig = px.bar(
+        df_resumen,
+        x="Fecha",
+        y="Número de preguntas",
+        title="preguntas Respondidas por Día"
+    )
+    fig.update_xaxes(
+        dtick="D1",
+        tickformat="%b %d, %Y"
+    )
+    return fig
+
+def _exam_history_figure(values):
+    """
+    Build the pie chart of a past exam.
+    
+    Args:
+        values (List[int]): Correct, failed and blank questions
+    
+    Returns:
+        go.Figure: The chart
+    """
+    fig = go.Figure(
+        go.Pie(
+            labels=["Acertadas", "Falladas", "En Blanco"],
+            values=values,
+            marker_colors=["green", "red", "blue"],
+            hole=0.4,
+        )
+    )
+    fig.update_traces(textinfo="percent+label")
+    fig.update_layout(width=350, height=350)
+    return fig
+
 def progreso(conn, datos, especialidad):
     """
     Display the progress page for a specialization.
     
     Args:
         conn: Database connection
-        datos (List[Dict]): The questions and answers
+        datos (qb.QuestionBank): The question bank pinned for this rerun
         especialidad (str): The specialization type
     """
     try:
@@ -693,77 +815,33 @@ def progreso(conn, datos, especialidad):
             with progress_tab:
                 st.subheader("Avance por secciones")
             
-            # Get question history
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT 
-                    question_id, is_correct, is_answered, 
-                    CAST(answer_timestamp AS date) AS Fecha 
-                FROM [esnowflake].[dbo].FACT_ANSWERS 
-                WHERE user_nickname = ? 
-                ORDER BY answer_timestamp DESC
-                """,
-                (user,)
+            # Get answers per day with totals and streak, one row per day with activity
+            actividad = daily_activity.get_summary(conn, user)
+            df = actividad["daily"].rename(
+                columns={"day": "Fecha", "answers": "preguntas", "correct": "correctas"}
             )
-            questions_info = cursor.fetchall()
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(
-                questions_info, 
-                columns=["question_id", "is_correct", "is_answered", "Fecha"]
-            )
-            
-            # Convert date column to datetime
-            df["Fecha"] = pd.to_datetime(df["Fecha"]).dt.normalize()
             
             if len(df) == 0:
                 st.warning("Haz al menos una pregunta para poder ver esta sección")
             else:
-                # Prepare area data
-                # Get question areas
-                df_preguntas = pd.DataFrame(datos)
-                
-                # Handle multiple question areas by exploding them into separate rows
-                df_preguntas = df_preguntas.explode("question_area")
-                
-                # Merge with answer data
-                df_combinado = df.merge(
-                    df_preguntas[["question_number", "question_area"]],
-                    left_on="question_id",
-                    right_on="question_number",
-                    how="left"
-                )
-                
-                # Get unique areas
-                df_secciones_referencia = pd.DataFrame(
-                    df_preguntas["question_area"].unique(), 
-                    columns=["question_area"]
-                )
+                # Section counts from the question x section matrix of the bank
+                engine = progress_engine.for_bank(datos)
+                con_preguntas = engine.totals > 0
+                secciones = [seccion for seccion, hay in zip(engine.sections, con_preguntas) if hay]
                 
-                # Calculate metrics per area
-                total_preguntas_por_seccion = df_preguntas["question_area"].value_counts()
-                metrics_por_seccion = df_combinado.groupby("question_area")["is_correct"].agg(
-                    ["sum", lambda x: len(x) - x.sum()]
-                )
-                metrics_por_seccion.columns = ["preguntas Correctas", "preguntas Incorrectas"]
-                
-                # Merge metrics
-                metrics_final = df_secciones_referencia.merge(
-                    metrics_por_seccion,
-                    on="question_area",
-                    how="left"
-                ).fillna(0)
+                # Answers per area, kept up to date as answers are written
+                progreso_secciones = section_progress.get_progress(conn, user, especialidad).set_index("question_area")
                 
-                # Calculate unseen questions
-                metrics_final["preguntas No Vistas"] = (
-                    metrics_final["question_area"].map(total_preguntas_por_seccion)
-                    - metrics_final["preguntas Correctas"]
-                    - metrics_final["preguntas Incorrectas"]
-                )
+                # Questions never answered, from the cached answer history
+                historial = answer_history.get_history(conn, user)
+                no_vistas = engine.unseen(historial.numbers("answered"))[con_preguntas]
                 
-                # Define colors
-                colors = ["green", "red", "blue"]
+                metrics_final = pd.DataFrame({
+                    "question_area": secciones,
+                    "preguntas Correctas": progreso_secciones["correct_count"].reindex(secciones, fill_value=0).to_numpy(),
+                    "preguntas Incorrectas": progreso_secciones["incorrect_count"].reindex(secciones, fill_value=0).to_numpy(),
+                    "preguntas No Vistas": no_vistas
+                })
                 
                 # Display charts
                 c1, c2, c3, c4, c5, c6 = st.columns(6, gap="small")
@@ -773,36 +851,16 @@ def progreso(conn, datos, especialidad):
                 for i, (_, row) in enumerate(metrics_final.iterrows()):
                     col_index = i % len(columns)
                     
-                    labels = [
-                        "preguntas Correctas",
-                        "preguntas Incorrectas",
-                        "preguntas No Vistas"
-                    ]
+                    area = row["question_area"]
                     values = [
-                        row["preguntas Correctas"],
-                        row["preguntas Incorrectas"],
-                        row["preguntas No Vistas"]
+                        int(row["preguntas Correctas"]),
+                        int(row["preguntas Incorrectas"]),
+                        int(row["preguntas No Vistas"])
                     ]
                     
-                    # Create donut chart
-                    fig = go.Figure(
-                        data=[
-                            go.Pie(
-                                labels=labels, 
-                                values=values, 
-                                hole=0.5, 
-                                marker_colors=colors
-                            )
-                        ]
-                    )
-                    
-                    # Update layout
-                    fig.update_layout(
-                        title_text=f"{row['question_area']}",
-                        showlegend=False,
-                        height=350,
-                        width=350,
-                        margin=dict(l=10, r=10, t=30, b=10)
+                    # Donut chart, rebuilt only when the numbers of the area change
+                    fig = figure_cache.get_figure(
+                        "section_progress", (area, values), lambda: _section_figure(area, values)
                     )
                     
                     # Display in appropriate column
@@ -815,29 +873,14 @@ def progreso(conn, datos, especialidad):
                 secciones, exams = st.columns([2, 1], gap="large")
                 with secciones:
                     # Prepare data
-                    df_resumen = (
-                        df.groupby("Fecha")
-                        .size()
-                        .reset_index(name="Número de preguntas")
+                    df_resumen = df[["Fecha", "preguntas"]].rename(
+                        columns={"preguntas": "Número de preguntas"}
                     )
                     
-                    # Calculate streak
-                    racha_actual = 0
-                    fecha_anterior = None
-                    dates = sorted(df_resumen["Fecha"].unique(), reverse=True)
-                    
-                    for fecha in dates:
-                        if (fecha_anterior is None or 
-                            fecha_anterior - pd.Timedelta(days=1) == fecha):
-                            racha_actual += 1
-                            fecha_anterior = fecha
-                        else:
-                            break
-                    
-                    # Calculate overall stats
-                    total_preguntas = len(df)
-                    total_correctas = df["is_correct"].sum()
-                    porcentaje_acierto = (total_correctas / total_preguntas) * 100 if total_preguntas > 0 else 0
+                    # Overall stats and streak, the same streak as the gamification profile
+                    racha_actual = actividad["streak"]
+                    total_preguntas = actividad["answers"]
+                    porcentaje_acierto = actividad["accuracy"]
                     
                     # Display metrics and timeline
                     metricas, timeline = st.columns([1, 2], gap="small")
@@ -850,18 +893,9 @@ def progreso(conn, datos, especialidad):
                         st.metric("Porcentaje de acierto", f"{porcentaje_acierto:.2f}%")
                     
                     with timeline:
-                        # Create bar chart
-                        fig = px.bar(
-                            df_resumen,
-                            x="Fecha",
-                            y="Número de preguntas",
-                            title="preguntas Respondidas por Día"
-                        )
-                        
-                        # Format x-axis
-                        fig.update_xaxes(
-                            dtick="D1",
-                            tickformat="%b %d, %Y"
+                        # Bar chart, rebuilt only on a day with new answers
+                        fig = figure_cache.get_figure(
+                            "daily_timeline", df_resumen, lambda: _timeline_figure(df_resumen)
                         )
                         
                         # Display chart
@@ -871,40 +905,13 @@ def progreso(conn, datos, especialidad):
                 with exams:
                     st.subheader("Historial de exámenes")
                     
-                    # Get exam data
-                    cursor.execute(
-                        """
-                        SELECT TOP 6 
-                            id_exam, start_time, duration_minutes,
-                            number_of_questions, number_of_correct_questions,
-                            number_of_failed_questions
-                        FROM [esnowflake].[dbo].FACT_EXAMS
-                        WHERE user_nickname = ?
-                        ORDER BY start_time DESC
-                        """,
-                        (user,)
-                    )
-                    exam_info = cursor.fetchall()
-                    
-                    # Convert to DataFrame
-                    df_exams = pd.DataFrame(
-                        exam_info,
-                        columns=[
-                            "id_exam", "start_time", "duration_minutes",
-                            "number_of_questions", "number_of_correct_questions",
-                            "number_of_failed_questions"
-                        ]
-                    )
+                    # Pages seen of this user's history, the cursor of each one
+                    paginas = st.session_state.get("exam_history_pages")
+                    if paginas is None or paginas["user"] != user:
+                        paginas = st.session_state["exam_history_pages"] = {"user": user, "cursors": [None]}
                     
-                    # Handle null values
-                    for col in ["number_of_questions", "number_of_correct_questions", "number_of_failed_questions"]:
-                        df_exams[col] = df_exams[col].fillna(0).astype(int)
-                    
-                    # Colors for chart
-                    colores = ["green", "red", "blue"]
-                    
-                    # Chart dimensions
-                    ancho, alto = 350, 350
+                    # Get exam data, one page newest first
+                    df_exams, siguiente = exam_history.get_page(conn, user, paginas["cursors"][-1])
                     
                     if len(df_exams) == 0:
                         st.write("Aún no has hecho exámenes")
@@ -919,22 +926,6 @@ def progreso(conn, datos, especialidad):
                                 - (examen["number_of_failed_questions"] or 0)
                             )
                             
-                            # Create pie chart
-                            fig = go.Figure(
-                                go.Pie(
-                                    labels=["Acertadas", "Falladas", "En Blanco"],
-                                    values=[
-                                        examen["number_of_correct_questions"],
-                                        examen["number_of_failed_questions"],
-                                        en_blanco,
-                                    ],
-                                    marker_colors=colores,
-                                    hole=0.4,
-                                )
-                            )
-                            fig.update_traces(textinfo="percent+label")
-                            fig.update_layout(width=ancho, height=alto)
-                            
                             # Calculate score and pass/fail
                             score = (
                                 examen["number_of_correct_questions"] / examen["number_of_questions"]
@@ -953,8 +944,6 @@ def progreso(conn, datos, especialidad):
                             # Display in expander
                             with st.expander(mensaje):
                                 grap, met = st.columns([2, 1], gap="medium")
-                                with grap:
-                                    st.plotly_chart(fig)
                                 with met:
                                     st.write("")
                                     st.write("")
@@ -967,6 +956,38 @@ def progreso(conn, datos, especialidad):
                                         st.success("APROBADO")
                                     else:
                                         st.error("SUSPENSO")
+                                
+                                # Chart and answers, only for the exams the user opens
+                                with grap:
+                                    detalle = st.toggle("Ver detalle", key=f"exam_detail_{examen['id_exam']}")
+                                    if detalle:
+                                        values = [
+                                            int(examen["number_of_correct_questions"]),
+                                            int(examen["number_of_failed_questions"]),
+                                            int(en_blanco),
+                                        ]
+                                        fig = figure_cache.get_figure(
+                                            "exam_history", values, lambda: _exam_history_figure(values)
+                                        )
+                                        st.plotly_chart(fig)
+                                if detalle:
+                                    respuestas = exam_history.get_details(conn, examen["id_exam"])
+                                    st.dataframe(
+                                        exam_history.breakdown(datos, respuestas),
+                                        use_container_width=True,
+                                        hide_index=True
+                                    )
+                        
+                        # Page navigation
+                        recientes, anteriores = st.columns(2)
+                        with recientes:
+                            if len(paginas["cursors"]) > 1 and st.button("⬅️ Más recientes", key="exam_history_newer"):
+                                paginas["cursors"].pop()
+                                st.rerun()
+                        with anteriores:
+                            if siguiente is not None and st.button("Anteriores ➡️", key="exam_history_older"):
+                                paginas["cursors"].append(siguiente)
+                                st.rerun()
             
             # Display gamification tab content
             with gamification_tab:
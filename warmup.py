@@ -0,0 +1,203 @@
+"""
+Warm-up of the app caches when the container starts.
+
+Loads the four question banks, builds their Excel exports, opens the database
+pools and optionally imports the assistant concurrently in a thread pool, so the
+first users after a deploy or a restart do not pay for them. The progress is published in a readiness
+state file that the Docker HEALTHCHECK queries with `python warmup.py --check`.
+
+The caches live in the Streamlit server process, so the warm-up has to run in
+it: the container starts the app through this module (`python warmup.py
+<streamlit options>`), which starts the warm-up and then hands over to
+`streamlit run especialidades.py`. especialidades.py also calls start(), which
+does nothing if the warm-up already ran in the process.
+
+Only the standard library is imported at module level so that --check stays cheap.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+STATE_FILE = os.getenv("WARMUP_STATE_FILE", "/tmp/especialidades_ready.json")
+WARMUP_ASSISTANT = os.getenv("WARMUP_ASSISTANT", "1") == "1"
+MAX_WORKERS = 8
+CONNECTIONS = ["snowflake_pro", "snowflake_arch", "dbt", "google", "sql"]
+
+_started = False
+_start_lock = threading.Lock()
+
+
+def _write_state(state):
+    """Write the readiness state atomically."""
+    tmp_path = f"{STATE_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=4)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def read_state():
+    """
+    Read the readiness state of the app.
+
+    Returns:
+        Dict: The state ("status" is "warming" or "ready"), or None if the warm-up never started
+    """
+    try:
+        with open(STATE_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _load_bank(especialidad):
+    """Load a question bank into the process cache."""
+    import question_bank as qb
+    return f"{len(qb.get_bank(especialidad))} preguntas"
+
+
+def _build_export(especialidad):
+    """Build the Excel export of a question bank, loading the bank first if needed."""
+    import excel_export
+    return excel_export.prebuild(especialidad)
+
+
+def _open_pool(especialidad):
+    """Create the database engine of a specialty and open its first connection."""
+    import helper as h
+    from sqlalchemy import text
+
+    conn = h.init_connection(especialidad)
+    if hasattr(conn, "connect"):
+        with conn.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    else:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+    return "ok"
+
+
+def _import_modules():
+    """Import the page modules, the heaviest imports of the first run."""
+    import tools  # noqa: F401
+    import gamification  # noqa: F401
+    return "ok"
+
+
+def _init_assistant():
+    """Import the assistant, which builds its LLM, embeddings and agent."""
+    import agent  # noqa: F401
+    return "ok"
+
+
+def _tasks():
+    """Warm-up tasks, name -> (function, args)."""
+    import question_bank as qb
+
+    tasks = {f"bank:{especialidad}": (_load_bank, (especialidad,)) for especialidad in qb.ESPECIALIDADES}
+    tasks.update({f"excel:{especialidad}": (_build_export, (especialidad,)) for especialidad in qb.ESPECIALIDADES})
+    tasks.update({f"db:{especialidad}": (_open_pool, (especialidad,)) for especialidad in CONNECTIONS})
+    tasks["imports"] = (_import_modules, ())
+    if WARMUP_ASSISTANT:
+        tasks["assistant"] = (_init_assistant, ())
+    return tasks
+
+
+def run():
+    """
+    Run all the warm-up tasks concurrently and publish the readiness state.
+
+    A failing task is logged and recorded in the state, but does not keep the
+    app from becoming ready: the page that needs it will retry on first use.
+
+    Returns:
+        Dict: The final readiness state
+    """
+    start = time.perf_counter()
+    state = {"status": "warming", "pid": os.getpid(), "started_at": time.time(), "tasks": {}}
+
+    tasks = _tasks()
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="warmup") as executor:
+        futures = {
+            name: executor.submit(_timed, function, *args) for name, (function, args) in tasks.items()
+        }
+        for name, future in futures.items():
+            state["tasks"][name] = future.result()
+
+    state["status"] = "ready"
+    state["seconds"] = round(time.perf_counter() - start, 3)
+    _write_state(state)
+    failed = [name for name, result in state["tasks"].items() if not result["ok"]]
+    logger.info(f"Warm-up finished in {state['seconds']}s, failed tasks: {failed or 'none'}")
+    return state
+
+
+def _timed(function, *args):
+    """Run a warm-up task, returning its outcome instead of raising."""
+    start = time.perf_counter()
+    try:
+        detail = function(*args)
+        ok = True
+    except Exception as e:
+        logger.error(f"Warm-up task {function.__name__}{args} failed: {str(e)}", exc_info=True)
+        detail = str(e)
+        ok = False
+    return {"ok": ok, "seconds": round(time.perf_counter() - start, 3), "detail": detail}
+
+
+def start():
+    """Start the warm-up in a background thread, once per process."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    # Replace the state left by a previous run before anything can query it
+    try:
+        _write_state({"status": "warming", "pid": os.getpid(), "started_at": time.time()})
+    except OSError as e:
+        logger.warning(f"Could not write the readiness state: {str(e)}")
+    threading.Thread(target=_run_safely, name="warmup", daemon=True).start()
+
+
+def _run_safely():
+    """Background entry point of the warm-up."""
+    try:
+        run()
+    except Exception as e:
+        logger.error(f"Error in warm-up: {str(e)}", exc_info=True)
+        # Never keep the container unhealthy because of the warm-up itself
+        _write_state({"status": "ready", "pid": os.getpid(), "error": str(e)})
+
+
+def check():
+    """
+    Health check: whether the warm-up of the running app has finished.
+
+    Returns:
+        int: Exit code, 0 if ready and 1 otherwise
+    """
+    state = read_state()
+    return 0 if state is not None and state.get("status") == "ready" else 1
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--check"]:
+        sys.exit(check())
+
+    # Start the warm-up and serve the app in this same process. The app imports
+    # this file as "warmup", not "__main__", so start it through that module
+    from streamlit.web import cli as stcli
+    import warmup
+
+    warmup.start()
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "especialidades.py")
+    sys.argv = ["streamlit", "run", app] + sys.argv[1:]
+    sys.exit(stcli.main())